@@ -1,11 +1,15 @@
 """Datashark Template Plugin
 """
 from typing import Dict
+from pathlib import Path
 from asyncio.subprocess import PIPE, DEVNULL
 from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import amcache
+from .native.hashset import HashFilter
 
 NAME = 'windows_amcacheparser'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
@@ -17,6 +21,24 @@ class AmCacheParserProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse Amcache.hve in-process instead of invoking AmCacheParser
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '0',
+            'required': False,
+            'description': """
+                Number of worker processes extracting Amcache categories in native mode, 0 means one per category
+            """,
+        },
         {
             'name': 'i',
             'kind': Kind.BOOL,
@@ -98,8 +120,38 @@ class AmCacheParserProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Processor for Eric Zimmermann's AmCacheParser
     """
 
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        filepath = get_value(arguments, 'f')
+        directory = Path(get_value(arguments, 'csv'))
+        directory.mkdir(parents=True, exist_ok=True)
+        basename = 'Amcache'
+        if get_value(arguments, 'csvf'):
+            basename = get_value(arguments, 'csvf').rsplit('.', 1)[0]
+        dt_format = get_value(arguments, 'dt', amcache.DEFAULT_DT_FORMAT)
+        if get_value(arguments, 'mp', False):
+            dt_format = amcache.PRECISE_DT_FORMAT
+        counts = await run_native(
+            amcache.export,
+            filepath,
+            directory,
+            basename=basename,
+            include_associated=get_value(arguments, 'i', False),
+            dt_format=dt_format,
+            replay_logs=not get_value(arguments, 'nl', False),
+            hash_filter=HashFilter(
+                get_value(arguments, 'b'), get_value(arguments, 'w')
+            ),
+            workers=get_value(arguments, 'workers', 0),
+        )
+        for output, count in sorted(counts.items()):
+            LOGGER.info("native parser exported %d %s", count, output)
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using amcacheparser"""
+        if get_value(arguments, 'native', False):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.amcacheparser.bin',
@@ -6,6 +6,9 @@ from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import appcompatcache
+from .native.common import output_filepath
 
 NAME = 'windows_appcompatcacheparser'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
@@ -19,6 +22,24 @@ class AppCompatCacheParserProcessor(
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse the SYSTEM hive in-process instead of invoking AppCompatCacheParser
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '0',
+            'required': False,
+            'description': """
+                Number of worker processes decoding control sets in native mode, 0 means one per control set
+            """,
+        },
         {
             'name': 't',
             'kind': Kind.BOOL,
@@ -83,8 +104,41 @@ class AppCompatCacheParserProcessor(
     Processor for Eric Zimmermann's AppCompatCacheParser
     """
 
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        filepath = get_value(arguments, 'f')
+        control_set = get_value(arguments, 'c')
+        if control_set is not None:
+            digits = str(control_set).lower().replace('controlset', '')
+            if not digits.isdigit():
+                raise ProcessorError(f"invalid control set: {control_set}")
+            control_set = int(digits)
+        csv_filepath = output_filepath(
+            get_value(arguments, 'csv'),
+            get_value(arguments, 'csvf'),
+            'AppCompatCache.csv',
+        )
+        count, errors = await run_native(
+            appcompatcache.export,
+            filepath,
+            csv_filepath,
+            control_set=control_set,
+            sort=get_value(arguments, 't', False),
+            dt_format=get_value(
+                arguments, 'dt', appcompatcache.DEFAULT_DT_FORMAT
+            ),
+            replay_logs=not get_value(arguments, 'nl', False),
+            workers=get_value(arguments, 'workers', 0),
+        )
+        for number, error in sorted(errors.items()):
+            LOGGER.warning("skipped ControlSet%03d: %s", number, error)
+        LOGGER.info("native parser exported %d entries", count)
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using appcompatcacheparser"""
+        if get_value(arguments, 'native', False):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.appcompatcacheparser.bin',
@@ -0,0 +1,30 @@
+"""Datashark Windows processors helpers
+"""
+from typing import Any, Dict
+from asyncio import get_running_loop
+from functools import partial
+from datashark_core.processor import ProcessorError
+from datashark_core.model.api import ProcessorArgument
+from .native.common import ParsingError
+
+
+def get_value(
+    arguments: Dict[str, ProcessorArgument], name: str, default: Any = None
+) -> Any:
+    """Get argument value or default when argument is missing or unset"""
+    argument = arguments.get(name)
+    if argument is None:
+        return default
+    value = argument.get_value()
+    return default if value is None else value
+
+
+async def run_native(function, *args, **kwargs):
+    """Run a blocking native parser function in the default executor"""
+    loop = get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            None, partial(function, *args, **kwargs)
+        )
+    except (ParsingError, OSError) as exc:
+        raise ProcessorError(f"native parser failed: {exc}") from exc
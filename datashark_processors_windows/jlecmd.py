@@ -6,6 +6,9 @@ from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import jumplist
+from .native.common import output_filepath
 
 NAME = 'windows_jlecmd'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
@@ -17,6 +20,24 @@ class JLECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse jump lists in-process instead of invoking JLECmd
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '0',
+            'required': False,
+            'description': """
+                Number of worker processes decoding jump lists found in 'd' in native mode, 0 means one per CPU
+            """,
+        },
         {
             'name': 'all',
             'kind': Kind.BOOL,
@@ -133,8 +154,71 @@ class JLECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Processor for Eric Zimmermann's JLECmd
     """
 
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        if get_value(arguments, 'html'):
+            raise ProcessorError("'html' is not supported in native mode")
+        directory = get_value(arguments, 'd')
+        filepath = get_value(arguments, 'f')
+        if directory:
+            filepaths = jumplist.iter_jumplist_files(
+                directory, get_value(arguments, 'all', False)
+            )
+        elif filepath:
+            filepaths = [filepath]
+        else:
+            raise ProcessorError("either 'f' or 'd' argument is required")
+        basename = 'JLECmd'
+        if get_value(arguments, 'csvf'):
+            basename = get_value(arguments, 'csvf').rsplit('.', 1)[0]
+        outputs = {}
+        for kind in ('Automatic', 'Custom'):
+            outputs[kind] = (
+                output_filepath(
+                    get_value(arguments, 'csv'),
+                    None,
+                    f'{basename}_{kind}Destinations.csv',
+                ),
+                output_filepath(
+                    get_value(arguments, 'json'),
+                    None,
+                    f'{basename}_{kind}Destinations.json',
+                ),
+            )
+        if not any(outputs['Automatic']):
+            raise ProcessorError(
+                "native mode requires 'csv' or 'json' argument"
+            )
+        dt_format = get_value(arguments, 'dt', jumplist.DEFAULT_DT_FORMAT)
+        if get_value(arguments, 'mp', False):
+            dt_format = jumplist.PRECISE_DT_FORMAT
+        options = jumplist.ExportOptions(
+            dt_format=dt_format,
+            detail=get_value(arguments, 'ld', False),
+            full=get_value(arguments, 'fd', False),
+            with_directory=get_value(arguments, 'withDir', False),
+            dump_to=get_value(arguments, 'dumpTo'),
+        )
+        automatic, custom = await run_native(
+            jumplist.export,
+            filepaths,
+            automatic_filepaths=outputs['Automatic'],
+            custom_filepaths=outputs['Custom'],
+            app_ids_filepath=get_value(arguments, 'appIds'),
+            options=options,
+            workers=get_value(arguments, 'workers', 0) if directory else 1,
+        )
+        LOGGER.info(
+            "native parser exported %d automatic and %d custom entries",
+            automatic,
+            custom,
+        )
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using JLECmd"""
+        if get_value(arguments, 'native', False):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.jlecmd.bin',
@@ -0,0 +1,140 @@
+"""Datashark Template Plugin
+"""
+from typing import Dict
+from datashark_core.meta import ProcessorMeta
+from datashark_core.logging import LOGGING_MANAGER
+from datashark_core.processor import ProcessorInterface, ProcessorError
+from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import lnk
+from .native.common import output_filepath
+
+NAME = 'windows_lecmd'
+LOGGER = LOGGING_MANAGER.get_logger(NAME)
+
+
+class LECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
+    """LECmd processor"""
+
+    NAME = NAME
+    SYSTEM = System.WINDOWS
+    ARGUMENTS = [
+        {
+            'name': 'all',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Process all files in directory vs. only files matching *.lnk
+            """,
+        },
+        {
+            'name': 'r',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Only process lnk files pointing to removable drives
+            """,
+        },
+        {
+            'name': 'mp',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                Display higher precision for timestamps
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '0',
+            'required': False,
+            'description': """
+                Number of worker processes decoding lnk files found in 'd', 0 means one per CPU
+            """,
+        },
+        {
+            'name': 'dt',
+            'kind': Kind.STR,
+            'value': 'yyyy-MM-dd HH:mm:ss',
+            'required': False,
+            'description': """
+                The custom date/time format to use when displaying timestamps. See https://goo.gl/CNVq0k for options
+            """,
+        },
+        {
+            'name': 'csv',
+            'kind': Kind.PATH,
+            'required': False,
+            'description': """Directory to save CSV formatted results to""",
+        },
+        {
+            'name': 'csvf',
+            'kind': Kind.STR,
+            'required': False,
+            'description': """File name to save CSV formatted results to""",
+        },
+        {
+            'name': 'json',
+            'kind': Kind.PATH,
+            'required': False,
+            'description': """Directory to save json representation to""",
+        },
+        {
+            'name': 'd',
+            'kind': Kind.PATH,
+            'required': False,
+            'description': """
+                Directory to recursively process. Either this or 'f' is required
+            """,
+        },
+        {
+            'name': 'f',
+            'kind': Kind.PATH,
+            'required': False,
+            'description': """
+                File to process. Either this or 'd' is required
+            """,
+        },
+    ]
+    DESCRIPTION = """
+    Native processor producing Eric Zimmermann's LECmd-like output
+    """
+
+    async def _run(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native lnk decoder"""
+        directory = get_value(arguments, 'd')
+        filepath = get_value(arguments, 'f')
+        if directory:
+            filepaths = lnk.iter_lnk_files(
+                directory, get_value(arguments, 'all', False)
+            )
+        elif filepath:
+            filepaths = [filepath]
+        else:
+            raise ProcessorError("either 'f' or 'd' argument is required")
+        csv_filepath = output_filepath(
+            get_value(arguments, 'csv'),
+            get_value(arguments, 'csvf'),
+            'LECmd_Output.csv',
+        )
+        json_filepath = output_filepath(
+            get_value(arguments, 'json'), None, 'LECmd_Output.json'
+        )
+        if not (csv_filepath or json_filepath):
+            raise ProcessorError("either 'csv' or 'json' argument is required")
+        dt_format = get_value(arguments, 'dt', lnk.DEFAULT_DT_FORMAT)
+        if get_value(arguments, 'mp', False):
+            dt_format = lnk.PRECISE_DT_FORMAT
+        count = await run_native(
+            lnk.export,
+            filepaths,
+            csv_filepath=csv_filepath,
+            json_filepath=json_filepath,
+            dt_format=dt_format,
+            removable_only=get_value(arguments, 'r', False),
+            workers=get_value(arguments, 'workers', 0) if directory else 1,
+        )
+        LOGGER.info("native decoder exported %d lnk files", count)
@@ -6,6 +6,9 @@ from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import carve, mft, mfttable, usn
+from .native.common import output_filepath
 
 NAME = 'windows_mftecmd'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
@@ -17,6 +20,68 @@ class MFTECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse $MFT in-process instead of invoking MFTECmd
+            """,
+        },
+        {
+            'name': 'carve',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, carve USN records from 'f' (unallocated space, pagefile, raw image) in-process. Requires numpy
+            """,
+        },
+        {
+            'name': 'anomalies',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, also export $SI < $FN and zeroed sub-second timestamps entries in native mode. Requires numpy
+            """,
+        },
+        {
+            'name': 'timeline',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, also write a time-ordered mactime-like timeline next to the bodyfile in native mode
+            """,
+        },
+        {
+            'name': 'sortbuf',
+            'kind': Kind.INT,
+            'value': '1000000',
+            'required': False,
+            'description': """
+                Maximum number of timeline events held in memory while sorting, sorted runs are spilled to disk beyond
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '1',
+            'required': False,
+            'description': """
+                Number of worker processes decoding records in native mode, 1 decodes in-process and 0 means one per CPU
+            """,
+        },
+        {
+            'name': 'checkpoint',
+            'kind': Kind.PATH,
+            'required': False,
+            'description': """
+                File keeping the last processed $J record in native mode. Only newer records are exported on re-runs
+            """,
+        },
         {
             'name': 'blf',
             'kind': Kind.BOOL,
@@ -180,8 +245,199 @@ class MFTECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Processor for Eric Zimmermann's MFTECmd
     """
 
+    async def _run_native_journal(
+        self, arguments: Dict[str, ProcessorArgument]
+    ):
+        """Process $J using native parser"""
+        csv_filepath = output_filepath(
+            get_value(arguments, 'csv'),
+            get_value(arguments, 'csvf'),
+            'MFTECmd_$J_Output.csv',
+        )
+        json_filepath = output_filepath(
+            get_value(arguments, 'json'),
+            get_value(arguments, 'jsonf'),
+            'MFTECmd_$J_Output.json',
+        )
+        if not (csv_filepath or json_filepath):
+            raise ProcessorError(
+                "native mode requires 'csv' or 'json' argument for $J"
+            )
+        count = await run_native(
+            usn.export,
+            get_value(arguments, 'f'),
+            csv_filepath=csv_filepath,
+            json_filepath=json_filepath,
+            checkpoint_filepath=get_value(arguments, 'checkpoint'),
+            dt_format=get_value(arguments, 'dt', usn.DEFAULT_DT_FORMAT),
+            lf=get_value(arguments, 'blf', False),
+        )
+        LOGGER.info("native parser exported %d $J records", count)
+
+    async def _run_native_carver(
+        self, arguments: Dict[str, ProcessorArgument]
+    ):
+        """Carve USN records using native carver"""
+        csv_filepath = output_filepath(
+            get_value(arguments, 'csv'),
+            get_value(arguments, 'csvf'),
+            'MFTECmd_USN_Carved.csv',
+        )
+        json_filepath = output_filepath(
+            get_value(arguments, 'json'),
+            get_value(arguments, 'jsonf'),
+            'MFTECmd_USN_Carved.json',
+        )
+        if not (csv_filepath or json_filepath):
+            raise ProcessorError("'carve' requires 'csv' or 'json' argument")
+        count = await run_native(
+            carve.carve,
+            get_value(arguments, 'f'),
+            csv_filepath=csv_filepath,
+            json_filepath=json_filepath,
+            dt_format=get_value(arguments, 'dt', carve.DEFAULT_DT_FORMAT),
+            lf=get_value(arguments, 'blf', False),
+        )
+        LOGGER.info("native carver found %d USN records", count)
+
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        filepath = get_value(arguments, 'f')
+        if get_value(arguments, 'carve', False):
+            await self._run_native_carver(arguments)
+            return
+        if await run_native(usn.is_journal, filepath):
+            await self._run_native_journal(arguments)
+            return
+        if not await run_native(mft.is_mft, filepath):
+            raise ProcessorError("native mode only supports $MFT and $J")
+        reference = get_value(arguments, 'de')
+        offset = get_value(arguments, 'do')
+        listing = get_value(arguments, 'fls', False)
+        if get_value(arguments, 'ds') is not None:
+            raise ProcessorError("'ds' is not supported in native mode")
+        if listing and not reference:
+            raise ProcessorError("'fls' requires 'de' argument")
+        if offset is not None:
+            directory = get_value(arguments, 'dd')
+            if not directory:
+                raise ProcessorError("'do' requires 'dd' argument")
+            output = await run_native(
+                mft.dump_record, filepath, offset, directory
+            )
+            LOGGER.info("native parser dumped FILE record to %s", output)
+            if not reference:
+                return
+        if listing:
+            basename = 'MFTECmd_$MFT_DirectoryListing'
+        elif reference:
+            basename = f'MFTECmd_$MFT_Entry_{reference}'
+        else:
+            basename = 'MFTECmd_$MFT_Output'
+        csv_filepath = output_filepath(
+            get_value(arguments, 'csv'),
+            get_value(arguments, 'csvf'),
+            f'{basename}.csv',
+        )
+        json_filepath = output_filepath(
+            get_value(arguments, 'json'),
+            get_value(arguments, 'jsonf'),
+            f'{basename}.json',
+        )
+        body_filepath = output_filepath(
+            get_value(arguments, 'body'),
+            get_value(arguments, 'bodyf'),
+            f'{basename}.body',
+        )
+        drive_letter = get_value(arguments, 'bdl')
+        timeline_filepath = None
+        if body_filepath and get_value(arguments, 'timeline', False):
+            timeline_filepath = body_filepath.with_name(
+                f'{body_filepath.stem}_Timeline.csv'
+            )
+        if not (csv_filepath or json_filepath or body_filepath):
+            raise ProcessorError(
+                "native mode requires 'csv', 'json' or 'body' argument"
+            )
+        if body_filepath and not drive_letter:
+            raise ProcessorError("'body' requires 'bdl' argument")
+        kwargs = {
+            'csv_filepath': csv_filepath,
+            'json_filepath': json_filepath,
+            'include_dos': get_value(arguments, 'sn', False),
+            'all_timestamps': get_value(arguments, 'at', False),
+            'dt_format': get_value(arguments, 'dt', mft.DEFAULT_DT_FORMAT),
+            'lf': get_value(arguments, 'blf', False),
+        }
+        workers = get_value(arguments, 'workers', 1)
+        anomalies = get_value(arguments, 'anomalies', False) and not reference
+        anomalies_kwargs = {
+            'csv_filepath': output_filepath(
+                get_value(arguments, 'csv'),
+                None,
+                'MFTECmd_$MFT_Anomalies.csv',
+            ),
+            'json_filepath': output_filepath(
+                get_value(arguments, 'json'),
+                None,
+                'MFTECmd_$MFT_Anomalies.json',
+            ),
+            'dt_format': kwargs['dt_format'],
+            'lf': kwargs['lf'],
+        }
+        summary = None
+        if listing:
+            count = await run_native(
+                mft.list_directory,
+                filepath,
+                reference,
+                workers=workers,
+                **kwargs,
+            )
+            if anomalies:
+                summary = await run_native(
+                    mfttable.export_anomalies,
+                    filepath,
+                    workers=workers,
+                    **anomalies_kwargs,
+                )
+        elif reference:
+            count = await run_native(
+                mft.dump_entry, filepath, reference, **kwargs
+            )
+        else:
+            export_kwargs = {
+                'body_filepath': body_filepath,
+                'drive_letter': drive_letter,
+                'workers': workers,
+                'timeline_filepath': timeline_filepath,
+                'sort_buffer': get_value(
+                    arguments, 'sortbuf', mft.SORT_BUFFER_SIZE
+                ),
+            }
+            export_kwargs.update(kwargs)
+            if anomalies:
+                # anomalies are collected while records are exported
+                count, summary = await run_native(
+                    mfttable.export_with_anomalies,
+                    filepath,
+                    anomalies_csv_filepath=anomalies_kwargs['csv_filepath'],
+                    anomalies_json_filepath=anomalies_kwargs['json_filepath'],
+                    **export_kwargs,
+                )
+            else:
+                count = await run_native(mft.export, filepath, **export_kwargs)
+        LOGGER.info("native parser exported %d records", count)
+        if summary is not None:
+            LOGGER.info("native parser anomalies summary: %s", summary)
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using MFTECmd"""
+        if get_value(arguments, 'native', False) or get_value(
+            arguments, 'carve', False
+        ):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.mftecmd.bin',
@@ -0,0 +1,4 @@
+"""Datashark Windows native parsers
+
+In-process parsers used by processors when their 'native' argument is set
+"""
@@ -0,0 +1,523 @@
+"""Native Amcache.hve parser
+"""
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .common import (
+    FILETIME_TICKS_PER_SECOND,
+    FILETIME_UNIX_EPOCH,
+    ParsingError,
+    RowWriter,
+    format_filetime,
+    iter_pool,
+)
+from .hashset import HashFilter, compile_hash_set, normalize_sha1
+from .regf import HiveRecovery, RegistryHive, RegistryKey, recover
+from .regflog import transaction_logs
+
+DEFAULT_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss'
+PRECISE_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss.fffffff'
+KEY_FIELDS = ['KeyName', 'KeyLastWriteTimestamp']
+FILE_FIELDS = [
+    'ApplicationName',
+    'ProgramId',
+    'KeyName',
+    'KeyLastWriteTimestamp',
+    'SHA1',
+    'IsOsComponent',
+    'FullPath',
+    'Name',
+    'FileExtension',
+    'LinkDate',
+    'ProductName',
+    'Size',
+    'Version',
+    'ProductVersion',
+    'LongPathHash',
+    'BinaryType',
+    'IsPeFile',
+    'BinFileVersion',
+    'BinProductVersion',
+    'Usn',
+    'Language',
+    'Publisher',
+    'OriginalFileName',
+]
+PROGRAM_FIELDS = KEY_FIELDS + [
+    'ProgramId',
+    'ProgramInstanceId',
+    'Name',
+    'Version',
+    'Publisher',
+    'Language',
+    'InstallDate',
+    'Source',
+    'RootDirPath',
+    'HiddenArp',
+    'UninstallString',
+    'RegistryKeyPath',
+    'StoreAppType',
+    'InboxModernApp',
+    'ManifestPath',
+    'PackageFullName',
+    'MsiPackageCode',
+    'MsiProductCode',
+    'MsiInstallDate',
+    'BundleManifestPath',
+    'UserSid',
+    'OSVersionAtInstallTime',
+    'Type',
+]
+DRIVER_BINARY_FIELDS = KEY_FIELDS + [
+    'DriverName',
+    'SHA1',
+    'DriverCompany',
+    'DriverVersion',
+    'Product',
+    'ProductVersion',
+    'Service',
+    'DriverSigned',
+    'DriverIsKernelMode',
+    'DriverInBox',
+    'Inf',
+    'DriverTimeStamp',
+    'DriverLastWriteTime',
+    'ImageSize',
+    'DriverCheckSum',
+    'WdfVersion',
+    'DriverType',
+]
+DEVICE_PNP_FIELDS = KEY_FIELDS + [
+    'Model',
+    'Manufacturer',
+    'Description',
+    'Class',
+    'ClassGuid',
+    'BusReportedDescription',
+    'ContainerId',
+    'DriverId',
+    'DriverName',
+    'DriverPackageStrongName',
+    'DriverVerDate',
+    'DriverVerVersion',
+    'Enumerator',
+    'HWID',
+    'Inf',
+    'InstallState',
+    'MatchingID',
+    'ParentId',
+    'ProblemCode',
+    'Provider',
+    'Service',
+    'Stackid',
+]
+SHORTCUT_FIELDS = KEY_FIELDS + ['ShortCutPath']
+ASSOCIATED_OUTPUTS = ('AssociatedFileEntries', 'LegacyAssociatedFileEntries')
+# legacy value names and their column, timestamps are decoded separately
+LEGACY_FILE_VALUES = {
+    '0': 'ProductName',
+    '1': 'CompanyName',
+    '2': 'FileVersionNumber',
+    '3': 'LanguageCode',
+    '5': 'FileVersionString',
+    '6': 'FileSize',
+    '7': 'SizeOfImage',
+    '8': 'PEHeaderHash',
+    '9': 'PEHeaderChecksum',
+    'c': 'FileDescription',
+    'f': 'LinkerCompileTime',
+    '11': 'LastModified',
+    '12': 'Created',
+    '15': 'FullPath',
+    '17': 'LastModified2',
+    '100': 'ProgramId',
+    '101': 'SHA1',
+}
+LEGACY_FILE_FILETIMES = ('LastModified', 'Created', 'LastModified2')
+LEGACY_FILE_FIELDS = [
+    'ProgramName',
+    'ProgramId',
+    'VolumeId',
+    'VolumeIdLastWriteTimestamp',
+    'FileId',
+    'FileIdLastWriteTimestamp',
+    'SHA1',
+    'FullPath',
+    'FileExtension',
+    'MFTEntryNumber',
+    'MFTSequenceNumber',
+    'FileSize',
+    'FileVersionString',
+    'FileVersionNumber',
+    'FileDescription',
+    'SizeOfImage',
+    'PEHeaderHash',
+    'PEHeaderChecksum',
+    'LinkerCompileTime',
+    'LanguageCode',
+    'ProductName',
+    'CompanyName',
+    'Created',
+    'LastModified',
+    'LastModified2',
+]
+LEGACY_PROGRAM_VALUES = {
+    '0': 'ProgramName',
+    '1': 'ProgramVersion',
+    '2': 'VendorName',
+    '3': 'LanguageCode',
+    '6': 'EntryType',
+    '7': 'UninstallRegistryKey',
+    'a': 'InstallDate',
+    'b': 'UninstallDate',
+    'd': 'PathsList',
+    'f': 'ProductCode',
+    '10': 'PackageCode',
+    '11': 'MsiProductCode',
+    '12': 'MsiPackageCode',
+}
+LEGACY_PROGRAM_FIELDS = ['ProgramId', 'ProgramIdLastWriteTimestamp'] + [
+    column for column in LEGACY_PROGRAM_VALUES.values()
+]
+# category name: (key path, outputs and their columns)
+CATEGORIES = {
+    'InventoryApplicationFile': (
+        'Root\\InventoryApplicationFile',
+        {
+            'UnassociatedFileEntries': FILE_FIELDS,
+            'AssociatedFileEntries': FILE_FIELDS,
+        },
+    ),
+    'InventoryApplication': (
+        'Root\\InventoryApplication',
+        {'ProgramEntries': PROGRAM_FIELDS},
+    ),
+    'DriverBinary': (
+        'Root\\InventoryDriverBinary',
+        {'DriveBinaries': DRIVER_BINARY_FIELDS},
+    ),
+    'DevicePnp': (
+        'Root\\InventoryDevicePnp',
+        {'DevicePnps': DEVICE_PNP_FIELDS},
+    ),
+    'ShortCuts': (
+        'Root\\InventoryApplicationShortcut',
+        {'ShortCuts': SHORTCUT_FIELDS},
+    ),
+    'File': (
+        'Root\\File',
+        {
+            'LegacyUnassociatedFileEntries': LEGACY_FILE_FIELDS,
+            'LegacyAssociatedFileEntries': LEGACY_FILE_FIELDS,
+        },
+    ),
+    'Programs': (
+        'Root\\Programs',
+        {'LegacyProgramEntries': LEGACY_PROGRAM_FIELDS},
+    ),
+}
+# category name: (key path, value) of the program names of its entries
+PROGRAM_NAMES = {
+    'InventoryApplicationFile': ('Root\\InventoryApplication', 'Name'),
+    'File': ('Root\\Programs', '0'),
+}
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '|'.join(value)
+    if isinstance(value, bytes):
+        return value.hex().upper()
+    return value
+
+
+def _unix_time(seconds, dt_format: str) -> str:
+    if not isinstance(seconds, int) or not seconds:
+        return ''
+    return format_filetime(
+        seconds * FILETIME_TICKS_PER_SECOND + FILETIME_UNIX_EPOCH, dt_format
+    )
+
+
+def _sha1(value) -> str:
+    digest = normalize_sha1(value) if value else None
+    return digest.hex() if digest else ''
+
+
+def _extension(path: str) -> str:
+    name = path.rsplit('\\', 1)[-1]
+    return f'.{name.rsplit(".", 1)[1]}' if '.' in name else ''
+
+
+def key_values(key: RegistryKey) -> Dict[str, object]:
+    """Decoded values of a key in a single pass over its value list"""
+    return {value.name: value.value for value in key.values()}
+
+
+def key_row(
+    key: RegistryKey, values: Dict[str, object], fields: List[str], dt_format
+) -> dict:
+    """Row of a key whose value names are column names"""
+    row = {field: _format(values.get(field)) for field in fields}
+    row['KeyName'] = key.name
+    row['KeyLastWriteTimestamp'] = format_filetime(key.last_written, dt_format)
+    return row
+
+
+def _iter_subkeys(hive: RegistryHive, path: str) -> Iterator[RegistryKey]:
+    key = hive.key(path)
+    if key is None:
+        return
+    for subkey in key.subkeys():
+        yield subkey
+
+
+def _program_names(hive: RegistryHive, path: str, value: str) -> Dict:
+    names = {}
+    for key in _iter_subkeys(hive, path):
+        try:
+            names[key.name] = _format(key.get(value, ''))
+        except ParsingError:
+            continue
+    return names
+
+
+def program_names(hive: RegistryHive, category: str) -> Dict[str, str]:
+    """Program names by program id used by the file entries of category"""
+    if category not in PROGRAM_NAMES:
+        return {}
+    return _program_names(hive, *PROGRAM_NAMES[category])
+
+
+def iter_file_rows(
+    hive: RegistryHive,
+    dt_format: str,
+    hash_filter: HashFilter,
+    programs: Optional[Dict[str, str]] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (output, row) of InventoryApplicationFile entries"""
+    if programs is None:
+        programs = program_names(hive, 'InventoryApplicationFile')
+    for key in _iter_subkeys(hive, 'Root\\InventoryApplicationFile'):
+        try:
+            values = key_values(key)
+        except ParsingError:
+            continue
+        row = key_row(key, values, FILE_FIELDS, dt_format)
+        row['SHA1'] = _sha1(values.get('FileId'))
+        if hash_filter and not hash_filter(row['SHA1']):
+            continue
+        row['FullPath'] = _format(values.get('LowerCaseLongPath'))
+        row['FileExtension'] = _extension(row['FullPath'])
+        program_id = row['ProgramId']
+        if program_id in programs:
+            row['ApplicationName'] = programs[program_id]
+            yield 'AssociatedFileEntries', row
+        else:
+            yield 'UnassociatedFileEntries', row
+
+
+def iter_key_rows(
+    hive: RegistryHive, path: str, output: str, fields: List[str], dt_format
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (output, row) of every subkey of path"""
+    for key in _iter_subkeys(hive, path):
+        try:
+            values = key_values(key)
+        except ParsingError:
+            continue
+        row = key_row(key, values, fields, dt_format)
+        if 'SHA1' in fields:
+            row['SHA1'] = _sha1(values.get('DriverId'))
+        yield output, row
+
+
+def iter_legacy_file_rows(
+    hive: RegistryHive,
+    dt_format: str,
+    hash_filter: HashFilter,
+    programs: Optional[Dict[str, str]] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (output, row) of File\\{volume}\\{file} entries"""
+    if programs is None:
+        programs = program_names(hive, 'File')
+    for volume in _iter_subkeys(hive, 'Root\\File'):
+        volume_written = format_filetime(volume.last_written, dt_format)
+        try:
+            keys = list(volume.subkeys())
+        except ParsingError:
+            continue
+        for key in keys:
+            try:
+                values = key_values(key)
+            except ParsingError:
+                continue
+            row = {
+                column: _format(values.get(name))
+                for name, column in LEGACY_FILE_VALUES.items()
+            }
+            row['SHA1'] = _sha1(values.get('101'))
+            if hash_filter and not hash_filter(row['SHA1']):
+                continue
+            for column in LEGACY_FILE_FILETIMES:
+                value = row[column]
+                row[column] = (
+                    format_filetime(value, dt_format)
+                    if isinstance(value, int)
+                    else ''
+                )
+            row['LinkerCompileTime'] = _unix_time(values.get('f'), dt_format)
+            row['VolumeId'] = volume.name
+            row['VolumeIdLastWriteTimestamp'] = volume_written
+            row['FileId'] = key.name
+            row['FileIdLastWriteTimestamp'] = format_filetime(
+                key.last_written, dt_format
+            )
+            row['FileExtension'] = _extension(str(row['FullPath']))
+            try:
+                reference = int(key.name, 16)
+                row['MFTEntryNumber'] = reference & 0xFFFFFFFFFFFF
+                row['MFTSequenceNumber'] = reference >> 48
+            except ValueError:
+                pass
+            program_id = row['ProgramId']
+            if program_id in programs:
+                row['ProgramName'] = programs[program_id]
+                yield 'LegacyAssociatedFileEntries', row
+            else:
+                yield 'LegacyUnassociatedFileEntries', row
+
+
+def iter_legacy_program_rows(
+    hive: RegistryHive, dt_format: str
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (output, row) of Programs\\{program} entries"""
+    for key in _iter_subkeys(hive, 'Root\\Programs'):
+        try:
+            values = key_values(key)
+        except ParsingError:
+            continue
+        row = {
+            column: _format(values.get(name))
+            for name, column in LEGACY_PROGRAM_VALUES.items()
+        }
+        row['ProgramId'] = key.name
+        row['ProgramIdLastWriteTimestamp'] = format_filetime(
+            key.last_written, dt_format
+        )
+        for name in ('InstallDate', 'UninstallDate'):
+            row[name] = _unix_time(row[name], dt_format)
+        yield 'LegacyProgramEntries', row
+
+
+def iter_category_rows(
+    hive: RegistryHive,
+    category: str,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    hash_filter: HashFilter = HashFilter(),
+    programs: Optional[Dict[str, str]] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (output, row) of an Amcache category
+
+    programs are the program names of the category when already decoded
+    """
+    path, outputs = CATEGORIES[category]
+    if category == 'InventoryApplicationFile':
+        return iter_file_rows(hive, dt_format, hash_filter, programs)
+    if category == 'File':
+        return iter_legacy_file_rows(hive, dt_format, hash_filter, programs)
+    if category == 'Programs':
+        return iter_legacy_program_rows(hive, dt_format)
+    output, fields = next(iter(outputs.items()))
+    return iter_key_rows(hive, path, output, fields, dt_format)
+
+
+def _process_category(
+    filepath: Path,
+    recovery: Optional[HiveRecovery],
+    programs: Optional[Dict[str, str]],
+    category: str,
+    directory: Path,
+    basename: str,
+    include_associated: bool,
+    dt_format: str,
+    hash_filter: HashFilter,
+) -> Dict[str, int]:
+    """Stream rows of a category to one CSV per output
+
+    Outputs are only created once they get a row, associated file entries
+    are only written when include_associated is set
+    """
+    _, fields = CATEGORIES[category]
+    writers = {}
+    with ExitStack() as stack:
+        hive = stack.enter_context(RegistryHive(filepath, recovery=recovery))
+        for output, row in iter_category_rows(
+            hive, category, dt_format, hash_filter, programs
+        ):
+            if output in ASSOCIATED_OUTPUTS and not include_associated:
+                continue
+            writer = writers.get(output)
+            if writer is None:
+                writer = stack.enter_context(
+                    RowWriter(
+                        fields[output],
+                        Path(directory) / f'{basename}_{output}.csv',
+                    )
+                )
+                writers[output] = writer
+            writer.write(row)
+    return {output: writer.count for output, writer in writers.items()}
+
+
+def export(
+    filepath: Path,
+    directory: Path,
+    basename: str = 'Amcache',
+    include_associated: bool = False,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    replay_logs: bool = True,
+    hash_filter: HashFilter = HashFilter(),
+    workers: int = 0,
+) -> Dict[str, int]:
+    """Export Amcache categories to CSV files under directory
+
+    Transaction logs found next to the hive are replayed once when it is
+    dirty and program names are decoded once, both are handed to workers
+    which extract a category each and stream its rows. A dirty hive is only
+    parsed as is when replay_logs is false. Returns the number of rows
+    written per output.
+    """
+    if hash_filter:
+        compile_hash_set(hash_filter.blacklist or hash_filter.whitelist)
+    logs = transaction_logs(filepath) if replay_logs else None
+    recovery = recover(filepath, logs)
+    with RegistryHive(filepath, recovery=recovery) as hive:
+        programs = {
+            category: program_names(hive, category)
+            for category in PROGRAM_NAMES
+        }
+    counts = {}
+    for result in iter_pool(
+        _process_category,
+        (
+            (
+                filepath,
+                recovery,
+                programs.get(category),
+                category,
+                directory,
+                basename,
+                include_associated,
+                dt_format,
+                hash_filter,
+            )
+            for category in CATEGORIES
+        ),
+        min(workers or len(CATEGORIES), len(CATEGORIES)),
+        ordered=False,
+    ):
+        counts.update(result)
+    return counts
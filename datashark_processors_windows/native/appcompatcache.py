@@ -0,0 +1,278 @@
+"""Native AppCompatCache (shimcache) parser
+"""
+import re
+import heapq
+from struct import Struct, error as StructError
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from .common import ParsingError, RowWriter, format_filetime, iter_pool
+from .regf import HiveRecovery, RegistryHive, recover
+from .regflog import transaction_logs
+
+DEFAULT_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss'
+CACHE_KEY = 'Control\\Session Manager\\AppCompatCache'
+CACHE_VALUE = 'AppCompatCache'
+CONTROL_SET_PATTERN = re.compile(r'ControlSet(\d{3})', re.IGNORECASE)
+WIN7_MAGIC = 0xBADC0FEE
+WIN7_HEADER_SIZE = 128
+WIN8_HEADER_SIZE = 128
+WIN8_SIGNATURE = b'00ts'
+WIN81_SIGNATURE = b'10ts'
+WIN10_HEADER_SIZES = (0x30, 0x34)
+INSERT_FLAG_EXECUTED = 0x00000002
+APPCOMPATCACHE_FIELDS = [
+    'ControlSet',
+    'CacheEntryPosition',
+    'Path',
+    'LastModifiedTimeUTC',
+    'Executed',
+    'SourceFile',
+]
+
+_WIN7_X64_ENTRY = Struct('<HH4xQQIIQQ')
+_WIN7_X86_ENTRY = Struct('<HHIQIIII')
+_ENTRY_HEADER = Struct('<4s4xIH')
+_WIN8_ENTRY_TAIL = Struct('<IIQI')
+_WIN10_ENTRY_TAIL = Struct('<QI')
+_U16 = Struct('<H')
+_U32 = Struct('<I')
+
+
+@dataclass
+class CacheEntry:
+    """AppCompatCache entry"""
+
+    position: int
+    path: str
+    last_modified: int
+    executed: str
+
+
+def _path(data) -> str:
+    return bytes(data).decode('utf-16-le', errors='replace')
+
+
+def _executed(flags: int) -> str:
+    return 'Yes' if flags & INSERT_FLAG_EXECUTED else 'No'
+
+
+def decode_win7(data) -> Iterator[CacheEntry]:
+    """Decode Windows 7 and Server 2008 R2 cache, x86 or x64"""
+    count = _U32.unpack_from(data, 4)[0]
+    x64 = _U32.unpack_from(data, WIN7_HEADER_SIZE + 4)[0] == 0
+    entry = _WIN7_X64_ENTRY if x64 else _WIN7_X86_ENTRY
+    for position in range(count):
+        offset = WIN7_HEADER_SIZE + position * entry.size
+        (
+            length,
+            _,
+            path_offset,
+            last_modified,
+            flags,
+            _,
+            _,
+            _,
+        ) = entry.unpack_from(data, offset)
+        yield CacheEntry(
+            position,
+            _path(data[path_offset : path_offset + length]),
+            last_modified,
+            _executed(flags),
+        )
+
+
+def decode_win8(data, signature: bytes) -> Iterator[CacheEntry]:
+    """Decode Windows 8 and 8.1 cache"""
+    offset = WIN8_HEADER_SIZE
+    position = 0
+    while offset + _ENTRY_HEADER.size <= len(data):
+        entry_signature, size, length = _ENTRY_HEADER.unpack_from(data, offset)
+        if entry_signature != signature:
+            break
+        start = offset + _ENTRY_HEADER.size
+        path = _path(data[start : start + length])
+        tail = start + length
+        if signature == WIN81_SIGNATURE:
+            tail += 2 + _U16.unpack_from(data, tail)[0]
+        flags, _, last_modified, _ = _WIN8_ENTRY_TAIL.unpack_from(data, tail)
+        yield CacheEntry(position, path, last_modified, _executed(flags))
+        offset += 12 + size
+        position += 1
+
+
+def decode_win10(data, header_size: int) -> Iterator[CacheEntry]:
+    """Decode Windows 10 and 11 cache
+
+    Entries have no insertion flags, the last dword of their data tells
+    whether they were executed
+    """
+    offset = header_size
+    position = 0
+    while offset + _ENTRY_HEADER.size <= len(data):
+        signature, size, length = _ENTRY_HEADER.unpack_from(data, offset)
+        if signature != WIN81_SIGNATURE:
+            break
+        start = offset + _ENTRY_HEADER.size
+        path = _path(data[start : start + length])
+        tail = start + length
+        last_modified, data_size = _WIN10_ENTRY_TAIL.unpack_from(data, tail)
+        executed = 'No'
+        if data_size >= 4:
+            end = tail + _WIN10_ENTRY_TAIL.size + data_size
+            if _U32.unpack_from(data, end - 4)[0] == 1:
+                executed = 'Yes'
+        yield CacheEntry(position, path, last_modified, executed)
+        offset += 12 + size
+        position += 1
+
+
+def decode(data) -> List[CacheEntry]:
+    """Decode an AppCompatCache value according to its header"""
+    try:
+        header = _U32.unpack_from(data)[0]
+        if header == WIN7_MAGIC:
+            return list(decode_win7(data))
+        if header in WIN10_HEADER_SIZES:
+            return list(decode_win10(data, header))
+        if header == WIN8_HEADER_SIZE:
+            signature = bytes(data[WIN8_HEADER_SIZE : WIN8_HEADER_SIZE + 4])
+            if signature in (WIN8_SIGNATURE, WIN81_SIGNATURE):
+                return list(decode_win8(data, signature))
+    except StructError as exc:
+        raise ParsingError(f"truncated AppCompatCache: {exc}") from exc
+    raise ParsingError(f"unsupported AppCompatCache format: {header:#x}")
+
+
+def control_sets(
+    hive: RegistryHive, control_set: Optional[int] = None
+) -> List[int]:
+    """Numbers of the ControlSetNNN keys, only control_set when given"""
+    numbers = []
+    for key in hive.root.subkeys():
+        match = CONTROL_SET_PATTERN.fullmatch(key.name)
+        if match:
+            numbers.append(int(match.group(1)))
+    if control_set is not None:
+        numbers = [number for number in numbers if number == control_set]
+    return sorted(numbers)
+
+
+def _process_control_set(
+    filepath: Path,
+    recovery: Optional[HiveRecovery],
+    control_set: int,
+    sort: bool,
+) -> Tuple[List[Tuple[int, CacheEntry]], Optional[str]]:
+    """Decode the cache of a control set
+
+    When sort is set, entries are ordered by last modified time descending,
+    ready to be merged with those of other control sets. Returns the entries
+    and the parsing error which prevented decoding them, if any.
+    """
+    try:
+        with RegistryHive(filepath, recovery=recovery) as hive:
+            key = hive.key(f'ControlSet{control_set:03d}\\{CACHE_KEY}')
+            value = key.value(CACHE_VALUE) if key is not None else None
+            if value is None:
+                return [], None
+            entries = decode(value.data)
+    except ParsingError as exc:
+        return [], str(exc)
+    if sort:
+        entries.sort(key=lambda entry: entry.last_modified, reverse=True)
+    return [(control_set, entry) for entry in entries], None
+
+
+def iter_entries(
+    filepath: Path,
+    control_set: Optional[int] = None,
+    sort: bool = False,
+    replay_logs: bool = True,
+    workers: int = 0,
+    errors: Optional[Dict[int, str]] = None,
+) -> Iterator[Tuple[int, CacheEntry]]:
+    """Yield (control set, entry) of the caches of every control set
+
+    Transaction logs found next to the hive are replayed once when it is
+    dirty and the recovered pages are shared by control sets, which are
+    decoded concurrently. Entries already found in a previous control set,
+    same path and last modified time, are skipped.
+    When sort is set, the per control set lists are merged by last
+    modified time descending.
+    A control set which cannot be decoded is skipped and its parsing error
+    stored in errors, ParsingError is raised when none can be decoded.
+    """
+    logs = transaction_logs(filepath) if replay_logs else None
+    recovery = recover(filepath, logs)
+    with RegistryHive(filepath, recovery=recovery) as hive:
+        numbers = control_sets(hive, control_set)
+    if not numbers:
+        return
+    results = []
+    failures = {}
+    for number, (entries, error) in zip(
+        numbers,
+        iter_pool(
+            _process_control_set,
+            ((filepath, recovery, number, sort) for number in numbers),
+            min(workers or len(numbers), len(numbers)),
+        ),
+    ):
+        if error is None:
+            results.append(entries)
+        else:
+            failures[number] = error
+    if len(failures) == len(numbers):
+        number, error = next(iter(failures.items()))
+        raise ParsingError(f"ControlSet{number:03d}: {error}")
+    if errors is not None:
+        errors.update(failures)
+    if sort:
+        merged = heapq.merge(
+            *results, key=lambda item: item[1].last_modified, reverse=True
+        )
+    else:
+        merged = (item for result in results for item in result)
+    seen = set()
+    for number, entry in merged:
+        identity = (entry.path.upper(), entry.last_modified)
+        if identity in seen:
+            continue
+        seen.add(identity)
+        yield number, entry
+
+
+def export(
+    filepath: Path,
+    csv_filepath: Path,
+    control_set: Optional[int] = None,
+    sort: bool = False,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    replay_logs: bool = True,
+    workers: int = 0,
+) -> Tuple[int, Dict[int, str]]:
+    """Export AppCompatCache entries of a SYSTEM hive to CSV
+
+    Returns the number of exported entries and the parsing errors of the
+    control sets which were skipped
+    """
+    source = str(filepath)
+    errors = {}
+    with RowWriter(APPCOMPATCACHE_FIELDS, csv_filepath) as writer:
+        for number, entry in iter_entries(
+            filepath, control_set, sort, replay_logs, workers, errors
+        ):
+            writer.write(
+                {
+                    'ControlSet': number,
+                    'CacheEntryPosition': entry.position,
+                    'Path': entry.path,
+                    'LastModifiedTimeUTC': format_filetime(
+                        entry.last_modified, dt_format
+                    ),
+                    'Executed': entry.executed,
+                    'SourceFile': source,
+                }
+            )
+        return writer.count, errors
@@ -0,0 +1,109 @@
+"""Jump list AppID descriptions
+"""
+import os
+import json
+from hashlib import sha1
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, Optional
+from .common import cache_directory
+
+BUILTIN_APP_IDS = {
+    '1b4dd67f29cb1962': 'Windows Explorer Pinned and Recent',
+    '5f7b5f1e01b83767': 'Quick Access',
+    'f01b4d95cf55d32a': 'Windows Explorer Windows 8.1/10',
+    '7e4dca80246863e3': 'Control Panel',
+    '9b9cdc69c1c24e2b': 'Notepad 64-bit',
+    '918e0ecb43d17e23': 'Notepad 32-bit',
+    '5d696d521de238c3': 'Google Chrome',
+    '1bc392b8e104a00e': 'Remote Desktop',
+    '9839aec31243a928': 'Microsoft Office Excel 2010 x86',
+    'a7bd71699cd38d1c': 'Microsoft Office Word 2010 x86',
+    '290532160612e071': 'WinRAR x64',
+    '6728dd69a3088f97': 'Windows Command Processor - cmd.exe 64-bit',
+}
+CACHE_DIRECTORY_NAME = 'appids'
+APP_IDS_CACHE_SIZE = 4
+
+_APP_IDS = OrderedDict()
+
+
+def parse_app_ids(filepath: Path) -> Dict[str, str]:
+    """Parse an appid|description file, malformed lines are ignored"""
+    app_ids = {}
+    with Path(filepath).open('r', encoding='utf-8', errors='replace') as fobj:
+        for line in fobj:
+            app_id, sep, description = line.strip().partition('|')
+            if sep and app_id:
+                app_ids[app_id.strip().lower()] = description.strip()
+    return app_ids
+
+
+def _artifact_filepath(filepath: Path, directory: Path) -> Path:
+    digest = sha1(repr(sorted(BUILTIN_APP_IDS.items())).encode('utf-8'))
+    with Path(filepath).open('rb') as fobj:
+        for chunk in iter(lambda: fobj.read(1 << 20), b''):
+            digest.update(chunk)
+    return directory / f'{digest.hexdigest()}.json'
+
+
+def _read_artifact(artifact: Path) -> Optional[Dict[str, str]]:
+    try:
+        with artifact.open('r', encoding='utf-8') as fobj:
+            app_ids = json.load(fobj)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(app_ids, dict) or not all(
+        isinstance(value, str) for value in app_ids.values()
+    ):
+        return None
+    return app_ids
+
+
+def compile_app_ids(
+    filepath: Path, directory: Optional[Path] = None
+) -> Dict[str, str]:
+    """Built-in AppIDs merged with those of filepath, through an artifact
+
+    The merged table is saved as JSON under directory, the private AppIDs
+    cache directory by default, named after the hash of the built-in table
+    and of the file content, so it is rebuilt only when one of them changes
+    and reused by every process otherwise
+    """
+    directory = Path(directory or cache_directory(CACHE_DIRECTORY_NAME))
+    artifact = _artifact_filepath(filepath, directory)
+    app_ids = _read_artifact(artifact)
+    if app_ids is not None:
+        return app_ids
+    app_ids = dict(BUILTIN_APP_IDS)
+    app_ids.update(parse_app_ids(filepath))
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        temporary = artifact.with_suffix(f'.{os.getpid()}.tmp')
+        with temporary.open('w', encoding='utf-8') as fobj:
+            json.dump(app_ids, fobj, sort_keys=True)
+        os.replace(temporary, artifact)
+    except OSError:
+        pass
+    return app_ids
+
+
+def load_app_ids(filepath: Optional[Path] = None) -> Dict[str, str]:
+    """Built-in AppIDs updated with those of filepath when given
+
+    Tables are kept per process keyed by file path, modification time and
+    size so every job of a worker shares the same table
+    """
+    if not filepath:
+        return BUILTIN_APP_IDS
+    stat = Path(filepath).stat()
+    key = (str(Path(filepath).resolve()), stat.st_mtime_ns, stat.st_size)
+    app_ids = _APP_IDS.get(key)
+    if app_ids is None:
+        app_ids = compile_app_ids(filepath)
+        _APP_IDS[key] = app_ids
+        while len(_APP_IDS) > APP_IDS_CACHE_SIZE:
+            _APP_IDS.popitem(last=False)
+    else:
+        _APP_IDS.move_to_end(key)
+    return app_ids
@@ -0,0 +1,137 @@
+"""Native USN record carver
+"""
+from mmap import mmap, ACCESS_READ
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+from .common import (
+    DEFAULT_DT_FORMAT,
+    FILETIME_ORIGIN,
+    ParsingError,
+    RowWriter,
+)
+from .usn import (
+    MAX_RECORD_SIZE,
+    MIN_RECORD_SIZE,
+    USN_FIELDS,
+    decode_record,
+    record_row,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 64 << 20
+LOOKAHEAD_WORDS = 10
+MIN_TIMESTAMP = datetime(1995, 1, 1)
+V2_NAME_OFFSET = 60
+V3_NAME_OFFSET = 76
+
+
+def _filetime(value: datetime) -> int:
+    delta = value - FILETIME_ORIGIN
+    return (delta.days * 86400 + delta.seconds) * 10000000
+
+
+def _shifted(words, shift: int, count: int):
+    view = words[shift : shift + count]
+    if len(view) < count:
+        view = np.concatenate([view, np.zeros(count - len(view), view.dtype)])
+    return view
+
+
+def _candidate_mask(words, count: int, min_ts: int, max_ts: int):
+    header = words[:count]
+    length = header & 0xFFFFFFFF
+    major = (header >> 32) & 0xFFFF
+    minor = header >> 48
+    mask = (
+        (minor == 0)
+        & (length >= MIN_RECORD_SIZE)
+        & (length <= MAX_RECORD_SIZE)
+        & (length % 8 == 0)
+    )
+    version_mask = np.zeros(count, dtype=bool)
+    for version, ts_word, name_word, name_offset in (
+        (2, 4, 7, V2_NAME_OFFSET),
+        (3, 6, 9, V3_NAME_OFFSET),
+    ):
+        timestamp = _shifted(words, ts_word, count)
+        name = _shifted(words, name_word, count)
+        name_length = name & 0xFFFF
+        expected = (name_offset + name_length + 7) & ~np.uint64(7)
+        version_mask |= (
+            (major == version)
+            & (timestamp >= min_ts)
+            & (timestamp <= max_ts)
+            & (((name >> 16) & 0xFFFF) == name_offset)
+            & (name_length > 0)
+            & (name_length % 2 == 0)
+            & (length == expected)
+        )
+    return mask & version_mask
+
+
+def iter_candidates(
+    buffer,
+    min_timestamp: Optional[int] = None,
+    max_timestamp: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator:
+    """Yield arrays of candidate record offsets, one array per chunk
+
+    Every 8-byte aligned position of the chunk is checked at once for a sane
+    header, record length, name layout and timestamp range
+    """
+    if np is None:
+        raise ParsingError("numpy is required to carve USN records")
+    if min_timestamp is None:
+        min_timestamp = _filetime(MIN_TIMESTAMP)
+    if max_timestamp is None:
+        max_timestamp = _filetime(datetime.utcnow() + timedelta(days=1))
+    min_ts = np.uint64(min_timestamp)
+    max_ts = np.uint64(max_timestamp)
+    size = len(buffer) - len(buffer) % 8
+    chunk_size -= chunk_size % 8
+    for start in range(0, size, chunk_size):
+        end = min(start + chunk_size + LOOKAHEAD_WORDS * 8, size)
+        words = np.frombuffer(
+            buffer, dtype='<u8', count=(end - start) // 8, offset=start
+        )
+        count = min(chunk_size, size - start) // 8
+        offsets = np.flatnonzero(_candidate_mask(words, count, min_ts, max_ts))
+        del words
+        if offsets.size:
+            yield offsets * 8 + start
+
+
+def carve(
+    filepath: Path,
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+) -> int:
+    """Carve USN records from an arbitrary blob to CSV and/or JSON
+
+    Returns the number of carved records
+    """
+    source = str(filepath)
+    with Path(filepath).open('rb') as fobj, RowWriter(
+        USN_FIELDS, csv_filepath, json_filepath, lf
+    ) as writer:
+        try:
+            buffer = mmap(fobj.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            return 0
+        try:
+            for offsets in iter_candidates(buffer):
+                for offset in offsets.tolist():
+                    record = decode_record(buffer, offset)
+                    if record is not None:
+                        writer.write(record_row(record, source, dt_format))
+        finally:
+            buffer.close()
+        return writer.count
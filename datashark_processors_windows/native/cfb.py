@@ -0,0 +1,313 @@
+"""OLE Compound File Binary reader [MS-CFB]
+"""
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from .common import ParsingError
+
+CFB_SIGNATURE = bytes.fromhex('d0cf11e0a1b11ae1')
+HEADER_DIFAT_COUNT = 109
+DIRECTORY_ENTRY_SIZE = 128
+MAX_REGULAR_SECTOR = 0xFFFFFFFA
+END_OF_CHAIN = 0xFFFFFFFE
+NO_STREAM = 0xFFFFFFFF
+STORAGE = 1
+STREAM = 2
+ROOT_STORAGE = 5
+
+_HEADER = Struct('<8s16sHHHHH6sIIIIIIIII')
+_DIRECTORY_ENTRY = Struct('<64sHBBIII16sIQQIQ')
+_U32 = Struct('<I')
+
+
+@dataclass
+class DirectoryEntry:
+    """Compound file directory entry"""
+
+    sid: int
+    name: str
+    kind: int
+    start: int
+    size: int
+    created: int
+    modified: int
+
+    @property
+    def is_stream(self) -> bool:
+        """Whether entry is a stream"""
+        return self.kind == STREAM
+
+
+def is_compound_file(filepath: Path) -> bool:
+    """Check whether file starts with the compound file signature"""
+    with Path(filepath).open('rb') as fobj:
+        return fobj.read(len(CFB_SIGNATURE)) == CFB_SIGNATURE
+
+
+class CompoundFile:
+    """Memory-mapped compound file
+
+    FAT and MiniFAT sectors are located on demand, stream data is returned
+    as a view on the mapping when its sectors are contiguous
+    """
+
+    def __init__(self, filepath: Path):
+        self._filepath = Path(filepath)
+        self._fobj = None
+        self._mmap = None
+        self._view = None
+        self._difat = None
+        self._mini_fat_sectors = None
+        self._mini_stream_sectors = None
+        self._entries = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        """Map file and decode header"""
+        self._fobj = self._filepath.open('rb')
+        try:
+            self._mmap = mmap(self._fobj.fileno(), 0, access=ACCESS_READ)
+        except ValueError as exc:
+            self.close()
+            raise ParsingError("empty compound file") from exc
+        self._view = memoryview(self._mmap)
+        if len(self._mmap) < 512:
+            self.close()
+            raise ParsingError("truncated compound file header")
+        (
+            signature,
+            _,
+            _,
+            _,
+            byte_order,
+            sector_shift,
+            mini_sector_shift,
+            _,
+            _,
+            _,
+            self._first_directory_sector,
+            _,
+            self._mini_stream_cutoff,
+            self._first_mini_fat_sector,
+            _,
+            self._first_difat_sector,
+            self._difat_sector_count,
+        ) = _HEADER.unpack_from(self._mmap)
+        if signature != CFB_SIGNATURE or byte_order != 0xFFFE:
+            self.close()
+            raise ParsingError("invalid compound file signature")
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_sector_shift
+        self._sector_count = len(self._mmap) // self.sector_size
+
+    def close(self):
+        """Unmap file, views handed out must not be used afterwards"""
+        if self._view is not None:
+            try:
+                self._view.release()
+                self._mmap.close()
+            except BufferError:
+                pass
+        self._view = None
+        self._mmap = None
+        self._entries = None
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+
+    def _sector_offset(self, sector: int) -> int:
+        if sector > MAX_REGULAR_SECTOR or sector + 1 >= self._sector_count:
+            raise ParsingError(f"sector out of bounds: {sector:#x}")
+        return (sector + 1) * self.sector_size
+
+    def _u32(self, offset: int) -> int:
+        return _U32.unpack_from(self._mmap, offset)[0]
+
+    @property
+    def difat(self) -> List[int]:
+        """FAT sector numbers"""
+        if self._difat is None:
+            difat = [
+                self._u32(76 + index * 4)
+                for index in range(HEADER_DIFAT_COUNT)
+            ]
+            per_sector = self.sector_size // 4 - 1
+            sector = self._first_difat_sector
+            for _ in range(self._difat_sector_count):
+                if sector > MAX_REGULAR_SECTOR:
+                    break
+                offset = self._sector_offset(sector)
+                difat.extend(
+                    self._u32(offset + index * 4)
+                    for index in range(per_sector)
+                )
+                sector = self._u32(offset + per_sector * 4)
+            self._difat = [
+                sector for sector in difat if sector <= MAX_REGULAR_SECTOR
+            ]
+        return self._difat
+
+    def _next_sector(self, sector: int) -> int:
+        per_sector = self.sector_size // 4
+        index = sector // per_sector
+        if index >= len(self.difat):
+            raise ParsingError(f"sector not covered by FAT: {sector:#x}")
+        offset = self._sector_offset(self.difat[index])
+        return self._u32(offset + (sector % per_sector) * 4)
+
+    def _chain(
+        self, start: int, next_sector: Callable[[int], int], limit: int
+    ) -> List[int]:
+        chain = []
+        sector = start
+        while sector <= MAX_REGULAR_SECTOR:
+            if len(chain) > limit:
+                raise ParsingError("sector chain loop detected")
+            chain.append(sector)
+            sector = next_sector(sector)
+        return chain
+
+    def _next_mini_sector(self, sector: int) -> int:
+        if self._mini_fat_sectors is None:
+            self._mini_fat_sectors = self._chain(
+                self._first_mini_fat_sector,
+                self._next_sector,
+                self._sector_count,
+            )
+        per_sector = self.sector_size // 4
+        index = sector // per_sector
+        if index >= len(self._mini_fat_sectors):
+            raise ParsingError(f"sector not covered by MiniFAT: {sector:#x}")
+        offset = self._sector_offset(self._mini_fat_sectors[index])
+        return self._u32(offset + (sector % per_sector) * 4)
+
+    def _mini_sector_offset(self, sector: int) -> int:
+        if self._mini_stream_sectors is None:
+            root = self.entries[0]
+            self._mini_stream_sectors = self._chain(
+                root.start, self._next_sector, self._sector_count
+            )
+        position = sector * self.mini_sector_size
+        index = position // self.sector_size
+        if index >= len(self._mini_stream_sectors):
+            raise ParsingError(f"mini sector out of bounds: {sector:#x}")
+        return (
+            self._sector_offset(self._mini_stream_sectors[index])
+            + position % self.sector_size
+        )
+
+    def _read(
+        self,
+        start: int,
+        size: int,
+        sector_size: int,
+        next_sector: Callable[[int], int],
+        sector_offset: Callable[[int], int],
+    ):
+        runs = []
+        sector = start
+        remaining = size
+        while remaining > 0:
+            if sector > MAX_REGULAR_SECTOR:
+                raise ParsingError("stream shorter than its declared size")
+            offset = sector_offset(sector)
+            length = min(sector_size, remaining)
+            if runs and runs[-1][0] + runs[-1][1] == offset:
+                runs[-1][1] += length
+            else:
+                runs.append([offset, length])
+            remaining -= length
+            if remaining > 0:
+                sector = next_sector(sector)
+        if not runs:
+            return self._view[0:0]
+        if len(runs) == 1:
+            offset, length = runs[0]
+            return self._view[offset : offset + length]
+        return b''.join(
+            self._view[offset : offset + length] for offset, length in runs
+        )
+
+    @property
+    def entries(self) -> List[DirectoryEntry]:
+        """Directory entries indexed by stream identifier"""
+        if self._entries is None:
+            entries = []
+            chain = self._chain(
+                self._first_directory_sector,
+                self._next_sector,
+                self._sector_count,
+            )
+            per_sector = self.sector_size // DIRECTORY_ENTRY_SIZE
+            for sector in chain:
+                offset = self._sector_offset(sector)
+                for index in range(per_sector):
+                    entries.append(
+                        self._decode_entry(
+                            len(entries), offset + index * DIRECTORY_ENTRY_SIZE
+                        )
+                    )
+            if not entries or entries[0].kind != ROOT_STORAGE:
+                raise ParsingError("missing compound file root entry")
+            self._entries = entries
+        return self._entries
+
+    def _decode_entry(self, sid: int, offset: int) -> DirectoryEntry:
+        (
+            name,
+            name_size,
+            kind,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+            created,
+            modified,
+            start,
+            size,
+        ) = _DIRECTORY_ENTRY.unpack_from(self._mmap, offset)
+        if self.sector_size == 512:
+            size &= 0xFFFFFFFF
+        name = name[: max(name_size - 2, 0)].decode(
+            'utf-16-le', errors='replace'
+        )
+        return DirectoryEntry(sid, name, kind, start, size, created, modified)
+
+    def streams(self) -> Dict[str, DirectoryEntry]:
+        """Streams by name"""
+        return {entry.name: entry for entry in self.entries if entry.is_stream}
+
+    def read_stream(self, entry: DirectoryEntry):
+        """Stream data, a view on the mapping when stored contiguously"""
+        if entry.size < self._mini_stream_cutoff:
+            return self._read(
+                entry.start,
+                entry.size,
+                self.mini_sector_size,
+                self._next_mini_sector,
+                self._mini_sector_offset,
+            )
+        return self._read(
+            entry.start,
+            entry.size,
+            self.sector_size,
+            self._next_sector,
+            self._sector_offset,
+        )
+
+    def open_stream(self, name: str) -> Optional[memoryview]:
+        """Stream data by name, None when missing"""
+        entry = self.streams().get(name)
+        if entry is None:
+            return None
+        return self.read_stream(entry)
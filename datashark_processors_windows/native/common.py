@@ -0,0 +1,299 @@
+"""Helpers shared by native parsers
+"""
+import re
+import csv
+import os
+import json
+import atexit
+import shutil
+import stat
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+FILETIME_ORIGIN = datetime(1601, 1, 1)
+FILETIME_TICKS_PER_SECOND = 10000000
+FILETIME_UNIX_EPOCH = 116444736000000000
+DT_TOKEN_PATTERN = re.compile(r'yyyy|MM|dd|HH|mm|ss|f{1,7}')
+DT_FIELDS = {
+    'yyyy': '{0.year:04d}',
+    'MM': '{0.month:02d}',
+    'dd': '{0.day:02d}',
+    'HH': '{0.hour:02d}',
+    'mm': '{0.minute:02d}',
+    'ss': '{0.second:02d}',
+}
+DEFAULT_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss.fffffff'
+CACHE_DIRECTORY_NAME = 'datashark'
+
+
+class ParsingError(Exception):
+    """Native parser error"""
+
+
+def filetime_to_datetime(filetime: int) -> Optional[datetime]:
+    """Convert a FILETIME to a naive UTC datetime"""
+    if not filetime:
+        return None
+    try:
+        return FILETIME_ORIGIN + timedelta(microseconds=filetime // 10)
+    except OverflowError:
+        return None
+
+
+def filetime_to_unix(filetime: int) -> int:
+    """Convert a FILETIME to seconds since unix epoch"""
+    if not filetime:
+        return 0
+    return (filetime - FILETIME_UNIX_EPOCH) // FILETIME_TICKS_PER_SECOND
+
+
+@lru_cache(maxsize=16)
+def _compile_dt_format(fmt: str) -> str:
+    parts = []
+    position = 0
+    for match in DT_TOKEN_PATTERN.finditer(fmt):
+        literal = fmt[position : match.start()]
+        parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        token = match.group(0)
+        if token[0] == 'f':
+            parts.append(f'{{1:.{len(token)}}}')
+        else:
+            parts.append(DT_FIELDS[token])
+        position = match.end()
+    literal = fmt[position:]
+    parts.append(literal.replace('{', '{{').replace('}', '}}'))
+    return ''.join(parts)
+
+
+def format_filetime(filetime: int, fmt: str = DEFAULT_DT_FORMAT) -> str:
+    """Format a FILETIME using a .NET-like custom date/time format
+
+    Fractional seconds keep the 100ns resolution of FILETIME
+    """
+    dtv = filetime_to_datetime(filetime)
+    if dtv is None:
+        return ''
+    ticks = f'{filetime % FILETIME_TICKS_PER_SECOND:07d}'
+    return _compile_dt_format(fmt).format(dtv, ticks)
+
+
+def source_times(filepath: Path) -> tuple:
+    """Created, modified and accessed FILETIME of a file"""
+    stat = Path(filepath).stat()
+    created = getattr(stat, 'st_birthtime', stat.st_ctime)
+    return tuple(
+        int(value * FILETIME_TICKS_PER_SECOND) + FILETIME_UNIX_EPOCH
+        for value in (created, stat.st_mtime, stat.st_atime)
+    )
+
+
+def iter_files(
+    directory: Path, suffixes: Optional[Tuple[str, ...]] = None
+) -> Iterator[Path]:
+    """Recursively yield files found under directory
+
+    Only files whose lowercase name ends with one of suffixes are yielded
+    when given. Directories are walked with os.scandir so entries are
+    streamed without an extra stat call per file.
+    """
+    stack = [str(directory)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif (
+                    suffixes is None or entry.name.lower().endswith(suffixes)
+                ) and entry.is_file():
+                    yield Path(entry.path)
+
+
+def output_filepath(
+    directory: Optional[Path], filename: Optional[str], default: str
+) -> Optional[Path]:
+    """Build output filepath from a directory and an optional filename"""
+    if not directory:
+        return None
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / (filename or default)
+
+
+def _trusted_directory(directory: Path) -> bool:
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        status = directory.lstat()
+    except OSError:
+        return False
+    if not stat.S_ISDIR(status.st_mode):
+        return False
+    getuid = getattr(os, 'getuid', None)
+    if getuid is None:
+        return True
+    if status.st_uid != getuid():
+        return False
+    if status.st_mode & 0o077:
+        try:
+            directory.chmod(0o700)
+        except OSError:
+            return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def _process_cache_directory() -> Path:
+    directory = Path(tempfile.mkdtemp(prefix=f'{CACHE_DIRECTORY_NAME}-'))
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    return directory
+
+
+@lru_cache(maxsize=None)
+def cache_directory(name: str) -> Path:
+    """Private directory holding compiled artifacts of given kind
+
+    Artifacts are kept under the per-user cache directory, created with
+    mode 0700 and only used when owned by the current user. When it cannot
+    be trusted, a directory private to the process is used instead.
+    """
+    try:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    except (KeyError, RuntimeError):
+        base = None
+    if base:
+        directory = Path(base) / CACHE_DIRECTORY_NAME
+        if _trusted_directory(directory) and _trusted_directory(
+            directory / name
+        ):
+            return directory / name
+    directory = _process_cache_directory() / name
+    directory.mkdir(mode=0o700, exist_ok=True)
+    return directory
+
+
+class RowWriter:
+    """Stream rows to optional CSV and JSON lines outputs"""
+
+    def __init__(
+        self,
+        fieldnames: List[str],
+        csv_filepath: Optional[Path] = None,
+        json_filepath: Optional[Path] = None,
+        lf: bool = True,
+    ):
+        self._fieldnames = fieldnames
+        self._csv_filepath = csv_filepath
+        self._json_filepath = json_filepath
+        self._lineterminator = '\n' if lf else '\r\n'
+        self._csv_fobj = None
+        self._json_fobj = None
+        self._csv_writer = None
+        self.count = 0
+
+    def __enter__(self):
+        if self._csv_filepath:
+            self._csv_fobj = Path(self._csv_filepath).open(
+                'w', newline='', encoding='utf-8'
+            )
+            self._csv_writer = csv.DictWriter(
+                self._csv_fobj,
+                fieldnames=self._fieldnames,
+                lineterminator=self._lineterminator,
+                extrasaction='ignore',
+            )
+            self._csv_writer.writeheader()
+        if self._json_filepath:
+            self._json_fobj = Path(self._json_filepath).open(
+                'w', encoding='utf-8'
+            )
+        return self
+
+    def __exit__(self, *_):
+        for fobj in (self._csv_fobj, self._json_fobj):
+            if fobj:
+                fobj.close()
+        self._csv_fobj = None
+        self._json_fobj = None
+        self._csv_writer = None
+
+    def write(self, row: Dict):
+        """Write a single row"""
+        if self._csv_writer:
+            self._csv_writer.writerow(row)
+        if self._json_fobj:
+            self._json_fobj.write(json.dumps(row, default=str))
+            self._json_fobj.write(self._lineterminator)
+        self.count += 1
+
+
+def iter_pool_ordered(
+    function: Callable, arguments: Iterable[tuple], workers: int = 0
+) -> Iterator:
+    """Map function over arguments in a process pool, preserving order
+
+    At most two tasks per worker are in flight so memory stays bounded.
+    0 workers means one worker per CPU.
+    """
+    workers = workers or os.cpu_count() or 1
+    arguments = iter(arguments)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque(
+            executor.submit(function, *args)
+            for _, args in zip(range(workers * 2), arguments)
+        )
+        while pending:
+            result = pending.popleft().result()
+            args = next(arguments, None)
+            if args is not None:
+                pending.append(executor.submit(function, *args))
+            yield result
+
+
+def iter_pool_unordered(
+    function: Callable, arguments: Iterable[tuple], workers: int = 0
+) -> Iterator:
+    """Map function over arguments in a process pool, in completion order
+
+    At most two tasks per worker are in flight so memory stays bounded.
+    0 workers means one worker per CPU.
+    """
+    workers = workers or os.cpu_count() or 1
+    arguments = iter(arguments)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {
+            executor.submit(function, *args)
+            for _, args in zip(range(workers * 2), arguments)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                args = next(arguments, None)
+                if args is not None:
+                    pending.add(executor.submit(function, *args))
+                yield future.result()
+
+
+def iter_pool(
+    function: Callable,
+    arguments: Iterable[tuple],
+    workers: int = 0,
+    ordered: bool = True,
+) -> Iterator:
+    """Map function over arguments, in-process when a single worker is used"""
+    if workers == 1:
+        return (function(*args) for args in arguments)
+    if ordered:
+        return iter_pool_ordered(function, arguments, workers)
+    return iter_pool_unordered(function, arguments, workers)
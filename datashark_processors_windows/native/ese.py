@@ -0,0 +1,676 @@
+"""Extensible Storage Engine database reader [ESE]
+"""
+from mmap import mmap, ACCESS_READ
+from uuid import UUID
+from struct import Struct, error as StructError
+from pathlib import Path
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from .common import ParsingError, format_filetime
+from .lzxpress import decompress_plain
+
+ESE_SIGNATURE = 0x89ABCDEF
+FILE_TYPE_DATABASE = 0
+FILE_HEADER_SIZE = 240
+PAGE_SIZES = (2048, 4096, 8192, 16384, 32768)
+PAGE_HEADER_SIZE = 40
+EXTENDED_PAGE_HEADER_SIZE = 80
+EXTENDED_PAGE_HEADER_REVISION = 0x11
+LARGE_PAGE_SIZE = 16384
+PAGE_CACHE_SIZE = 1024
+MAX_TREE_DEPTH = 16
+CATALOG_ROOT_PAGE = 4
+STATE_DIRTY_SHUTDOWN = 2
+PAGE_LEAF = 0x0002
+TAG_DEFUNCT = 0x2
+TAG_COMMON_KEY = 0x4
+KEY_PREFIX_DATA = b'\x7f'
+CATALOG_TABLE = 1
+CATALOG_COLUMN = 2
+CATALOG_LONG_VALUE = 4
+FIRST_VARIABLE_COLUMN = 128
+FIRST_TAGGED_COLUMN = 256
+TAGGED_COMPRESSED = 0x02
+TAGGED_LONG_VALUE = 0x04
+TAGGED_MULTI_VALUE = 0x08
+TAGGED_TWO_VALUES = 0x10
+COMPRESSION_7BIT_ASCII = 1
+COMPRESSION_7BIT_UNICODE = 2
+COMPRESSION_XPRESS = 3
+CODEPAGE_UNICODE = 1200
+# days from 1601-01-01 to the OLE automation date origin, 1899-12-30
+OLE_DATE_ORIGIN = 109205
+MILLISECONDS_PER_DAY = 86400000
+FILETIME_TICKS_PER_MILLISECOND = 10000
+# JET column types
+COLTYP_BIT = 1
+COLTYP_UNSIGNED_BYTE = 2
+COLTYP_SHORT = 3
+COLTYP_LONG = 4
+COLTYP_CURRENCY = 5
+COLTYP_IEEE_SINGLE = 6
+COLTYP_IEEE_DOUBLE = 7
+COLTYP_DATE_TIME = 8
+COLTYP_BINARY = 9
+COLTYP_TEXT = 10
+COLTYP_LONG_BINARY = 11
+COLTYP_LONG_TEXT = 12
+COLTYP_UNSIGNED_LONG = 14
+COLTYP_LONG_LONG = 15
+COLTYP_GUID = 16
+COLTYP_UNSIGNED_SHORT = 17
+
+_FILE_HEADER = Struct('<4xIII')
+_FORMAT = Struct('<II')
+_STATE = Struct('<I')
+_PAGE_HEADER = Struct('<16xIII6xHI')
+_TAG = Struct('<HH')
+_RECORD_HEADER = Struct('<BBH')
+_LONG_VALUE_ROOT = Struct('<II')
+_U16 = Struct('<H')
+_U32 = Struct('<I')
+_FIXED_TYPES = {
+    COLTYP_BIT: Struct('<B'),
+    COLTYP_UNSIGNED_BYTE: Struct('<B'),
+    COLTYP_SHORT: Struct('<h'),
+    COLTYP_LONG: Struct('<i'),
+    COLTYP_CURRENCY: Struct('<q'),
+    COLTYP_IEEE_SINGLE: Struct('<f'),
+    COLTYP_IEEE_DOUBLE: Struct('<d'),
+    COLTYP_DATE_TIME: Struct('<d'),
+    COLTYP_UNSIGNED_LONG: Struct('<I'),
+    COLTYP_LONG_LONG: Struct('<q'),
+    COLTYP_UNSIGNED_SHORT: Struct('<H'),
+}
+_TEXT_TYPES = (COLTYP_TEXT, COLTYP_LONG_TEXT)
+
+
+@dataclass
+class Column:
+    """Column definition from the catalog"""
+
+    identifier: int
+    name: str
+    type: int
+    size: int
+    codepage: int = 0
+
+
+# MSysObjects columns needed to decode the catalog itself
+CATALOG_COLUMNS = [
+    Column(1, 'ObjidTable', COLTYP_LONG, 4),
+    Column(2, 'Type', COLTYP_SHORT, 2),
+    Column(3, 'Id', COLTYP_LONG, 4),
+    Column(4, 'ColtypOrPgnoFDP', COLTYP_LONG, 4),
+    Column(5, 'SpaceUsage', COLTYP_LONG, 4),
+    Column(6, 'Flags', COLTYP_LONG, 4),
+    Column(7, 'PagesOrLocale', COLTYP_LONG, 4),
+    Column(128, 'Name', COLTYP_TEXT, 0),
+]
+
+
+def long_key(value: int) -> bytes:
+    """Normalized ascending key of a Long column value"""
+    # flipping the sign bit makes big-endian bytes sort as signed values
+    normalized = (value + 0x80000000) & 0xFFFFFFFF
+    return KEY_PREFIX_DATA + normalized.to_bytes(4, 'big')
+
+
+def ole_date_to_filetime(value: float) -> int:
+    """FILETIME of an OLE automation date, 0 before 1601
+
+    Dates are rounded to the millisecond as they are stored as doubles
+    """
+    milliseconds = int(value * MILLISECONDS_PER_DAY + 0.5)
+    return max(
+        (milliseconds + OLE_DATE_ORIGIN * MILLISECONDS_PER_DAY)
+        * FILETIME_TICKS_PER_MILLISECOND,
+        0,
+    )
+
+
+def format_value(
+    column: Column, value, dt_format: str, filetime_columns=()
+) -> object:
+    """Value as exported, empty when null
+
+    DateTime columns and integer columns named in filetime_columns are
+    formatted as dates, binary data as hexadecimal
+    """
+    if value is None:
+        return ''
+    if column.type == COLTYP_DATE_TIME or (
+        column.name in filetime_columns and isinstance(value, int)
+    ):
+        return format_filetime(value, dt_format)
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def _decompress_7bit(data: bytes, wide: bool) -> bytes:
+    # the low bits of the header tell how many bits of the last byte are used
+    bits = (len(data) - 2) * 8 + (data[0] & 7) + 1
+    value = int.from_bytes(data[1:], 'little')
+    chars = bytes((value >> (7 * index)) & 0x7F for index in range(bits // 7))
+    if wide:
+        return chars.decode('ascii').encode('utf-16-le')
+    return chars
+
+
+def decompress(data) -> bytes:
+    """Decompress a compressed column value"""
+    data = bytes(data)
+    if len(data) < 2:
+        raise ParsingError("truncated compressed value")
+    kind = data[0] >> 3
+    if kind == COMPRESSION_7BIT_ASCII:
+        return _decompress_7bit(data, False)
+    if kind == COMPRESSION_7BIT_UNICODE:
+        return _decompress_7bit(data, True)
+    if kind == COMPRESSION_XPRESS:
+        if len(data) < 3:
+            raise ParsingError("truncated compressed value")
+        return decompress_plain(data[3:], _U16.unpack_from(data, 1)[0])
+    raise ParsingError(f"unsupported value compression: {kind}")
+
+
+class Page:
+    """Decoded page, leaf and branch entries are (key, data) pairs"""
+
+    def __init__(self, number: int, data: memoryview, extended: bool):
+        self.number = number
+        large = len(data) >= LARGE_PAGE_SIZE
+        try:
+            (
+                self.previous,
+                self.next,
+                self.objid,
+                tag_count,
+                self.flags,
+            ) = _PAGE_HEADER.unpack_from(data)
+        except StructError as exc:
+            raise ParsingError(f"truncated page: {number}") from exc
+        body = data[
+            EXTENDED_PAGE_HEADER_SIZE if extended else PAGE_HEADER_SIZE :
+        ]
+        values = []
+        for index in range(tag_count):
+            position = len(data) - _TAG.size * (index + 1)
+            if position < PAGE_HEADER_SIZE:
+                raise ParsingError(f"invalid page tag count: {number}")
+            size, offset = _TAG.unpack_from(data, position)
+            if large:
+                size &= 0x7FFF
+                offset &= 0x7FFF
+                flags = None
+            else:
+                flags = offset >> 13
+                size &= 0x1FFF
+                offset &= 0x1FFF
+            if offset + size > len(body):
+                raise ParsingError(f"page tag out of bounds: {number}")
+            values.append((flags, body[offset : offset + size]))
+        self.header = bytes(values[0][1]) if values else b''
+        self.entries = []
+        for flags, value in values[1:]:
+            self._decode_entry(flags, value)
+
+    def _decode_entry(self, flags: Optional[int], value: memoryview):
+        # on large pages, flags are the high bits of the first key size
+        mask = 0xFFFF
+        if flags is None:
+            if len(value) < 2:
+                raise ParsingError(f"truncated page entry: {self.number}")
+            flags = value[1] >> 5
+            mask = 0x1FFF
+        if flags & TAG_DEFUNCT:
+            return
+        try:
+            position = 0
+            common = 0
+            if flags & TAG_COMMON_KEY:
+                common = _U16.unpack_from(value)[0] & mask
+                position = 2
+                mask = 0xFFFF
+            local = _U16.unpack_from(value, position)[0] & mask
+        except StructError as exc:
+            raise ParsingError(f"truncated page entry: {self.number}") from exc
+        position += 2
+        key = self.header[:common] + bytes(value[position : position + local])
+        self.entries.append((key, value[position + local :]))
+
+    @property
+    def is_leaf(self) -> bool:
+        """Whether entries hold records rather than child page numbers"""
+        return bool(self.flags & PAGE_LEAF)
+
+
+class Record:
+    """Table record, columns are decoded on access"""
+
+    def __init__(self, table: 'Table', key: bytes, data: memoryview):
+        self.table = table
+        self.key = key
+        self._data = data
+        self._tagged = None
+        try:
+            (
+                self._last_fixed,
+                self._last_variable,
+                self._fixed_end,
+            ) = _RECORD_HEADER.unpack_from(data)
+        except StructError as exc:
+            raise ParsingError("truncated record") from exc
+        self._variable_count = max(
+            self._last_variable - FIRST_VARIABLE_COLUMN + 1, 0
+        )
+
+    def _fixed(self, column: Column):
+        identifier = column.identifier
+        if identifier > self._last_fixed:
+            return None
+        index = identifier - 1
+        bitmap = self._fixed_end - (self._last_fixed + 7) // 8
+        if self._data[bitmap + index // 8] & (1 << (index % 8)):
+            return None
+        offset, size = self.table.fixed_layout(identifier)
+        return self._data[offset : offset + size]
+
+    def _variable_end(self, index: int) -> int:
+        return _U16.unpack_from(self._data, self._fixed_end + 2 * index)[0]
+
+    def _variable(self, column: Column):
+        index = column.identifier - FIRST_VARIABLE_COLUMN
+        if index >= self._variable_count:
+            return None
+        end = self._variable_end(index)
+        if end & 0x8000:
+            return None
+        start = self._variable_end(index - 1) & 0x7FFF if index else 0
+        base = self._fixed_end + 2 * self._variable_count
+        return self._data[base + start : base + (end & 0x7FFF)]
+
+    def _tagged_values(self) -> Dict[int, Tuple[int, memoryview]]:
+        if self._tagged is not None:
+            return self._tagged
+        data = self._data
+        base = self._fixed_end + 2 * self._variable_count
+        if self._variable_count:
+            last = self._variable_end(self._variable_count - 1)
+            base += last & 0x7FFF
+        large = self.table.database.large_pages
+        mask = 0x7FFF if large else 0x3FFF
+        self._tagged = {}
+        if base + _TAG.size > len(data):
+            return self._tagged
+        try:
+            count = (_TAG.unpack_from(data, base)[1] & mask) // _TAG.size
+            entries = [
+                _TAG.unpack_from(data, base + index * _TAG.size)
+                for index in range(count)
+            ]
+        except StructError as exc:
+            raise ParsingError("truncated tagged columns") from exc
+        ends = [base + (offset & mask) for _, offset in entries[1:]]
+        ends.append(len(data))
+        for (identifier, offset), end in zip(entries, ends):
+            value = data[base + (offset & mask) : end]
+            flags = 0
+            if value and (large or offset & 0x4000):
+                flags = value[0]
+                value = value[1:]
+            self._tagged[identifier] = (flags, value)
+        return self._tagged
+
+    def raw(self, column: Column) -> Optional[Tuple[int, memoryview]]:
+        """(tagged flags, data) of a column, None when null"""
+        if column.identifier < FIRST_VARIABLE_COLUMN:
+            data = self._fixed(column)
+        elif column.identifier < FIRST_TAGGED_COLUMN:
+            data = self._variable(column)
+        else:
+            return self._tagged_values().get(column.identifier)
+        return None if data is None else (0, data)
+
+    def value(self, column: Column):
+        """Decoded value of a column, None when null
+
+        DateTime values are converted to FILETIME, multi-valued columns
+        are decoded to lists
+        """
+        raw = self.raw(column)
+        if raw is None:
+            return None
+        flags, data = raw
+        if flags & TAGGED_MULTI_VALUE:
+            return [
+                self._decode(column, flags, item)
+                for item in _split_multi_value(data)
+            ]
+        if flags & TAGGED_TWO_VALUES and data:
+            size = data[0]
+            return [
+                self._decode(column, flags, data[1 : 1 + size]),
+                self._decode(column, flags, data[1 + size :]),
+            ]
+        return self._decode(column, flags, data)
+
+    def _decode(self, column: Column, flags: int, data):
+        if flags & TAGGED_LONG_VALUE:
+            data = self.table.long_value(data)
+        if flags & TAGGED_COMPRESSED:
+            data = decompress(data)
+        kind = column.type
+        fixed = _FIXED_TYPES.get(kind)
+        if fixed is not None:
+            if len(data) < fixed.size:
+                return None
+            value = fixed.unpack_from(data)[0]
+            if kind == COLTYP_DATE_TIME:
+                return ole_date_to_filetime(value)
+            if kind == COLTYP_BIT:
+                return bool(value)
+            return value
+        if kind == COLTYP_GUID:
+            if len(data) < 16:
+                return None
+            return str(UUID(bytes_le=bytes(data[:16])))
+        if kind in _TEXT_TYPES:
+            encoding = (
+                'utf-16-le'
+                if column.codepage == CODEPAGE_UNICODE
+                else 'cp1252'
+            )
+            return bytes(data).decode(encoding, errors='replace').rstrip('\0')
+        return bytes(data)
+
+    def get(self, name: str, default=None):
+        """Decoded value of a column by name"""
+        column = self.table.columns.get(name)
+        if column is None:
+            return default
+        value = self.value(column)
+        return default if value is None else value
+
+    def __getitem__(self, name: str):
+        return self.get(name)
+
+    def as_dict(self) -> Dict[str, object]:
+        """Decoded values of every column by name"""
+        return {
+            name: self.value(column)
+            for name, column in self.table.columns.items()
+        }
+
+
+def _split_multi_value(data) -> List[memoryview]:
+    try:
+        first = _U16.unpack_from(data)[0] & 0x7FFF
+        offsets = [
+            _U16.unpack_from(data, position)[0] & 0x7FFF
+            for position in range(0, first, 2)
+        ]
+    except StructError as exc:
+        raise ParsingError("truncated multi-valued column") from exc
+    offsets.append(len(data))
+    return [data[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+class Table:
+    """Database table, records are read through lazy cursors"""
+
+    def __init__(
+        self, database: 'EseDatabase', name: str, objid: int, root: int
+    ):
+        self.database = database
+        self.name = name
+        self.objid = objid
+        self.root = root
+        self.long_value_root = None
+        self.columns = {}
+        self._fixed_layout = None
+
+    def add_column(self, column: Column):
+        """Add a column definition"""
+        self.columns[column.name] = column
+        self._fixed_layout = None
+
+    def fixed_layout(self, identifier: int) -> Tuple[int, int]:
+        """(offset, size) of a fixed column in records"""
+        if self._fixed_layout is None:
+            offset = _RECORD_HEADER.size
+            self._fixed_layout = {}
+            for column in sorted(
+                self.columns.values(), key=lambda column: column.identifier
+            ):
+                if column.identifier >= FIRST_VARIABLE_COLUMN:
+                    continue
+                size = column.size or _fixed_size(column)
+                self._fixed_layout[column.identifier] = (offset, size)
+                offset += size
+        return self._fixed_layout[identifier]
+
+    def records(self, key: bytes = b'') -> Iterator[Record]:
+        """Yield records in primary key order from the first key not below
+        key, pages are read as the cursor moves
+        """
+        for record_key, data in self.database.iter_entries(self.root, key):
+            yield Record(self, record_key, data)
+
+    def __iter__(self) -> Iterator[Record]:
+        return self.records()
+
+    def long_value(self, reference) -> bytes:
+        """Data of a long value stored in the table long value tree"""
+        if self.long_value_root is None:
+            raise ParsingError(f"table has no long values: {self.name}")
+        reference = bytes(reference)
+        prefix = int.from_bytes(reference, 'little').to_bytes(
+            len(reference), 'big'
+        )
+        size = None
+        chunks = []
+        for key, data in self.database.iter_entries(
+            self.long_value_root, prefix
+        ):
+            if not key.startswith(prefix):
+                break
+            if key == prefix:
+                try:
+                    size = _LONG_VALUE_ROOT.unpack_from(data)[1]
+                except StructError as exc:
+                    raise ParsingError("truncated long value root") from exc
+                continue
+            chunks.append(bytes(data))
+        if size is None:
+            raise ParsingError(f"missing long value: {reference.hex()}")
+        return b''.join(chunks)[:size]
+
+
+def _fixed_size(column: Column) -> int:
+    if column.type == COLTYP_GUID:
+        return 16
+    fixed = _FIXED_TYPES.get(column.type)
+    return fixed.size if fixed is not None else 0
+
+
+class EseDatabase:
+    """Memory-mapped read-only ESE database
+
+    Pages are decoded on first touch and kept in an LRU cache keyed by
+    page number. The catalog is read on first access to tables and
+    records are only decoded as table cursors move.
+    """
+
+    def __init__(self, filepath: Path, cache_size: int = PAGE_CACHE_SIZE):
+        self._filepath = Path(filepath)
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._fobj = None
+        self._mmap = None
+        self._view = None
+        self._tables = None
+        self.page_size = 0
+        self.page_count = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        """Map file and decode header"""
+        self._fobj = self._filepath.open('rb')
+        try:
+            self._mmap = mmap(self._fobj.fileno(), 0, access=ACCESS_READ)
+        except ValueError as exc:
+            self.close()
+            raise ParsingError("empty ESE database") from exc
+        self._view = memoryview(self._mmap)
+        if len(self._view) < FILE_HEADER_SIZE:
+            self.close()
+            raise ParsingError("truncated ESE database header")
+        (
+            signature,
+            self.format_version,
+            file_type,
+        ) = _FILE_HEADER.unpack_from(self._view)
+        if signature != ESE_SIGNATURE or file_type != FILE_TYPE_DATABASE:
+            self.close()
+            raise ParsingError("invalid ESE database signature")
+        # random number, creation time and computer name, unique per database
+        self.signature = bytes(self._view[24:52])
+        self.state = _STATE.unpack_from(self._view, 52)[0]
+        self.format_revision, self.page_size = _FORMAT.unpack_from(
+            self._view, 232
+        )
+        if self.page_size not in PAGE_SIZES:
+            self.close()
+            raise ParsingError(f"invalid ESE page size: {self.page_size}")
+        self.large_pages = self.page_size >= LARGE_PAGE_SIZE
+        self._extended = (
+            self.large_pages
+            and self.format_revision >= EXTENDED_PAGE_HEADER_REVISION
+        )
+        # the header and its shadow copy take the first two pages
+        self.page_count = len(self._view) // self.page_size - 2
+
+    def close(self):
+        """Unmap file, records handed out must not be used afterwards"""
+        self._cache.clear()
+        self._tables = None
+        if self._view is not None:
+            try:
+                self._view.release()
+                self._mmap.close()
+            except BufferError:
+                pass
+        self._view = None
+        self._mmap = None
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+
+    @property
+    def is_dirty(self) -> bool:
+        """Whether the database was not cleanly shut down"""
+        return self.state == STATE_DIRTY_SHUTDOWN
+
+    def page(self, number: int) -> Page:
+        """Decoded page by number"""
+        page = self._cache.get(number)
+        if page is not None:
+            self._cache.move_to_end(number)
+            return page
+        if number < 1 or number > self.page_count:
+            raise ParsingError(f"page number out of bounds: {number}")
+        offset = (number + 1) * self.page_size
+        page = Page(
+            number,
+            self._view[offset : offset + self.page_size],
+            self._extended,
+        )
+        self._cache[number] = page
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return page
+
+    def iter_entries(
+        self, root: int, key: bytes = b''
+    ) -> Iterator[Tuple[bytes, memoryview]]:
+        """Yield leaf (key, data) of the tree rooted at page root
+
+        The tree is descended to the first key not below key, then leaves
+        are followed through their sibling links
+        """
+        page = self.page(root)
+        depth = 0
+        while not page.is_leaf:
+            depth += 1
+            if depth > MAX_TREE_DEPTH:
+                raise ParsingError(f"tree too deep: {root}")
+            child = None
+            for separator, data in page.entries:
+                child = data
+                # an empty separator stands for the end of the key space
+                if not separator or key <= separator:
+                    break
+            if child is None:
+                return
+            try:
+                page = self.page(_U32.unpack_from(child)[0])
+            except StructError as exc:
+                raise ParsingError(f"truncated branch entry: {root}") from exc
+        for _ in range(self.page_count):
+            for entry_key, data in page.entries:
+                if entry_key >= key:
+                    yield entry_key, data
+            if not page.next:
+                return
+            page = self.page(page.next)
+        raise ParsingError(f"leaf page loop: {root}")
+
+    @property
+    def tables(self) -> Dict[str, Table]:
+        """Tables by name, from the catalog"""
+        if self._tables is None:
+            self._tables = self._read_catalog()
+        return self._tables
+
+    def table(self, name: str) -> Optional[Table]:
+        """Table by name"""
+        return self.tables.get(name)
+
+    def _read_catalog(self) -> Dict[str, Table]:
+        catalog = Table(self, 'MSysObjects', 2, CATALOG_ROOT_PAGE)
+        for column in CATALOG_COLUMNS:
+            catalog.add_column(column)
+        tables = {}
+        by_objid = {}
+        for record in catalog.records():
+            kind = record['Type']
+            root = record['ColtypOrPgnoFDP']
+            if kind == CATALOG_TABLE:
+                table = Table(self, record['Name'], record['ObjidTable'], root)
+                tables[table.name] = by_objid[table.objid] = table
+                continue
+            table = by_objid.get(record['ObjidTable'])
+            if table is None:
+                continue
+            if kind == CATALOG_COLUMN:
+                table.add_column(
+                    Column(
+                        record['Id'],
+                        record['Name'],
+                        root,
+                        record.get('SpaceUsage', 0),
+                        record.get('PagesOrLocale', 0),
+                    )
+                )
+            elif kind == CATALOG_LONG_VALUE:
+                table.long_value_root = root
+        return tables
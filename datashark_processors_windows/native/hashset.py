@@ -0,0 +1,199 @@
+"""Compact sorted SHA-1 sets
+"""
+import os
+import re
+from mmap import mmap, ACCESS_READ
+from hashlib import sha1
+from pathlib import Path
+from collections import OrderedDict
+from typing import Iterator, Optional
+from .common import ParsingError, cache_directory
+from .timeline import ExternalSorter
+
+SHA1_SIZE = 20
+CACHE_DIRECTORY_NAME = 'hashsets'
+HASH_SETS_CACHE_SIZE = 4
+
+_HEX = re.compile(rb'[0-9A-Fa-f]+')
+_HASH_SETS = OrderedDict()
+
+
+def normalize_sha1(value) -> Optional[bytes]:
+    """SHA-1 digest from hex text, Amcache 0000 prefixed ids included"""
+    if isinstance(value, str):
+        value = value.encode('ascii', errors='ignore')
+    value = value.strip()
+    if len(value) == 44 and value.startswith(b'0000'):
+        value = value[4:]
+    if len(value) != 40:
+        return None
+    try:
+        return bytes.fromhex(value.decode('ascii'))
+    except ValueError:
+        return None
+
+
+def iter_hashes(filepath: Path) -> Iterator[bytes]:
+    """Yield the first SHA-1 found on each line of a hash list
+
+    Lines are split on non hexadecimal characters so plain lists as well as
+    quoted CSV like NSRL RDS files are accepted
+    """
+    with Path(filepath).open('rb') as fobj:
+        for line in fobj:
+            for token in _HEX.findall(line):
+                digest = normalize_sha1(token)
+                if digest is not None:
+                    yield digest
+                    break
+
+
+def _artifact_filepath(filepath: Path, directory: Path) -> Path:
+    filepath = Path(filepath).resolve()
+    stat = filepath.stat()
+    key = f'{filepath}|{stat.st_size}|{stat.st_mtime_ns}'
+    digest = sha1(key.encode('utf-8')).hexdigest()
+    return directory / f'{digest}.sha1set'
+
+
+def compile_hash_set(filepath: Path, directory: Optional[Path] = None) -> Path:
+    """Compile a hash list into sorted unique 20-byte records
+
+    The artifact is saved under directory, the private hash sets cache
+    directory by default, and named after the list path, size and
+    modification time so it is compiled once and reused by every process
+    and job afterwards. Hashes are sorted with bounded memory through the
+    timeline sorter.
+    """
+    directory = Path(directory or cache_directory(CACHE_DIRECTORY_NAME))
+    artifact = _artifact_filepath(filepath, directory)
+    if artifact.is_file():
+        return artifact
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    temporary = artifact.with_suffix(f'.{os.getpid()}.tmp')
+    with ExternalSorter(directory=directory) as sorter:
+        for digest in iter_hashes(filepath):
+            sorter.add(int.from_bytes(digest, 'big'), '')
+        with temporary.open('wb') as fobj:
+            previous = None
+            for key, _ in sorter:
+                if key != previous:
+                    fobj.write(key.to_bytes(SHA1_SIZE, 'big'))
+                    previous = key
+    os.replace(temporary, artifact)
+    return artifact
+
+
+class HashSet:
+    """Memory-mapped compiled hash set, looked up by binary search"""
+
+    def __init__(self, filepath: Path):
+        self._filepath = Path(filepath)
+        self._fobj = None
+        self._mmap = None
+        self._count = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        """Map compiled set"""
+        self._fobj = self._filepath.open('rb')
+        size = os.fstat(self._fobj.fileno()).st_size
+        if size % SHA1_SIZE:
+            self.close()
+            raise ParsingError(f"invalid hash set: {self._filepath}")
+        if size:
+            self._mmap = mmap(self._fobj.fileno(), 0, access=ACCESS_READ)
+        self._count = size // SHA1_SIZE
+
+    def close(self):
+        """Unmap compiled set"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, value) -> bool:
+        if isinstance(value, bytes) and len(value) == SHA1_SIZE:
+            digest = value
+        else:
+            digest = normalize_sha1(value)
+        if digest is None or not self._count:
+            return False
+        buffer = self._mmap
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * SHA1_SIZE
+            record = buffer[offset : offset + SHA1_SIZE]
+            if record < digest:
+                low = middle + 1
+            elif record > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+
+def load_hash_set(filepath: Path) -> HashSet:
+    """Compiled hash set of a hash list, opened once per process"""
+    stat = Path(filepath).stat()
+    key = (str(Path(filepath).resolve()), stat.st_mtime_ns, stat.st_size)
+    hash_set = _HASH_SETS.get(key)
+    if hash_set is None:
+        hash_set = HashSet(compile_hash_set(filepath))
+        hash_set.open()
+        _HASH_SETS[key] = hash_set
+        while len(_HASH_SETS) > HASH_SETS_CACHE_SIZE:
+            _HASH_SETS.popitem(last=False)[1].close()
+    else:
+        _HASH_SETS.move_to_end(key)
+    return hash_set
+
+
+class HashFilter:
+    """SHA-1 blacklist and whitelist filter
+
+    When a blacklist is given only its hashes are kept, which overrides
+    the whitelist, otherwise whitelisted hashes are dropped. Only list
+    paths are stored so filters can be sent to worker processes.
+    """
+
+    def __init__(
+        self,
+        blacklist: Optional[Path] = None,
+        whitelist: Optional[Path] = None,
+    ):
+        self.blacklist = blacklist
+        self.whitelist = whitelist
+        self._hash_set = None
+
+    def __getstate__(self) -> dict:
+        return {'blacklist': self.blacklist, 'whitelist': self.whitelist}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['blacklist'], state['whitelist'])
+
+    def __bool__(self) -> bool:
+        return bool(self.blacklist or self.whitelist)
+
+    def __call__(self, value: str) -> bool:
+        """Whether an entry with this SHA-1 is kept"""
+        if not self:
+            return True
+        if self._hash_set is None:
+            self._hash_set = load_hash_set(self.blacklist or self.whitelist)
+        if self.blacklist:
+            return value in self._hash_set
+        return value not in self._hash_set
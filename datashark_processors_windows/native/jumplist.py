@@ -0,0 +1,411 @@
+"""Native jump lists parser
+"""
+from mmap import mmap, ACCESS_READ
+from struct import Struct, error as StructError
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .cfb import CompoundFile, is_compound_file
+from .common import (
+    ParsingError,
+    RowWriter,
+    format_filetime,
+    iter_files,
+    iter_pool,
+    source_times,
+)
+from .lnk import (
+    LNK_SIGNATURE,
+    SOURCE_FIELDS as LNK_SOURCE_FIELDS,
+    decode,
+    droid_details,
+    guid,
+    lnk_fields,
+    lnk_row,
+)
+from .appids import load_app_ids
+
+DEFAULT_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss'
+PRECISE_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss.fffffff'
+AUTOMATIC = 'automatic'
+CUSTOM = 'custom'
+AUTOMATIC_SUFFIX = '.automaticdestinations-ms'
+CUSTOM_SUFFIX = '.customdestinations-ms'
+DESTLIST_STREAM = 'DestList'
+SOURCE_FIELDS = LNK_SOURCE_FIELDS + ['AppId', 'AppIdDescription']
+DESTLIST_FIELDS = [
+    'DestListVersion',
+    'LastUsedEntryNumber',
+    'MRU',
+    'EntryNumber',
+    'CreationTime',
+    'LastModified',
+    'Hostname',
+    'MacAddress',
+    'Path',
+    'InteractionCount',
+    'PinStatus',
+    'FileBirthDroid',
+    'FileDroid',
+    'VolumeBirthDroid',
+    'VolumeDroid',
+]
+
+_DESTLIST_HEADER = Struct('<IIIfIIQ')
+_DESTLIST_ENTRY = Struct('<Q16s16s16s16s16sIIfQi')
+_U16 = Struct('<H')
+_U32 = Struct('<I')
+
+
+@dataclass
+class ExportOptions:
+    """Jump list row options"""
+
+    dt_format: str = DEFAULT_DT_FORMAT
+    detail: bool = False
+    full: bool = False
+    with_directory: bool = False
+    dump_to: Optional[Path] = None
+
+
+@dataclass
+class DestListEntry:
+    """DestList stream entry"""
+
+    entry_number: int
+    volume_droid: str
+    file_droid: str
+    birth_volume_droid: str
+    birth_file_droid: str
+    hostname: str
+    last_modified: int
+    pin_status: int
+    interaction_count: int
+    path: str
+
+
+def decode_destlist(data) -> Tuple[int, int, List[DestListEntry]]:
+    """Decode DestList stream
+
+    Returns version, last used entry number and entries in MRU order
+    """
+    try:
+        (
+            version,
+            count,
+            _,
+            _,
+            last_entry_number,
+            _,
+            _,
+        ) = _DESTLIST_HEADER.unpack_from(data)
+        entries = []
+        offset = _DESTLIST_HEADER.size
+        for _ in range(count):
+            (
+                _,
+                volume_droid,
+                file_droid,
+                birth_volume_droid,
+                birth_file_droid,
+                hostname,
+                entry_number,
+                _,
+                access_count,
+                last_modified,
+                pin_status,
+            ) = _DESTLIST_ENTRY.unpack_from(data, offset)
+            offset += _DESTLIST_ENTRY.size
+            if version >= 3:
+                interaction_count = _U32.unpack_from(data, offset + 4)[0]
+                offset += 16
+            else:
+                interaction_count = int(access_count)
+            length = _U16.unpack_from(data, offset)[0]
+            offset += 2
+            path = bytes(data[offset : offset + length * 2]).decode(
+                'utf-16-le', errors='replace'
+            )
+            offset += length * 2
+            if version >= 3:
+                offset += 4
+            entries.append(
+                DestListEntry(
+                    entry_number,
+                    guid(volume_droid),
+                    guid(file_droid),
+                    guid(birth_volume_droid),
+                    guid(birth_file_droid),
+                    hostname.split(b'\x00', 1)[0].decode(
+                        'cp1252', errors='replace'
+                    ),
+                    last_modified,
+                    pin_status,
+                    interaction_count,
+                    path,
+                )
+            )
+    except StructError as exc:
+        raise ParsingError(f"truncated DestList: {exc}") from exc
+    return version, last_entry_number, entries
+
+
+def app_id(filepath: Path) -> str:
+    """AppID of a jump list, its name up to the first dot"""
+    return Path(filepath).name.split('.', 1)[0].lower()
+
+
+def source_row(
+    filepath: Path, app_ids: Dict[str, str], dt_format: str
+) -> dict:
+    """Build source columns shared by jump list rows"""
+    created, modified, accessed = source_times(filepath)
+    identifier = app_id(filepath)
+    return {
+        'SourceFile': str(filepath),
+        'SourceCreated': format_filetime(created, dt_format),
+        'SourceModified': format_filetime(modified, dt_format),
+        'SourceAccessed': format_filetime(accessed, dt_format),
+        'AppId': identifier,
+        'AppIdDescription': app_ids.get(identifier, ''),
+    }
+
+
+def automatic_fields(detail: bool = False, full: bool = False) -> List[str]:
+    """Columns of automaticDestinations-ms rows"""
+    return (
+        SOURCE_FIELDS
+        + DESTLIST_FIELDS
+        + lnk_fields(detail, full)
+        + ['ParsingError']
+    )
+
+
+def custom_fields(detail: bool = False, full: bool = False) -> List[str]:
+    """Columns of customDestinations-ms rows"""
+    return SOURCE_FIELDS + ['EntryName'] + lnk_fields(detail, full)
+
+
+def _destlist_row(
+    version: int, last_entry_number: int, mru: int, entry: DestListEntry
+) -> dict:
+    return {
+        'DestListVersion': version,
+        'LastUsedEntryNumber': last_entry_number,
+        'MRU': mru,
+        'EntryNumber': entry.entry_number,
+        'Hostname': entry.hostname,
+        'Path': entry.path,
+        'InteractionCount': entry.interaction_count,
+        'PinStatus': 'Unpinned' if entry.pin_status == -1 else 'Pinned',
+        'FileBirthDroid': entry.birth_file_droid,
+        'FileDroid': entry.file_droid,
+        'VolumeBirthDroid': entry.birth_volume_droid,
+        'VolumeDroid': entry.volume_droid,
+    }
+
+
+def _dump_directory(filepath: Path, dump_to: Optional[Path]) -> Optional[Path]:
+    if not dump_to:
+        return None
+    return Path(dump_to) / Path(filepath).name
+
+
+def _dump(directory: Path, name: str, data):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f'{name}.lnk').write_bytes(data)
+
+
+def automatic_rows(
+    filepath: Path, app_ids: Dict[str, str], options: ExportOptions
+) -> Iterator[dict]:
+    """Yield a row per DestList entry of an automaticDestinations-ms file
+
+    Embedded LNK streams are decoded from views on the mapping. Streams
+    not referenced by DestList are yielded too when with_directory is set.
+    """
+    filepath = Path(filepath)
+    dt_format = options.dt_format
+    source = source_row(filepath, app_ids, dt_format)
+    dump_directory = _dump_directory(filepath, options.dump_to)
+    with CompoundFile(filepath) as cfb:
+        streams = cfb.streams()
+        destlist = streams.pop(DESTLIST_STREAM, None)
+        version, last_entry_number, entries = 0, 0, []
+        if destlist is not None:
+            version, last_entry_number, entries = decode_destlist(
+                cfb.read_stream(destlist)
+            )
+        pending = [
+            (mru, entry, streams.pop(f'{entry.entry_number:x}', None))
+            for mru, entry in enumerate(entries)
+        ]
+        if options.with_directory:
+            pending.extend((None, None, stream) for stream in streams.values())
+        for mru, entry, stream in pending:
+            row = dict(source)
+            if entry is not None:
+                row.update(
+                    _destlist_row(version, last_entry_number, mru, entry)
+                )
+                created, mac = droid_details(entry.file_droid)
+                row['CreationTime'] = format_filetime(created, dt_format)
+                row['MacAddress'] = mac
+                row['LastModified'] = format_filetime(
+                    entry.last_modified, dt_format
+                )
+            else:
+                row['EntryNumber'] = stream.name
+            if stream is not None:
+                data = cfb.read_stream(stream)
+                if dump_directory:
+                    _dump(dump_directory, stream.name, data)
+                try:
+                    row.update(
+                        lnk_row(
+                            decode(data),
+                            dt_format,
+                            options.detail,
+                            options.full,
+                        )
+                    )
+                except ParsingError:
+                    pass
+                del data
+            yield row
+
+
+def iter_link_offsets(buffer) -> Iterator[int]:
+    """Yield offsets of LNK headers found in buffer
+
+    Headers are located with the buffer's own find so the whole file is
+    swept at C speed without being copied
+    """
+    position = buffer.find(LNK_SIGNATURE)
+    while position >= 0:
+        yield position
+        position = buffer.find(LNK_SIGNATURE, position + len(LNK_SIGNATURE))
+
+
+def custom_rows(
+    filepath: Path, app_ids: Dict[str, str], options: ExportOptions
+) -> Iterator[dict]:
+    """Yield a row per LNK of a customDestinations-ms file
+
+    Each LNK is decoded from a view on the mapping spanning up to the next
+    header, headers found inside a previously decoded LNK are skipped
+    """
+    filepath = Path(filepath)
+    source = source_row(filepath, app_ids, options.dt_format)
+    dump_directory = _dump_directory(filepath, options.dump_to)
+    with filepath.open('rb') as fobj:
+        try:
+            buffer = mmap(fobj.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            return
+        try:
+            offsets = list(iter_link_offsets(buffer))
+            view = memoryview(buffer)
+            end = 0
+            for index, start in enumerate(offsets):
+                if start < end:
+                    continue
+                stop = (
+                    offsets[index + 1]
+                    if index + 1 < len(offsets)
+                    else len(buffer)
+                )
+                with view[start:stop] as data:
+                    try:
+                        link = decode(data)
+                    except ParsingError:
+                        continue
+                    end = start + link.size
+                    if dump_directory:
+                        _dump(dump_directory, index, data[: link.size])
+                row = dict(source)
+                row['EntryName'] = index
+                row.update(
+                    lnk_row(
+                        link, options.dt_format, options.detail, options.full
+                    )
+                )
+                yield row
+            view.release()
+        finally:
+            try:
+                buffer.close()
+            except BufferError:
+                pass
+
+
+def is_custom_destinations(filepath: Path) -> bool:
+    """Whether file should be parsed as a customDestinations-ms"""
+    return Path(filepath).name.lower().endswith(CUSTOM_SUFFIX)
+
+
+def _process_file(
+    filepath: Path, app_ids_filepath: Optional[Path], options: ExportOptions
+) -> Tuple[str, List[dict]]:
+    """Decode a jump list file into its kind and rows
+
+    Compound files are automatic destinations, any other file is swept
+    for LNK headers like custom destinations. The AppID table is loaded
+    once per worker process. Compound file errors are reported in a row
+    following the rows decoded so far so a bad file does not abort a
+    directory export.
+    """
+    app_ids = load_app_ids(app_ids_filepath)
+    if is_custom_destinations(filepath) or not is_compound_file(filepath):
+        return CUSTOM, list(custom_rows(filepath, app_ids, options))
+    rows = []
+    try:
+        rows.extend(automatic_rows(filepath, app_ids, options))
+    except (ParsingError, StructError) as exc:
+        rows.append({'SourceFile': str(filepath), 'ParsingError': str(exc)})
+    return AUTOMATIC, rows
+
+
+def iter_jumplist_files(
+    directory: Path, all_files: bool = False
+) -> Iterator[Path]:
+    """Recursively yield jump list files
+
+    When all_files is set, every file is yielded regardless of its name
+    """
+    return iter_files(
+        directory, None if all_files else (AUTOMATIC_SUFFIX, CUSTOM_SUFFIX)
+    )
+
+
+def export(
+    filepaths: Iterable[Path],
+    automatic_filepaths: Tuple[Optional[Path], Optional[Path]] = (None, None),
+    custom_filepaths: Tuple[Optional[Path], Optional[Path]] = (None, None),
+    app_ids_filepath: Optional[Path] = None,
+    options: ExportOptions = ExportOptions(),
+    workers: int = 1,
+) -> Tuple[int, int]:
+    """Export jump lists to CSV and/or JSON
+
+    automatic_filepaths and custom_filepaths are (csv, json) outputs of
+    each kind of jump list. Files are decoded by a pool of workers, rows
+    are written in input order. Returns the number of exported automatic
+    and custom rows.
+    """
+    results = iter_pool(
+        _process_file,
+        ((filepath, app_ids_filepath, options) for filepath in filepaths),
+        workers,
+    )
+    with RowWriter(
+        automatic_fields(options.detail, options.full), *automatic_filepaths
+    ) as automatic, RowWriter(
+        custom_fields(options.detail, options.full), *custom_filepaths
+    ) as custom:
+        writers = {AUTOMATIC: automatic, CUSTOM: custom}
+        for kind, rows in results:
+            writer = writers[kind]
+            for row in rows:
+                writer.write(row)
+        return automatic.count, custom.count
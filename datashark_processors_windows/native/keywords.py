@@ -0,0 +1,94 @@
+"""Multiple keyword matching using Aho-Corasick automatons
+"""
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
+
+AUTOMATON_CACHE_SIZE = 16
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton matching lowercase keywords in one pass"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]
+        for index, keyword in enumerate(self.keywords):
+            node = 0
+            for char in keyword:
+                following = self._goto[node].get(char)
+                if following is None:
+                    following = len(self._goto)
+                    self._goto[node][char] = following
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append(())
+                node = following
+            self._outputs[node] += (index,)
+        self._link()
+
+    def _link(self):
+        """Compute failure links then fold them into full transition tables
+        so matching never backtracks
+        """
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, following in goto[node].items():
+                queue.append(following)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[following] = target if target != following else 0
+                outputs[following] += outputs[fail[following]]
+        self._delta = [dict(goto[0])]
+        self._delta.extend(None for _ in goto[1:])
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            transitions = dict(self._delta[fail[node]])
+            transitions.update(goto[node])
+            self._delta[node] = transitions
+            queue.extend(goto[node].values())
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (end position, keyword index) of every match in text"""
+        delta, outputs = self._delta, self._outputs
+        node = 0
+        for position, char in enumerate(text):
+            node = delta[node].get(char, 0)
+            if outputs[node]:
+                for index in outputs[node]:
+                    yield position, index
+
+    def search(self, texts: List[str]) -> Tuple[List[str], List[str]]:
+        """Find keywords in texts, case insensitive
+
+        Texts are scanned in a single pass, returns keywords found and texts
+        containing at least one of them, both in first match order
+        """
+        # lowering may change a text length (e.g. 'İ'), offsets are computed
+        # on the lowered texts so matches map back to the right text
+        lowered = [text.lower() for text in texts]
+        starts = []
+        position = 0
+        for text in lowered:
+            starts.append(position)
+            position += len(text) + 1
+        keywords = {}
+        matched = {}
+        for end, index in self.iter_matches('\n'.join(lowered)):
+            keywords.setdefault(self.keywords[index], None)
+            matched.setdefault(bisect_right(starts, end) - 1, None)
+        return list(keywords), [texts[index] for index in matched]
+
+
+@lru_cache(maxsize=AUTOMATON_CACHE_SIZE)
+def get_automaton(keywords: Tuple[str, ...]) -> KeywordAutomaton:
+    """Compiled automaton for keywords, cached per keyword set"""
+    return KeywordAutomaton(keywords)
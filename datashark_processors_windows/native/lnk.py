@@ -0,0 +1,514 @@
+"""Shell link (LNK) decoder [MS-SHLLINK]
+"""
+from uuid import UUID
+from struct import Struct, error as StructError
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .common import (
+    ParsingError,
+    RowWriter,
+    format_filetime,
+    iter_files,
+    iter_pool,
+    source_times,
+)
+from .usn import FILE_ATTRIBUTES
+
+DEFAULT_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss'
+PRECISE_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss.fffffff'
+LNK_SUFFIX = '.lnk'
+LNK_HEADER_SIZE = 0x4C
+LNK_CLSID = bytes.fromhex('0114020000000000c000000000000046')
+LNK_SIGNATURE = b'\x4c\x00\x00\x00' + LNK_CLSID
+# offset between UUID v1 epoch (1582-10-15) and FILETIME epoch (1601-01-01)
+UUID_FILETIME_DELTA = 5748192000000000
+LINK_FLAGS = [
+    (0x00000001, 'HasTargetIdList'),
+    (0x00000002, 'HasLinkInfo'),
+    (0x00000004, 'HasName'),
+    (0x00000008, 'HasRelativePath'),
+    (0x00000010, 'HasWorkingDir'),
+    (0x00000020, 'HasArguments'),
+    (0x00000040, 'HasIconLocation'),
+    (0x00000080, 'IsUnicode'),
+    (0x00000100, 'ForceNoLinkInfo'),
+    (0x00000200, 'HasExpString'),
+    (0x00000400, 'RunInSeparateProcess'),
+    (0x00001000, 'HasDarwinId'),
+    (0x00002000, 'RunAsUser'),
+    (0x00004000, 'HasExpIcon'),
+    (0x00008000, 'NoPidlAlias'),
+    (0x00020000, 'RunWithShimLayer'),
+    (0x00040000, 'ForceNoLinkTrack'),
+    (0x00080000, 'EnableTargetMetadata'),
+    (0x00100000, 'DisableLinkPathTracking'),
+    (0x00200000, 'DisableKnownFolderTracking'),
+    (0x00400000, 'DisableKnownFolderAlias'),
+    (0x00800000, 'AllowLinkToLink'),
+    (0x01000000, 'UnaliasOnSave'),
+    (0x02000000, 'PreferEnvironmentPath'),
+    (0x04000000, 'KeepLocalIdListForUncTarget'),
+]
+HAS_TARGET_ID_LIST = 0x01
+HAS_LINK_INFO = 0x02
+IS_UNICODE = 0x80
+STRING_FLAGS = [
+    (0x04, 'name'),
+    (0x08, 'relative_path'),
+    (0x10, 'working_directory'),
+    (0x20, 'arguments'),
+    (0x40, 'icon_location'),
+]
+REMOVABLE_DRIVE = 2
+DRIVE_TYPES = [
+    'Unknown',
+    'NoRootDirectory',
+    'Removable',
+    'Fixed',
+    'Remote',
+    'CdRom',
+    'RamDisk',
+]
+SHOW_COMMANDS = {1: 'Normal', 3: 'Maximized', 7: 'MinNoActive'}
+EXTRA_BLOCKS = {
+    0xA0000001: 'EnvironmentVariablesDataBlock',
+    0xA0000002: 'ConsoleDataBlock',
+    0xA0000003: 'TrackerDataBlock',
+    0xA0000004: 'ConsoleFEDataBlock',
+    0xA0000005: 'SpecialFolderDataBlock',
+    0xA0000006: 'DarwinDataBlock',
+    0xA0000007: 'IconEnvironmentDataBlock',
+    0xA0000008: 'ShimDataBlock',
+    0xA0000009: 'PropertyStoreDataBlock',
+    0xA000000B: 'KnownFolderDataBlock',
+    0xA000000C: 'VistaAndAboveIDListDataBlock',
+}
+TRACKER_BLOCK = 0xA0000003
+KNOWN_FOLDERS = {
+    '20d04fe0-3aea-1069-a2d8-08002b30309d': 'My Computer',
+    '450d8fba-ad25-11d0-98a8-0800361b1103': 'My Documents',
+    '208d2c60-3aea-1069-a2d7-08002b30309d': 'My Network Places',
+    '645ff040-5081-101b-9f08-00aa002f954e': 'Recycle Bin',
+    '59031a47-3f72-44a7-89c5-5595fe6b30ee': 'Users Files',
+    '031e4825-7b94-4dc3-b131-e946b44c8dd5': 'Libraries',
+    '26ee0668-a00a-44d7-9371-beb064c98683': 'Control Panel',
+    '21ec2020-3aea-1069-a2dd-08002b30309d': 'Control Panel Items',
+    '374de290-123f-4565-9164-39c4925e467b': 'Downloads',
+    '679f85cb-0220-4080-b29b-5540cc05aab6': 'Quick Access',
+    'f02c1a0d-be21-4350-88b0-7367fc96ef3c': 'Network',
+}
+FILE_ENTRY_EXTENSION = b'\x04\x00\xef\xbe'
+MAX_STRING_SIZE = 4096
+LNK_FIELDS = [
+    'TargetCreated',
+    'TargetModified',
+    'TargetAccessed',
+    'FileSize',
+    'RelativePath',
+    'WorkingDirectory',
+    'FileAttributes',
+    'HeaderFlags',
+    'DriveType',
+    'VolumeSerialNumber',
+    'VolumeLabel',
+    'LocalPath',
+    'CommonPath',
+    'TargetIDAbsolutePath',
+    'TargetMFTEntryNumber',
+    'TargetMFTSequenceNumber',
+    'MachineID',
+    'MachineMACAddress',
+    'TrackerCreatedOn',
+    'ExtraBlocksPresent',
+    'Arguments',
+]
+LNK_DETAIL_FIELDS = ['Name', 'IconLocation', 'ShowCommand', 'IconIndex']
+LNK_FULL_FIELDS = ['ShellItems', 'TrackerDroids']
+SOURCE_FIELDS = [
+    'SourceFile',
+    'SourceCreated',
+    'SourceModified',
+    'SourceAccessed',
+]
+
+_HEADER = Struct('<I16sIIQQQIiIHHII')
+_LINK_INFO = Struct('<IIIIIII')
+_VOLUME_ID = Struct('<IIII')
+_NETWORK_LINK = Struct('<IIIII')
+_U16 = Struct('<H')
+_U32 = Struct('<I')
+_U64 = Struct('<Q')
+
+
+@dataclass
+class ShellLink:
+    """Decoded shell link"""
+
+    size: int
+    flags: int
+    file_attributes: int
+    created: int
+    accessed: int
+    modified: int
+    file_size: int
+    icon_index: int
+    show_command: int
+    shell_items: List[str] = field(default_factory=list)
+    target_entry: Optional[int] = None
+    target_sequence: Optional[int] = None
+    drive_type: Optional[int] = None
+    volume_serial: Optional[int] = None
+    volume_label: str = ''
+    local_path: str = ''
+    common_path: str = ''
+    name: str = ''
+    relative_path: str = ''
+    working_directory: str = ''
+    arguments: str = ''
+    icon_location: str = ''
+    machine_id: str = ''
+    droids: Tuple[str, ...] = ()
+    extra_blocks: List[str] = field(default_factory=list)
+
+    @property
+    def target_path(self) -> str:
+        """Absolute path built from the target shell item list"""
+        return '\\'.join(self.shell_items)
+
+
+def guid(data) -> str:
+    """Format a little-endian GUID"""
+    return str(UUID(bytes_le=bytes(data)))
+
+
+def droid_details(value: str) -> Tuple[int, str]:
+    """FILETIME and MAC address embedded in a version 1 UUID droid"""
+    droid = UUID(value)
+    if droid.version != 1:
+        return 0, ''
+    node = f'{droid.node:012x}'
+    mac = ':'.join(node[index : index + 2] for index in range(0, 12, 2))
+    return max(droid.time - UUID_FILETIME_DELTA, 0), mac
+
+
+def _cstring(data, offset: int, unicode: bool = False) -> str:
+    data = bytes(data[offset : offset + MAX_STRING_SIZE])
+    if unicode:
+        end = data.find(b'\x00\x00')
+        while end >= 0 and end % 2:
+            end = data.find(b'\x00\x00', end + 1)
+        return data[: end if end >= 0 else len(data)].decode(
+            'utf-16-le', errors='replace'
+        )
+    end = data.find(b'\x00')
+    return data[: end if end >= 0 else len(data)].decode(
+        'cp1252', errors='replace'
+    )
+
+
+def _file_entry(item) -> Tuple[str, Optional[int]]:
+    """Name and MFT reference of a file entry shell item"""
+    name = _cstring(item, 14, bool(item[2] & 0x4))
+    position = bytes(item).find(FILE_ENTRY_EXTENSION)
+    if position < 4:
+        return name, None
+    start = position - 4
+    size, version = _U16.unpack_from(item, start)[0], item[start + 2]
+    reference = None
+    if version >= 7 and start + 28 <= len(item):
+        reference = _U64.unpack_from(item, start + 20)[0]
+    offset = {7: 38, 8: 42}.get(version, 46 if version >= 9 else 20)
+    if version >= 3 and start + offset < start + size:
+        long_name = _cstring(item[start : start + size], offset, True)
+        if long_name:
+            name = long_name
+    return name, reference
+
+
+def _shell_item(item) -> Tuple[str, Optional[int]]:
+    kind = item[2]
+    if kind == 0x1F and len(item) >= 20:
+        value = guid(item[4:20])
+        return KNOWN_FOLDERS.get(value, f'{{{value}}}'), None
+    if kind & 0x70 == 0x20:
+        return _cstring(item, 3).rstrip('\\'), None
+    if kind & 0x70 == 0x30:
+        return _file_entry(item)
+    if kind & 0x70 == 0x40:
+        return _cstring(item, 5), None
+    return f'{{item type {kind:#04x}}}', None
+
+
+def _decode_id_list(link: ShellLink, data, offset: int) -> int:
+    size = _U16.unpack_from(data, offset)[0]
+    position = offset + 2
+    end = position + size
+    while position + 2 <= end:
+        item_size = _U16.unpack_from(data, position)[0]
+        if item_size < 3:
+            break
+        name, reference = _shell_item(data[position : position + item_size])
+        link.shell_items.append(name)
+        if reference is not None:
+            link.target_entry = reference & 0xFFFFFFFFFFFF
+            link.target_sequence = reference >> 48
+        position += item_size
+    return end
+
+
+def _decode_link_info(link: ShellLink, data, offset: int) -> int:
+    (
+        size,
+        header_size,
+        flags,
+        volume_id_offset,
+        local_base_offset,
+        network_offset,
+        suffix_offset,
+    ) = _LINK_INFO.unpack_from(data, offset)
+    unicode = header_size >= 0x24
+    if unicode:
+        local_base_offset, suffix_offset = (
+            _U32.unpack_from(data, offset + 28)[0],
+            _U32.unpack_from(data, offset + 32)[0],
+        )
+    if flags & 1:
+        volume = offset + volume_id_offset
+        _, drive_type, serial, label_offset = _VOLUME_ID.unpack_from(
+            data, volume
+        )
+        link.drive_type = drive_type
+        link.volume_serial = serial
+        if label_offset == 0x14:
+            link.volume_label = _cstring(
+                data, volume + _U32.unpack_from(data, volume + 16)[0], True
+            )
+        else:
+            link.volume_label = _cstring(data, volume + label_offset)
+        link.local_path = _cstring(data, offset + local_base_offset, unicode)
+    suffix = _cstring(data, offset + suffix_offset, unicode)
+    if flags & 2:
+        network = offset + network_offset
+        _, _, name_offset, _, _ = _NETWORK_LINK.unpack_from(data, network)
+        share = _cstring(data, network + name_offset)
+        link.common_path = '\\'.join(part for part in (share, suffix) if part)
+    else:
+        link.common_path = suffix
+    return offset + size
+
+
+def _decode_strings(link: ShellLink, data, offset: int) -> int:
+    unicode = bool(link.flags & IS_UNICODE)
+    for flag, name in STRING_FLAGS:
+        if not link.flags & flag:
+            continue
+        count = _U16.unpack_from(data, offset)[0]
+        offset += 2
+        size = count * 2 if unicode else count
+        setattr(
+            link,
+            name,
+            bytes(data[offset : offset + size]).decode(
+                'utf-16-le' if unicode else 'cp1252', errors='replace'
+            ),
+        )
+        offset += size
+    return offset
+
+
+def _decode_extra_blocks(link: ShellLink, data, offset: int) -> int:
+    while offset + 4 <= len(data):
+        size = _U32.unpack_from(data, offset)[0]
+        if size < 8:
+            return offset + 4
+        signature = _U32.unpack_from(data, offset + 4)[0]
+        link.extra_blocks.append(
+            EXTRA_BLOCKS.get(signature, f'{signature:#010x}')
+        )
+        if signature == TRACKER_BLOCK and offset + 96 <= len(data):
+            link.machine_id = _cstring(data[offset + 16 : offset + 32], 0)
+            link.droids = tuple(
+                guid(data[start : start + 16])
+                for start in range(offset + 32, offset + 96, 16)
+            )
+        offset += size
+    return offset
+
+
+def decode(data) -> ShellLink:
+    """Decode a shell link from a bytes-like object, data is not copied"""
+    if bytes(data[: len(LNK_SIGNATURE)]) != LNK_SIGNATURE:
+        raise ParsingError("invalid shell link signature")
+    try:
+        (
+            _,
+            _,
+            flags,
+            file_attributes,
+            created,
+            accessed,
+            modified,
+            file_size,
+            icon_index,
+            show_command,
+            _,
+            _,
+            _,
+            _,
+        ) = _HEADER.unpack_from(data)
+        link = ShellLink(
+            0,
+            flags,
+            file_attributes,
+            created,
+            accessed,
+            modified,
+            file_size,
+            icon_index,
+            show_command,
+        )
+        offset = LNK_HEADER_SIZE
+        if flags & HAS_TARGET_ID_LIST:
+            offset = _decode_id_list(link, data, offset)
+        if flags & HAS_LINK_INFO:
+            offset = _decode_link_info(link, data, offset)
+        offset = _decode_strings(link, data, offset)
+        link.size = min(_decode_extra_blocks(link, data, offset), len(data))
+    except (StructError, IndexError, ValueError) as exc:
+        raise ParsingError(f"truncated shell link: {exc}") from exc
+    return link
+
+
+def decode_file(filepath: Path) -> ShellLink:
+    """Decode a shell link file"""
+    return decode(Path(filepath).read_bytes())
+
+
+def _flags(value: int, names) -> str:
+    return ', '.join(name for flag, name in names if value & flag)
+
+
+def lnk_row(
+    link: ShellLink, dt_format: str, detail: bool = False, full: bool = False
+) -> dict:
+    """Build JLECmd-like lnk columns
+
+    detail adds name, icon and show command, full adds every shell item and
+    tracker droids
+    """
+    tracker_created, tracker_mac = 0, ''
+    if len(link.droids) > 1:
+        tracker_created, tracker_mac = droid_details(link.droids[1])
+    row = {
+        'TargetCreated': format_filetime(link.created, dt_format),
+        'TargetModified': format_filetime(link.modified, dt_format),
+        'TargetAccessed': format_filetime(link.accessed, dt_format),
+        'FileSize': link.file_size,
+        'RelativePath': link.relative_path,
+        'WorkingDirectory': link.working_directory,
+        'FileAttributes': _flags(link.file_attributes, FILE_ATTRIBUTES),
+        'HeaderFlags': _flags(link.flags, LINK_FLAGS),
+        'DriveType': DRIVE_TYPES[link.drive_type]
+        if link.drive_type is not None and link.drive_type < len(DRIVE_TYPES)
+        else '',
+        'VolumeSerialNumber': f'{link.volume_serial:08X}'
+        if link.volume_serial is not None
+        else '',
+        'VolumeLabel': link.volume_label,
+        'LocalPath': link.local_path,
+        'CommonPath': link.common_path,
+        'TargetIDAbsolutePath': link.target_path,
+        'TargetMFTEntryNumber': ''
+        if link.target_entry is None
+        else f'0x{link.target_entry:X}',
+        'TargetMFTSequenceNumber': ''
+        if link.target_sequence is None
+        else f'0x{link.target_sequence:X}',
+        'MachineID': link.machine_id,
+        'MachineMACAddress': tracker_mac,
+        'TrackerCreatedOn': format_filetime(tracker_created, dt_format),
+        'ExtraBlocksPresent': ', '.join(link.extra_blocks),
+        'Arguments': link.arguments,
+    }
+    if detail or full:
+        row['Name'] = link.name
+        row['IconLocation'] = link.icon_location
+        row['ShowCommand'] = SHOW_COMMANDS.get(
+            link.show_command, str(link.show_command)
+        )
+        row['IconIndex'] = link.icon_index
+    if full:
+        row['ShellItems'] = ' | '.join(link.shell_items)
+        row['TrackerDroids'] = ', '.join(link.droids)
+    return row
+
+
+def lnk_fields(detail: bool = False, full: bool = False) -> List[str]:
+    """Lnk columns for given level of detail"""
+    fields = list(LNK_FIELDS)
+    if detail or full:
+        fields += LNK_DETAIL_FIELDS
+    if full:
+        fields += LNK_FULL_FIELDS
+    return fields
+
+
+def iter_lnk_files(directory: Path, all_files: bool = False) -> Iterator[Path]:
+    """Recursively yield .lnk files, every file when all_files is set"""
+    return iter_files(directory, None if all_files else (LNK_SUFFIX,))
+
+
+def _process_file(
+    filepath: Path, dt_format: str, removable_only: bool
+) -> Optional[dict]:
+    """Decode a shell link file into a row, None when filtered out
+
+    Parsing errors are reported in the row so a bad file does not abort a
+    directory export
+    """
+    filepath = Path(filepath)
+    try:
+        link = decode_file(filepath)
+    except (ParsingError, OSError) as exc:
+        return {'SourceFile': str(filepath), 'ParsingError': str(exc)}
+    if removable_only and link.drive_type != REMOVABLE_DRIVE:
+        return None
+    created, modified, accessed = source_times(filepath)
+    row = {
+        'SourceFile': str(filepath),
+        'SourceCreated': format_filetime(created, dt_format),
+        'SourceModified': format_filetime(modified, dt_format),
+        'SourceAccessed': format_filetime(accessed, dt_format),
+    }
+    row.update(lnk_row(link, dt_format))
+    return row
+
+
+def export(
+    filepaths: Iterable[Path],
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    removable_only: bool = False,
+    workers: int = 1,
+) -> int:
+    """Export shell link files to CSV and/or JSON
+
+    Files are decoded by a pool of workers, rows are written in input
+    order. Returns the number of exported files.
+    """
+    results = iter_pool(
+        _process_file,
+        ((filepath, dt_format, removable_only) for filepath in filepaths),
+        workers,
+    )
+    with RowWriter(
+        SOURCE_FIELDS + LNK_FIELDS + ['ParsingError'],
+        csv_filepath,
+        json_filepath,
+    ) as writer:
+        for row in results:
+            if row is not None:
+                writer.write(row)
+        return writer.count
@@ -0,0 +1,191 @@
+"""LZXpress Huffman and plain LZ77 decompression [MS-XCA]
+"""
+from struct import Struct, error as StructError
+from typing import Optional
+from .common import ParsingError
+
+SYMBOL_COUNT = 512
+TABLE_SIZE = SYMBOL_COUNT // 2
+BLOCK_SIZE = 65536
+MAX_CODE_LENGTH = 15
+LOOKUP_SIZE = 1 << MAX_CODE_LENGTH
+MASK_32 = 0xFFFFFFFF
+
+_U16 = Struct('<H')
+_U32 = Struct('<I')
+
+
+def build_decoding_table(lengths: bytes) -> list:
+    """Build a 15-bit lookup table from the 256-byte code length table
+
+    Each entry packs (code length << 16) | symbol so a single lookup on the
+    next 15 bits decodes a whole symbol
+    """
+    if len(lengths) < TABLE_SIZE:
+        raise ParsingError("truncated huffman table")
+    code_lengths = []
+    for byte in lengths[:TABLE_SIZE]:
+        code_lengths.append(byte & 0xF)
+        code_lengths.append(byte >> 4)
+    table = [0] * LOOKUP_SIZE
+    code = 0
+    for length in range(1, MAX_CODE_LENGTH + 1):
+        span = 1 << (MAX_CODE_LENGTH - length)
+        packed = length << 16
+        for symbol, symbol_length in enumerate(code_lengths):
+            if symbol_length != length:
+                continue
+            start = code * span
+            if start + span > LOOKUP_SIZE:
+                raise ParsingError("invalid huffman table")
+            table[start : start + span] = [packed | symbol] * span
+            code += 1
+        code <<= 1
+    return table
+
+
+def decompress(data: bytes, size: int) -> bytes:
+    """Decompress LZXpress Huffman data to size bytes"""
+    try:
+        return _decompress(bytes(data) + b'\x00' * 4, size)
+    except (IndexError, StructError) as exc:
+        raise ParsingError("truncated lzxpress huffman stream") from exc
+
+
+def _decompress(data: bytes, size: int) -> bytes:
+    output = bytearray()
+    position = 0
+    while len(output) < size:
+        if position + TABLE_SIZE > len(data):
+            raise ParsingError("truncated lzxpress huffman stream")
+        table = build_decoding_table(data[position : position + TABLE_SIZE])
+        position += TABLE_SIZE
+        next_bits = (_U16.unpack_from(data, position)[0] << 16) | (
+            _U16.unpack_from(data, position + 2)[0]
+        )
+        position += 4
+        extra_bits = 16
+        block_end = min(len(output) + BLOCK_SIZE, size)
+        while len(output) < block_end:
+            entry = table[next_bits >> 17]
+            bit_length = entry >> 16
+            if not bit_length:
+                raise ParsingError("invalid huffman code")
+            symbol = entry & 0xFFFF
+            next_bits = (next_bits << bit_length) & MASK_32
+            extra_bits -= bit_length
+            if extra_bits < 0:
+                next_bits |= _U16.unpack_from(data, position)[0] << (
+                    -extra_bits
+                )
+                extra_bits += 16
+                position += 2
+            if symbol < 256:
+                output.append(symbol)
+                continue
+            symbol -= 256
+            length = symbol & 0xF
+            offset_bits = symbol >> 4
+            if length == 15:
+                length = data[position]
+                position += 1
+                if length == 255:
+                    length = _U16.unpack_from(data, position)[0]
+                    position += 2
+                    if length == 0:
+                        length = _U32.unpack_from(data, position)[0]
+                        position += 4
+                    if length < 15:
+                        raise ParsingError("invalid match length")
+                    length -= 15
+                length += 15
+            length += 3
+            if offset_bits:
+                offset = (next_bits >> (32 - offset_bits)) | (1 << offset_bits)
+                next_bits = (next_bits << offset_bits) & MASK_32
+                extra_bits -= offset_bits
+                if extra_bits < 0:
+                    next_bits |= _U16.unpack_from(data, position)[0] << (
+                        -extra_bits
+                    )
+                    extra_bits += 16
+                    position += 2
+            else:
+                offset = 1
+            start = len(output) - offset
+            if start < 0:
+                raise ParsingError("match offset out of window")
+            if offset >= length:
+                output += output[start : start + length]
+            else:
+                pattern = output[start:]
+                output += (pattern * (length // offset + 1))[:length]
+    return bytes(output[:size])
+
+
+def decompress_plain(data: bytes, size: Optional[int] = None) -> bytes:
+    """Decompress LZXpress plain LZ77 data, up to size bytes when given"""
+    try:
+        return _decompress_plain(bytes(data), size)
+    except (IndexError, StructError) as exc:
+        raise ParsingError("truncated lzxpress plain stream") from exc
+
+
+def _decompress_plain(data: bytes, size: Optional[int]) -> bytes:
+    output = bytearray()
+    position = 0
+    flags = 0
+    flag_count = 0
+    half_byte = None
+    while size is None or len(output) < size:
+        if not flag_count:
+            if position + 4 > len(data):
+                break
+            flags = _U32.unpack_from(data, position)[0]
+            position += 4
+            flag_count = 32
+        flag_count -= 1
+        if not flags & (1 << flag_count):
+            if position >= len(data):
+                break
+            output.append(data[position])
+            position += 1
+            continue
+        if position + 2 > len(data):
+            break
+        match = _U16.unpack_from(data, position)[0]
+        position += 2
+        offset = (match >> 3) + 1
+        length = match & 7
+        if length == 7:
+            if half_byte is None:
+                half_byte = position
+                length = data[position] & 0xF
+                position += 1
+            else:
+                length = data[half_byte] >> 4
+                half_byte = None
+            if length == 15:
+                length = data[position]
+                position += 1
+                if length == 255:
+                    length = _U16.unpack_from(data, position)[0]
+                    position += 2
+                    if length == 0:
+                        length = _U32.unpack_from(data, position)[0]
+                        position += 4
+                    if length < 22:
+                        raise ParsingError("invalid match length")
+                    length -= 22
+                length += 15
+            length += 7
+        length += 3
+        start = len(output) - offset
+        if start < 0:
+            raise ParsingError("match offset out of window")
+        if offset >= length:
+            output += output[start : start + length]
+        else:
+            pattern = output[start:]
+            output += (pattern * (length // offset + 1))[:length]
+    return bytes(output if size is None else output[:size])
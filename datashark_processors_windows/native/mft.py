@@ -0,0 +1,1023 @@
+"""Native $MFT parser
+"""
+import os
+import json
+import pickle
+import tempfile
+from mmap import mmap, ACCESS_READ, ALLOCATIONGRANULARITY
+from itertools import chain
+from contextlib import ExitStack
+from collections import OrderedDict
+from struct import Struct
+from pathlib import Path
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from .common import (
+    DEFAULT_DT_FORMAT,
+    ParsingError,
+    RowWriter,
+    filetime_to_unix,
+    format_filetime,
+    iter_pool_ordered,
+)
+from .timeline import SORT_BUFFER_SIZE, TimelineWriter
+
+FILE_SIGNATURE = b'FILE'
+BAAD_SIGNATURE = b'BAAD'
+SECTOR_SIZE = 512
+ATTR_END = 0xFFFFFFFF
+ATTR_STANDARD_INFORMATION = 0x10
+ATTR_ATTRIBUTE_LIST = 0x20
+ATTR_FILE_NAME = 0x30
+ATTR_DATA = 0x80
+FLAG_IN_USE = 0x0001
+FLAG_DIRECTORY = 0x0002
+NAMESPACE_POSIX = 0
+NAMESPACE_WIN32 = 1
+NAMESPACE_DOS = 2
+NAMESPACE_WIN32_DOS = 3
+NAMESPACES = {
+    NAMESPACE_POSIX: 'Posix',
+    NAMESPACE_WIN32: 'Windows',
+    NAMESPACE_DOS: 'Dos',
+    NAMESPACE_WIN32_DOS: 'DosWindows',
+}
+ROOT_ENTRY = 5
+MAX_PATH_DEPTH = 255
+ORPHAN_PATH = '.\\PathUnknown'
+SHARD_RECORDS = 16384
+PATH_CACHE_SIZE = 65536
+RESIDENT_HEADER_SIZE = 0x18
+NON_RESIDENT_HEADER_SIZE = 0x40
+
+_RECORD_HEADER = Struct('<4sHHQHHHHIIQH')
+_ATTR_HEADER = Struct('<IIBBHHH')
+_RESIDENT = Struct('<IH')
+_NON_RESIDENT_SIZE = Struct('<Q')
+_STANDARD_INFORMATION = Struct('<QQQQI')
+_SECURITY_ID = Struct('<I')
+_USN = Struct('<Q')
+_FILE_NAME = Struct('<QQQQQQQIIBB')
+_FIXUP = Struct('<HH')
+
+MFT_FIELDS = [
+    'EntryNumber',
+    'SequenceNumber',
+    'InUse',
+    'ParentEntryNumber',
+    'ParentSequenceNumber',
+    'ParentPath',
+    'FileName',
+    'Extension',
+    'FileSize',
+    'ReferenceCount',
+    'IsDirectory',
+    'HasAds',
+    'IsAds',
+    'SI<FN',
+    'uSecZeros',
+    'Copied',
+    'SiFlags',
+    'NameType',
+    'Created0x10',
+    'Created0x30',
+    'LastModified0x10',
+    'LastModified0x30',
+    'LastRecordChange0x10',
+    'LastRecordChange0x30',
+    'LastAccess0x10',
+    'LastAccess0x30',
+    'UpdateSequenceNumber',
+    'LogfileSequenceNumber',
+    'SecurityId',
+    'FnAttributeId',
+    'OtherAttributeId',
+    'FixupOk',
+    'FileOffset',
+]
+
+
+def split_reference(reference: int) -> Tuple[int, int]:
+    """Split a file reference into (entry, sequence)"""
+    return reference & 0xFFFFFFFFFFFF, reference >> 48
+
+
+@dataclass
+class StandardInformation:
+    """$STANDARD_INFORMATION attribute"""
+
+    created: int
+    modified: int
+    record_changed: int
+    accessed: int
+    flags: int
+    security_id: int = 0
+    usn: int = 0
+
+    @property
+    def timestamps(self) -> Tuple[int, int, int, int]:
+        """Timestamps as (created, modified, record_changed, accessed)"""
+        return (
+            self.created,
+            self.modified,
+            self.record_changed,
+            self.accessed,
+        )
+
+
+@dataclass
+class FileName:
+    """$FILE_NAME attribute"""
+
+    parent_entry: int
+    parent_sequence: int
+    created: int
+    modified: int
+    record_changed: int
+    accessed: int
+    allocated_size: int
+    real_size: int
+    flags: int
+    namespace: int
+    name: str
+    attribute_id: int = 0
+
+    @property
+    def timestamps(self) -> Tuple[int, int, int, int]:
+        """Timestamps as (created, modified, record_changed, accessed)"""
+        return (
+            self.created,
+            self.modified,
+            self.record_changed,
+            self.accessed,
+        )
+
+
+@dataclass
+class DataStream:
+    """$DATA attribute"""
+
+    name: str
+    size: int
+    resident: bool
+    attribute_id: int = 0
+
+
+@dataclass
+class MFTRecord:
+    """Decoded FILE record"""
+
+    offset: int
+    entry: int
+    sequence: int
+    flags: int
+    link_count: int
+    base_entry: int
+    base_sequence: int
+    lsn: int
+    fixup_ok: bool
+    standard_information: Optional[StandardInformation] = None
+    file_names: List[FileName] = field(default_factory=list)
+    data_streams: List[DataStream] = field(default_factory=list)
+    has_attribute_list: bool = False
+
+    @property
+    def in_use(self) -> bool:
+        """Record is allocated"""
+        return bool(self.flags & FLAG_IN_USE)
+
+    @property
+    def is_directory(self) -> bool:
+        """Record describes a directory"""
+        return bool(self.flags & FLAG_DIRECTORY)
+
+    @property
+    def file_name(self) -> Optional[FileName]:
+        """Preferred $FILE_NAME, long names first"""
+        best = None
+        for file_name in self.file_names:
+            if file_name.namespace != NAMESPACE_DOS:
+                return file_name
+            best = best or file_name
+        return best
+
+    @property
+    def file_size(self) -> int:
+        """Size of the unnamed $DATA stream"""
+        for stream in self.data_streams:
+            if not stream.name:
+                return stream.size
+        file_name = self.file_name
+        return file_name.real_size if file_name else 0
+
+
+def apply_fixups(buffer: bytearray) -> bool:
+    """Apply update sequence array fixups in place
+
+    Returns False when a sector does not carry the expected sequence number
+    """
+    usa_offset, usa_count = _FIXUP.unpack_from(buffer, 4)
+    if usa_count < 2:
+        return True
+    if usa_offset + usa_count * 2 > len(buffer):
+        return False
+    usn = buffer[usa_offset : usa_offset + 2]
+    fixup_ok = True
+    for index in range(1, usa_count):
+        end = index * SECTOR_SIZE
+        if end > len(buffer):
+            break
+        if buffer[end - 2 : end] != usn:
+            fixup_ok = False
+        pos = usa_offset + index * 2
+        buffer[end - 2 : end] = buffer[pos : pos + 2]
+    return fixup_ok
+
+
+def _decode_standard_information(data) -> StandardInformation:
+    std_info = StandardInformation(*_STANDARD_INFORMATION.unpack_from(data))
+    if len(data) >= 56:
+        std_info.security_id = _SECURITY_ID.unpack_from(data, 52)[0]
+    if len(data) >= 72:
+        std_info.usn = _USN.unpack_from(data, 64)[0]
+    return std_info
+
+
+def _decode_file_name(data, attribute_id: int) -> FileName:
+    (
+        parent,
+        created,
+        modified,
+        record_changed,
+        accessed,
+        allocated_size,
+        real_size,
+        flags,
+        _,
+        name_length,
+        namespace,
+    ) = _FILE_NAME.unpack_from(data)
+    name_end = _FILE_NAME.size + name_length * 2
+    name = bytes(data[_FILE_NAME.size : name_end]).decode(
+        'utf-16-le', errors='replace'
+    )
+    parent_entry, parent_sequence = split_reference(parent)
+    return FileName(
+        parent_entry,
+        parent_sequence,
+        created,
+        modified,
+        record_changed,
+        accessed,
+        allocated_size,
+        real_size,
+        flags,
+        namespace,
+        name,
+        attribute_id,
+    )
+
+
+def decode_record(buffer: bytearray, entry: int, offset: int = 0):
+    """Decode a FILE record from a buffer, fixups are applied in place
+
+    Returns None when buffer does not hold a FILE record
+    """
+    if buffer[:4] != FILE_SIGNATURE:
+        return None
+    (
+        _,
+        _,
+        _,
+        lsn,
+        sequence,
+        link_count,
+        attr_offset,
+        flags,
+        used_size,
+        _,
+        base_reference,
+        _,
+    ) = _RECORD_HEADER.unpack_from(buffer)
+    fixup_ok = apply_fixups(buffer)
+    base_entry, base_sequence = split_reference(base_reference)
+    record = MFTRecord(
+        offset,
+        entry,
+        sequence,
+        flags,
+        link_count,
+        base_entry,
+        base_sequence,
+        lsn,
+        fixup_ok,
+    )
+    view = memoryview(buffer)
+    limit = min(used_size, len(buffer))
+    while attr_offset + _ATTR_HEADER.size <= limit:
+        (
+            attr_type,
+            attr_length,
+            non_resident,
+            name_length,
+            name_offset,
+            _,
+            attribute_id,
+        ) = _ATTR_HEADER.unpack_from(buffer, attr_offset)
+        if attr_type == ATTR_END or attr_length == 0:
+            break
+        if attr_offset + attr_length > limit:
+            break
+        if attr_length < (
+            NON_RESIDENT_HEADER_SIZE if non_resident else RESIDENT_HEADER_SIZE
+        ):
+            break
+        attr = view[attr_offset : attr_offset + attr_length]
+        name = ''
+        if name_length:
+            name = bytes(
+                attr[name_offset : name_offset + name_length * 2]
+            ).decode('utf-16-le', errors='replace')
+        if non_resident:
+            data = None
+            size = _NON_RESIDENT_SIZE.unpack_from(attr, 48)[0]
+        else:
+            content_size, content_offset = _RESIDENT.unpack_from(attr, 16)
+            if content_offset + content_size > attr_length:
+                break
+            data = attr[content_offset : content_offset + content_size]
+            size = content_size
+        if attr_type == ATTR_STANDARD_INFORMATION and data is not None:
+            if len(data) >= _STANDARD_INFORMATION.size:
+                record.standard_information = _decode_standard_information(
+                    data
+                )
+        elif attr_type == ATTR_FILE_NAME and data is not None:
+            if len(data) >= _FILE_NAME.size:
+                record.file_names.append(_decode_file_name(data, attribute_id))
+        elif attr_type == ATTR_DATA:
+            record.data_streams.append(
+                DataStream(name, size, not non_resident, attribute_id)
+            )
+        elif attr_type == ATTR_ATTRIBUTE_LIST:
+            record.has_attribute_list = True
+        attr_offset += attr_length
+    view.release()
+    return record
+
+
+class MFTFile:
+    """Memory-mapped $MFT"""
+
+    def __init__(self, filepath: Path):
+        self._filepath = Path(filepath)
+        self._fobj = None
+        self._mmap = None
+        self.record_size = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        """Map file and detect record size"""
+        self._fobj = self._filepath.open('rb')
+        try:
+            self._mmap = mmap(self._fobj.fileno(), 0, access=ACCESS_READ)
+        except ValueError as exc:
+            self._fobj.close()
+            raise ParsingError(f"cannot map empty file: {exc}") from exc
+        self.record_size = detect_record_size(self._mmap)
+
+    def close(self):
+        """Unmap file"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+
+    @property
+    def record_count(self) -> int:
+        """Number of records in the file"""
+        return len(self._mmap) // self.record_size
+
+    def read_record(self, entry: int) -> Optional[MFTRecord]:
+        """Decode record for given entry number"""
+        if entry < 0 or entry >= self.record_count:
+            return None
+        offset = entry * self.record_size
+        buffer = bytearray(self._mmap[offset : offset + self.record_size])
+        return decode_record(buffer, entry, offset)
+
+    def iter_records(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[MFTRecord]:
+        """Lazily decode records in [start, stop)
+
+        A single record-sized buffer is reused so memory stays constant
+        """
+        stop = (
+            self.record_count if stop is None else min(stop, self.record_count)
+        )
+        record_size = self.record_size
+        buffer = bytearray(record_size)
+        for entry in range(start, stop):
+            offset = entry * record_size
+            buffer[:] = self._mmap[offset : offset + record_size]
+            record = decode_record(buffer, entry, offset)
+            if record is not None:
+                yield record
+
+    def resolve_path(self, entry: int, sequence: int) -> str:
+        """Resolve directory path of given entry by walking parents"""
+        parts = []
+        for _ in range(MAX_PATH_DEPTH):
+            if entry == ROOT_ENTRY:
+                return '\\'.join(['.'] + parts[::-1])
+            record = self.read_record(entry)
+            if record is None or record.sequence not in (
+                sequence,
+                sequence + 1,
+            ):
+                break
+            file_name = record.file_name
+            if file_name is None:
+                break
+            parts.append(file_name.name)
+            entry, sequence = file_name.parent_entry, file_name.parent_sequence
+        return '\\'.join([ORPHAN_PATH] + parts[::-1])
+
+
+def is_mft(filepath: Path) -> bool:
+    """Check whether file starts with a FILE record"""
+    with Path(filepath).open('rb') as fobj:
+        return fobj.read(4) in (FILE_SIGNATURE, BAAD_SIGNATURE)
+
+
+def detect_record_size(buffer) -> int:
+    """Detect FILE record size from first record header"""
+    if len(buffer) < _RECORD_HEADER.size:
+        raise ParsingError("file is too small to be a $MFT")
+    if buffer[:4] not in (FILE_SIGNATURE, BAAD_SIGNATURE):
+        raise ParsingError("first record does not have a FILE signature")
+    record_size = _RECORD_HEADER.unpack_from(buffer)[9]
+    if record_size < SECTOR_SIZE or record_size & (record_size - 1):
+        raise ParsingError(f"invalid record size: {record_size}")
+    return record_size
+
+
+def _has_usec_zeros(timestamps) -> bool:
+    return any(value and value % 10000000 == 0 for value in timestamps)
+
+
+def record_rows(
+    record: MFTRecord,
+    parent_path: str,
+    include_dos: bool = False,
+    all_timestamps: bool = False,
+    dt_format: str = DEFAULT_DT_FORMAT,
+) -> Iterator[dict]:
+    """Build MFTECmd-like rows for a record, one per name and per ADS"""
+    std_info = record.standard_information
+    si_timestamps = std_info.timestamps if std_info else (0, 0, 0, 0)
+    file_names = [
+        file_name
+        for file_name in record.file_names
+        if include_dos or file_name.namespace != NAMESPACE_DOS
+    ]
+    ads = [stream for stream in record.data_streams if stream.name]
+    for file_name in file_names:
+        fn_timestamps = file_name.timestamps
+        if not all_timestamps:
+            fn_timestamps = tuple(
+                fn if fn != si else 0
+                for fn, si in zip(fn_timestamps, si_timestamps)
+            )
+        row = {
+            'EntryNumber': record.entry,
+            'SequenceNumber': record.sequence,
+            'InUse': record.in_use,
+            'ParentEntryNumber': file_name.parent_entry,
+            'ParentSequenceNumber': file_name.parent_sequence,
+            'ParentPath': parent_path,
+            'FileName': file_name.name,
+            'Extension': Path(file_name.name).suffix,
+            'FileSize': record.file_size,
+            'ReferenceCount': record.link_count,
+            'IsDirectory': record.is_directory,
+            'HasAds': bool(ads),
+            'IsAds': False,
+            'SI<FN': bool(std_info)
+            and (
+                si_timestamps[0] < file_name.created
+                or si_timestamps[1] < file_name.modified
+            ),
+            'uSecZeros': _has_usec_zeros(si_timestamps),
+            'Copied': bool(std_info) and si_timestamps[1] < si_timestamps[0],
+            'SiFlags': std_info.flags if std_info else '',
+            'NameType': NAMESPACES.get(file_name.namespace, ''),
+            'UpdateSequenceNumber': std_info.usn if std_info else '',
+            'LogfileSequenceNumber': record.lsn,
+            'SecurityId': std_info.security_id if std_info else '',
+            'FnAttributeId': file_name.attribute_id,
+            'OtherAttributeId': '',
+            'FixupOk': record.fixup_ok,
+            'FileOffset': record.offset,
+        }
+        for index, column in enumerate(
+            ('Created', 'LastModified', 'LastRecordChange', 'LastAccess')
+        ):
+            row[f'{column}0x10'] = format_filetime(
+                si_timestamps[index], dt_format
+            )
+            row[f'{column}0x30'] = format_filetime(
+                fn_timestamps[index], dt_format
+            )
+        yield row
+        for stream in ads:
+            ads_row = dict(row)
+            ads_row.update(
+                {
+                    'FileName': f'{file_name.name}:{stream.name}',
+                    'Extension': Path(stream.name).suffix,
+                    'FileSize': stream.size,
+                    'HasAds': False,
+                    'IsAds': True,
+                    'OtherAttributeId': stream.attribute_id,
+                }
+            )
+            yield ads_row
+
+
+def body_parts(record: MFTRecord) -> Optional[tuple]:
+    """Build path-independent bodyfile parts for a record
+
+    Returns (parent entry, parent sequence, name, [(suffix, tail)]) where a
+    line is '0|<path><suffix>|<tail>', $SI and $FN based
+    """
+    file_name = record.file_name
+    if file_name is None:
+        return None
+    inode = f'{record.entry}-{record.sequence}'
+    mode = 'd/drwxrwxrwx' if record.is_directory else 'r/rrwxrwxrwx'
+    size = record.file_size
+    sources = [(' ($FILE_NAME)', file_name.timestamps)]
+    if record.standard_information:
+        sources.insert(0, ('', record.standard_information.timestamps))
+    lines = []
+    for suffix, (created, modified, changed, accessed) in sources:
+        times = '|'.join(
+            str(filetime_to_unix(value))
+            for value in (accessed, modified, changed, created)
+        )
+        lines.append((suffix, f'{inode}|{mode}|0|0|{size}|{times}'))
+    return (
+        file_name.parent_entry,
+        file_name.parent_sequence,
+        file_name.name,
+        lines,
+    )
+
+
+def body_lines(parts: tuple, parent_path: str, drive_letter: str):
+    """Build bodyfile lines from body parts and resolved parent path"""
+    _, _, name, lines = parts
+    path = f'{parent_path}\\{name}'.replace('\\', '/')
+    path = f'{drive_letter}:{path[1:]}' if path.startswith('.') else path
+    for suffix, tail in lines:
+        yield f'0|{path}{suffix}|{tail}'
+
+
+class PathIndex:
+    """Parent reference index with a memoized path resolver
+
+    Maps (entry, sequence) to (parent entry, parent sequence, name). Resolved
+    directory paths are memoized in an LRU cache bounded to cache_size.
+    """
+
+    def __init__(self, cache_size: int = PATH_CACHE_SIZE):
+        self._nodes = {}
+        self._children = None
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @staticmethod
+    def record_item(record: MFTRecord) -> Optional[tuple]:
+        """Index item for a record, deleted records keep their old sequence"""
+        file_name = record.file_name
+        if file_name is None or record.base_entry:
+            return None
+        sequence = record.sequence
+        if not record.in_use and sequence:
+            sequence -= 1
+        return (
+            (record.entry, sequence),
+            (
+                file_name.parent_entry,
+                file_name.parent_sequence,
+                file_name.name,
+            ),
+        )
+
+    def update(self, items: Iterable[tuple]):
+        """Add (key, node) items to the index"""
+        self._nodes.update(items)
+        self._children = None
+        self._cache.clear()
+
+    def node(self, entry: int, sequence: int) -> Optional[tuple]:
+        """(parent entry, parent sequence, name) for given key"""
+        return self._nodes.get((entry, sequence))
+
+    def children(self, entry: int, sequence: int) -> List[Tuple[int, int]]:
+        """Keys of entries whose parent is (entry, sequence)"""
+        if self._children is None:
+            children = {}
+            for key, (parent_entry, parent_sequence, _) in self._nodes.items():
+                if key[0] == ROOT_ENTRY:
+                    continue
+                children.setdefault(
+                    (parent_entry, parent_sequence), []
+                ).append(key)
+            self._children = children
+        return sorted(self._children.get((entry, sequence), []))
+
+    def resolve(self, entry: int, sequence: int) -> str:
+        """Resolve full path of (entry, sequence)"""
+        key = (entry, sequence)
+        chain = []
+        visited = set()
+        while True:
+            if key[0] == ROOT_ENTRY:
+                path = '.'
+                break
+            path = self._cache.get(key)
+            if path is not None:
+                self._cache.move_to_end(key)
+                break
+            node = self._nodes.get(key)
+            if node is None or key in visited or len(chain) > MAX_PATH_DEPTH:
+                path = ORPHAN_PATH
+                break
+            visited.add(key)
+            chain.append((key, node[2]))
+            key = (node[0], node[1])
+        for key, name in reversed(chain):
+            path = f'{path}\\{name}'
+            self._cache[key] = path
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return path
+
+
+def _index_shard(filepath: Path, start: int, stop: int) -> List[tuple]:
+    with MFTFile(filepath) as mft:
+        return [
+            item
+            for item in map(
+                PathIndex.record_item, mft.iter_records(start, stop)
+            )
+            if item is not None
+        ]
+
+
+def iter_shards(filepath: Path, record_count: int, *args) -> Iterator[tuple]:
+    """Arguments of record-aligned shards, extra args are appended"""
+    for start in range(0, record_count, SHARD_RECORDS):
+        yield (
+            filepath,
+            start,
+            min(start + SHARD_RECORDS, record_count),
+        ) + args
+
+
+def load_path_index(filepath: Path, workers: int = 1) -> PathIndex:
+    """Build path index of a $MFT in a single pass"""
+    index = PathIndex()
+    with MFTFile(filepath) as mft:
+        record_count = mft.record_count
+        if workers == 1 or record_count <= SHARD_RECORDS:
+            index.update(
+                item
+                for item in map(PathIndex.record_item, mft.iter_records())
+                if item is not None
+            )
+        else:
+            for items in iter_pool_ordered(
+                _index_shard, iter_shards(filepath, record_count), workers
+            ):
+                index.update(items)
+    return index
+
+
+@dataclass
+class ExportOptions:
+    """Row building options
+
+    extract is called on every exported record where it is decoded, it
+    must be picklable to be sent to workers
+    """
+
+    include_dos: bool = False
+    all_timestamps: bool = False
+    dt_format: str = DEFAULT_DT_FORMAT
+    body: bool = False
+    extract: Optional[Callable[[MFTRecord], object]] = None
+
+
+def _record_exports(record: MFTRecord, options: ExportOptions) -> tuple:
+    rows = list(
+        record_rows(
+            record,
+            '',
+            options.include_dos,
+            options.all_timestamps,
+            options.dt_format,
+        )
+    )
+    return (
+        rows,
+        body_parts(record) if options.body else None,
+        PathIndex.record_item(record),
+        options.extract(record) if options.extract else None,
+    )
+
+
+def _export_shard(
+    filepath: Path, start: int, stop: int, options: ExportOptions
+) -> List[tuple]:
+    with MFTFile(filepath) as mft:
+        return [
+            _record_exports(record, options)
+            for record in mft.iter_records(start, stop)
+            if record.file_name is not None
+        ]
+
+
+def _iter_spool(spool) -> Iterator[tuple]:
+    spool.seek(0)
+    while True:
+        try:
+            yield pickle.load(spool)
+        except EOFError:
+            return
+
+
+def export(
+    filepath: Path,
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    body_filepath: Optional[Path] = None,
+    drive_letter: str = 'C',
+    include_dos: bool = False,
+    all_timestamps: bool = False,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+    workers: int = 1,
+    timeline_filepath: Optional[Path] = None,
+    sort_buffer: int = SORT_BUFFER_SIZE,
+    index: Optional[PathIndex] = None,
+    extract: Optional[Callable[[MFTRecord], object]] = None,
+    collect: Optional[Callable[[object], None]] = None,
+) -> int:
+    """Export $MFT records to CSV, JSON, bodyfile and/or timeline
+
+    Records are decoded in a single pass which builds the path index while
+    rows, without their parent path, are spooled to an anonymous temporary
+    file. Parent paths are resolved once the index is complete, as spooled
+    rows are written. When workers is not 1, record-aligned shards are
+    decoded by a process pool (0 means one worker per CPU) and merged back
+    in entry number order. Timeline events are sorted with at most
+    sort_buffer of them held in memory.
+
+    The index is filled into index when given so callers can reuse it.
+    When extract is given, it is called on every exported record, in
+    workers when sharded, and its results are handed to collect in entry
+    number order. Returns the number of exported records.
+    """
+    newline = '\n' if lf else '\r\n'
+    options = ExportOptions(
+        include_dos,
+        all_timestamps,
+        dt_format,
+        bool(body_filepath or timeline_filepath),
+        extract,
+    )
+    if index is None:
+        index = PathIndex()
+    count = 0
+    with ExitStack() as stack:
+        mft = stack.enter_context(MFTFile(filepath))
+        spool = stack.enter_context(tempfile.TemporaryFile())
+        record_count = mft.record_count
+        if workers == 1 or record_count <= SHARD_RECORDS:
+            exports = (
+                _record_exports(record, options)
+                for record in mft.iter_records()
+                if record.file_name is not None
+            )
+        else:
+            exports = chain.from_iterable(
+                iter_pool_ordered(
+                    _export_shard,
+                    iter_shards(filepath, record_count, options),
+                    workers,
+                )
+            )
+        for rows, parts, item, extracted in exports:
+            if item is not None:
+                index.update((item,))
+            if collect is not None:
+                collect(extracted)
+            pickle.dump((rows, parts), spool, pickle.HIGHEST_PROTOCOL)
+        mft.close()
+        writer = stack.enter_context(
+            RowWriter(MFT_FIELDS, csv_filepath, json_filepath, lf)
+        )
+        body_fobj = None
+        if body_filepath:
+            body_fobj = stack.enter_context(
+                Path(body_filepath).open('w', encoding='utf-8', newline='')
+            )
+        timeline = None
+        if timeline_filepath:
+            timeline = stack.enter_context(
+                TimelineWriter(timeline_filepath, sort_buffer, dt_format, lf)
+            )
+        for rows, parts in _iter_spool(spool):
+            for row in rows:
+                row['ParentPath'] = index.resolve(
+                    row['ParentEntryNumber'], row['ParentSequenceNumber']
+                )
+                writer.write(row)
+            if parts:
+                parent_path = index.resolve(parts[0], parts[1])
+                for line in body_lines(parts, parent_path, drive_letter):
+                    if body_fobj:
+                        body_fobj.write(line + newline)
+                    if timeline:
+                        timeline.add(line)
+            count += 1
+    return count
+
+
+def parse_entry_reference(value) -> Tuple[int, Optional[int]]:
+    """Parse 'Entry' or 'Entry-Seq' given as decimal or hex"""
+    entry, _, sequence = str(value).strip().partition('-')
+    try:
+        return int(entry, 0), int(sequence, 0) if sequence else None
+    except ValueError as exc:
+        raise ParsingError(f"invalid entry reference: {value}") from exc
+
+
+def list_directory(
+    filepath: Path,
+    reference: str,
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    include_dos: bool = False,
+    all_timestamps: bool = False,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+    workers: int = 1,
+    index: Optional[PathIndex] = None,
+) -> int:
+    """Export entries of the directory designated by reference
+
+    The path index is built in a single pass unless one is given.
+    Returns the number of exported records.
+    """
+    entry, sequence = parse_entry_reference(reference)
+    if index is None:
+        index = load_path_index(filepath, workers)
+    count = 0
+    with MFTFile(filepath) as mft, RowWriter(
+        MFT_FIELDS, csv_filepath, json_filepath, lf
+    ) as writer:
+        if sequence is None:
+            record = mft.read_record(entry)
+            if record is None:
+                raise ParsingError(f"entry {entry} not found")
+            item = PathIndex.record_item(record)
+            sequence = item[0][1] if item else record.sequence
+        for child_entry, _ in index.children(entry, sequence):
+            record = mft.read_record(child_entry)
+            if record is None:
+                continue
+            for row in record_rows(
+                record, '', include_dos, all_timestamps, dt_format
+            ):
+                row['ParentPath'] = index.resolve(
+                    row['ParentEntryNumber'], row['ParentSequenceNumber']
+                )
+                writer.write(row)
+            count += 1
+    return count
+
+
+def read_raw_record(filepath: Path, offset: int) -> bytes:
+    """Read the FILE record at offset, only mapping the page holding it"""
+    with Path(filepath).open('rb') as fobj:
+        record_size = detect_record_size(fobj.read(_RECORD_HEADER.size))
+        file_size = os.fstat(fobj.fileno()).st_size
+        if offset < 0 or offset + record_size > file_size:
+            raise ParsingError(f"offset {offset:#x} is out of bounds")
+        start = offset - offset % ALLOCATIONGRANULARITY
+        with mmap(
+            fobj.fileno(),
+            offset + record_size - start,
+            access=ACCESS_READ,
+            offset=start,
+        ) as page:
+            return page[offset - start : offset - start + record_size]
+
+
+def read_record_at(filepath: Path, offset: int) -> MFTRecord:
+    """Decode the FILE record at offset"""
+    raw = read_raw_record(filepath, offset)
+    record = decode_record(bytearray(raw), offset // len(raw), offset)
+    if record is None:
+        raise ParsingError(f"no FILE record at offset {offset:#x}")
+    return record
+
+
+def record_details(
+    record: MFTRecord, parent_path: str, dt_format: str = DEFAULT_DT_FORMAT
+) -> dict:
+    """Full details of a record, timestamps formatted using dt_format"""
+    details = asdict(record)
+    for attribute in [details['standard_information']] + details['file_names']:
+        if attribute is None:
+            continue
+        for name in ('created', 'modified', 'record_changed', 'accessed'):
+            attribute[name] = format_filetime(attribute[name], dt_format)
+    for file_name in details['file_names']:
+        file_name['namespace'] = NAMESPACES.get(file_name['namespace'], '')
+    details['parent_path'] = parent_path
+    details['in_use'] = record.in_use
+    details['is_directory'] = record.is_directory
+    return details
+
+
+def dump_entry(
+    filepath: Path,
+    reference: str,
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    include_dos: bool = False,
+    all_timestamps: bool = False,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+    index: Optional[PathIndex] = None,
+) -> int:
+    """Export full details of a single entry without parsing the whole file
+
+    The record offset is computed from the entry number, the parent path is
+    resolved from index when given or by walking parent records
+    """
+    entry, sequence = parse_entry_reference(reference)
+    with Path(filepath).open('rb') as fobj:
+        record_size = detect_record_size(fobj.read(_RECORD_HEADER.size))
+    record = read_record_at(filepath, entry * record_size)
+    if sequence is not None and sequence != record.sequence:
+        raise ParsingError(
+            f"entry {entry} has sequence {record.sequence}, not {sequence}"
+        )
+    file_name = record.file_name
+    parent_path = ''
+    if file_name is not None:
+        parent_reference = (file_name.parent_entry, file_name.parent_sequence)
+        if index is not None:
+            parent_path = index.resolve(*parent_reference)
+        else:
+            with MFTFile(filepath) as mft:
+                parent_path = mft.resolve_path(*parent_reference)
+    if json_filepath:
+        with Path(json_filepath).open('w', encoding='utf-8') as fobj:
+            json.dump(record_details(record, parent_path, dt_format), fobj)
+    with RowWriter(MFT_FIELDS, csv_filepath, None, lf) as writer:
+        for row in record_rows(
+            record, parent_path, include_dos, all_timestamps, dt_format
+        ):
+            writer.write(row)
+    return 1
+
+
+def dump_record(filepath: Path, offset: int, directory: Path) -> Path:
+    """Save raw FILE record found at offset to directory"""
+    raw = read_raw_record(filepath, offset)
+    if raw[:4] not in (FILE_SIGNATURE, BAAD_SIGNATURE):
+        raise ParsingError(f"no FILE record at offset {offset:#x}")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    output = directory / f'FILE_{offset:#x}.bin'
+    output.write_bytes(raw)
+    return output
@@ -0,0 +1,361 @@
+"""Columnar in-memory $MFT table
+"""
+from pathlib import Path
+from typing import Optional, Tuple
+from .common import (
+    DEFAULT_DT_FORMAT,
+    ParsingError,
+    RowWriter,
+    format_filetime,
+    iter_pool_ordered,
+)
+from .mft import (
+    SHARD_RECORDS,
+    MFTFile,
+    MFTRecord,
+    PathIndex,
+    export as export_mft,
+    iter_shards,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TIMESTAMP_COLUMNS = [
+    f'{attribute}_{name}'
+    for attribute in ('si', 'fn')
+    for name in ('created', 'modified', 'record_changed', 'accessed')
+]
+TABLE_COLUMNS = [
+    ('entry', '<u8'),
+    ('sequence', '<u2'),
+    ('parent_entry', '<u8'),
+    ('parent_sequence', '<u2'),
+    ('flags', '<u2'),
+    ('si_flags', '<u4'),
+    ('file_size', '<u8'),
+] + [(name, '<u8') for name in TIMESTAMP_COLUMNS]
+# FILETIMEs above are out of the range Windows accepts
+MAX_FILETIME = 0x7FFFFFFFFFFFFFFF
+TABLE_CHUNK_ROWS = 65536
+ANOMALY_FIELDS = [
+    'EntryNumber',
+    'SequenceNumber',
+    'InUse',
+    'ParentPath',
+    'FileName',
+    'SI<FN',
+    'uSecZeros',
+    'Created0x10',
+    'Created0x30',
+    'LastModified0x10',
+    'LastModified0x30',
+]
+
+
+def record_values(record: MFTRecord) -> Tuple[tuple, bytes]:
+    """Column values and UTF-8 name of a record holding a $FN"""
+    std_info = record.standard_information
+    file_name = record.file_name
+    return (
+        (
+            record.entry,
+            record.sequence,
+            file_name.parent_entry,
+            file_name.parent_sequence,
+            record.flags,
+            std_info.flags if std_info else 0,
+            record.file_size,
+            *(std_info.timestamps if std_info else (0, 0, 0, 0)),
+            *file_name.timestamps,
+        ),
+        file_name.name.encode('utf-8'),
+    )
+
+
+class TableBuilder:
+    """Accumulate record values into table columns
+
+    Rows are written into preallocated arrays of TABLE_CHUNK_ROWS rows so
+    no per-record Python object is kept while records are added
+    """
+
+    def __init__(self):
+        if np is None:
+            raise ParsingError("numpy is required to build $MFT tables")
+        self._dtype = np.dtype(TABLE_COLUMNS)
+        self._chunks = []
+        self._end_chunks = []
+        self._names = bytearray()
+        self._row = TABLE_CHUNK_ROWS
+
+    def add(self, values: Tuple[tuple, bytes]):
+        """Append the values of a record as returned by record_values"""
+        if self._row == TABLE_CHUNK_ROWS:
+            self._chunks.append(np.empty(TABLE_CHUNK_ROWS, self._dtype))
+            self._end_chunks.append(np.empty(TABLE_CHUNK_ROWS, np.int64))
+            self._row = 0
+        columns, name = values
+        self._chunks[-1][self._row] = columns
+        self._names += name
+        self._end_chunks[-1][self._row] = len(self._names)
+        self._row += 1
+
+    def arrays(self) -> Tuple['np.ndarray', bytes, 'np.ndarray']:
+        """Columns, names and name ends of the rows added"""
+        if not self._chunks:
+            return (
+                np.zeros(0, self._dtype),
+                b'',
+                np.zeros(0, np.int64),
+            )
+        self._chunks[-1] = self._chunks[-1][: self._row]
+        self._end_chunks[-1] = self._end_chunks[-1][: self._row]
+        self._row = TABLE_CHUNK_ROWS
+        return (
+            np.concatenate(self._chunks),
+            bytes(self._names),
+            np.concatenate(self._end_chunks),
+        )
+
+    def build(self) -> 'MFTTable':
+        """Table of the rows added"""
+        return MFTTable(*self.arrays())
+
+
+def _table_shard(
+    filepath: Path, start: int, stop: Optional[int]
+) -> Tuple['np.ndarray', bytes, 'np.ndarray']:
+    builder = TableBuilder()
+    with MFTFile(filepath) as mft:
+        for record in mft.iter_records(start, stop):
+            if record.file_name is not None:
+                builder.add(record_values(record))
+    return builder.arrays()
+
+
+class MFTTable:
+    """$MFT entries held as a NumPy structured array
+
+    Names are kept in a single UTF-8 blob indexed by end offsets
+    """
+
+    def __init__(self, columns, names: bytes, name_ends):
+        self.columns = columns
+        self._names = names
+        self._name_ends = name_ends
+
+    def __len__(self):
+        return len(self.columns)
+
+    @classmethod
+    def from_file(cls, filepath: Path, workers: int = 1) -> 'MFTTable':
+        """Build table from a $MFT, shards are decoded in a process pool"""
+        if np is None:
+            raise ParsingError("numpy is required to build $MFT tables")
+        with MFTFile(filepath) as mft:
+            record_count = mft.record_count
+        if workers == 1 or record_count <= SHARD_RECORDS:
+            shards = [_table_shard(filepath, 0, None)]
+        else:
+            shards = list(
+                iter_pool_ordered(
+                    _table_shard, iter_shards(filepath, record_count), workers
+                )
+            )
+        columns = np.concatenate([shard[0] for shard in shards])
+        ends = []
+        base = 0
+        for _, names, shard_ends in shards:
+            ends.append(shard_ends + base)
+            base += len(names)
+        return cls(
+            columns,
+            b''.join(shard[1] for shard in shards),
+            np.concatenate(ends) if ends else np.zeros(0, np.int64),
+        )
+
+    def name(self, row: int) -> str:
+        """File name of given row"""
+        start = int(self._name_ends[row - 1]) if row else 0
+        end = int(self._name_ends[row])
+        return self._names[start:end].decode('utf-8')
+
+    def path_index(self) -> PathIndex:
+        """Path index built from table columns"""
+        index = PathIndex()
+        columns = self.columns
+        sequences = columns['sequence'].astype(np.int64)
+        deleted = ((columns['flags'] & 1) == 0) & (sequences > 0)
+        sequences[deleted] -= 1
+        index.update(
+            (
+                (entry, sequence),
+                (parent_entry, parent_sequence, self.name(row)),
+            )
+            for row, (entry, sequence, parent_entry, parent_sequence) in (
+                enumerate(
+                    zip(
+                        columns['entry'].tolist(),
+                        sequences.tolist(),
+                        columns['parent_entry'].tolist(),
+                        columns['parent_sequence'].tolist(),
+                    )
+                )
+            )
+        )
+        return index
+
+    @property
+    def in_use(self):
+        """Mask of allocated entries"""
+        return (self.columns['flags'] & 1).astype(bool)
+
+    def valid(self, name: str):
+        """Mask of entries holding a FILETIME in range in given column"""
+        column = self.columns[name]
+        return (column != 0) & (column <= MAX_FILETIME)
+
+    def timestomped(self):
+        """Mask of entries whose $SI created or modified precede $FN ones
+
+        Timestamps missing or out of range are never compared
+        """
+        columns = self.columns
+        created = (
+            self.valid('si_created')
+            & self.valid('fn_created')
+            & (columns['si_created'] < columns['fn_created'])
+        )
+        modified = (
+            self.valid('si_modified')
+            & self.valid('fn_modified')
+            & (columns['si_modified'] < columns['fn_modified'])
+        )
+        return self.valid('si_created') & (created | modified)
+
+    def usec_zeros(self):
+        """Mask of entries with a $SI timestamp lacking sub-second part"""
+        mask = np.zeros(len(self), dtype=bool)
+        for name in TIMESTAMP_COLUMNS[:4]:
+            mask |= self.valid(name) & (self.columns[name] % 10000000 == 0)
+        return mask
+
+    def deleted_ratio(self) -> dict:
+        """Counts of in-use and deleted entries and deleted ratio"""
+        in_use = int(np.count_nonzero(self.in_use))
+        deleted = len(self) - in_use
+        return {
+            'in_use': in_use,
+            'deleted': deleted,
+            'ratio': deleted / len(self) if len(self) else 0.0,
+        }
+
+
+def write_anomalies(
+    table: MFTTable,
+    index: PathIndex,
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+) -> dict:
+    """Write timestomping and zeroed sub-second precision candidates
+
+    Parent paths are resolved through index. Returns the deleted ratio
+    summary completed with anomaly counts
+    """
+    timestomped = table.timestomped()
+    usec_zeros = table.usec_zeros()
+    rows = np.flatnonzero(timestomped | usec_zeros)
+    columns = table.columns
+    in_use = table.in_use
+    with RowWriter(ANOMALY_FIELDS, csv_filepath, json_filepath, lf) as writer:
+        for row in rows.tolist():
+            record = columns[row]
+            writer.write(
+                {
+                    'EntryNumber': int(record['entry']),
+                    'SequenceNumber': int(record['sequence']),
+                    'InUse': bool(in_use[row]),
+                    'ParentPath': index.resolve(
+                        int(record['parent_entry']),
+                        int(record['parent_sequence']),
+                    ),
+                    'FileName': table.name(row),
+                    'SI<FN': bool(timestomped[row]),
+                    'uSecZeros': bool(usec_zeros[row]),
+                    'Created0x10': format_filetime(
+                        int(record['si_created']), dt_format
+                    ),
+                    'Created0x30': format_filetime(
+                        int(record['fn_created']), dt_format
+                    ),
+                    'LastModified0x10': format_filetime(
+                        int(record['si_modified']), dt_format
+                    ),
+                    'LastModified0x30': format_filetime(
+                        int(record['fn_modified']), dt_format
+                    ),
+                }
+            )
+    summary = table.deleted_ratio()
+    summary['timestomped'] = int(np.count_nonzero(timestomped))
+    summary['usec_zeros'] = int(np.count_nonzero(usec_zeros))
+    return summary
+
+
+def export_anomalies(
+    filepath: Path,
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+    workers: int = 1,
+) -> dict:
+    """Export timestomping and zeroed sub-second precision candidates
+
+    Returns the deleted ratio summary completed with anomaly counts
+    """
+    table = MFTTable.from_file(filepath, workers)
+    return write_anomalies(
+        table, table.path_index(), csv_filepath, json_filepath, dt_format, lf
+    )
+
+
+def export_with_anomalies(
+    filepath: Path,
+    anomalies_csv_filepath: Optional[Path] = None,
+    anomalies_json_filepath: Optional[Path] = None,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+    **kwargs,
+) -> Tuple[int, dict]:
+    """Export $MFT records and their anomalies from a single decoding pass
+
+    The table and the path index are filled while the export decodes
+    records, kwargs are its other arguments. Returns the number of exported
+    records and the anomalies summary.
+    """
+    builder = TableBuilder()
+    index = PathIndex()
+    count = export_mft(
+        filepath,
+        dt_format=dt_format,
+        lf=lf,
+        index=index,
+        extract=record_values,
+        collect=builder.add,
+        **kwargs,
+    )
+    summary = write_anomalies(
+        builder.build(),
+        index,
+        anomalies_csv_filepath,
+        anomalies_json_filepath,
+        dt_format,
+        lf,
+    )
+    return count, summary
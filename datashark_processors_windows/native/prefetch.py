@@ -0,0 +1,365 @@
+"""Native prefetch parser
+"""
+from struct import Struct, error as StructError
+from hashlib import sha1
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .common import (
+    ParsingError,
+    RowWriter,
+    format_filetime,
+    iter_files,
+    iter_pool,
+    source_times,
+)
+from .keywords import get_automaton
+from .lzxpress import decompress
+
+DEFAULT_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss'
+PRECISE_DT_FORMAT = 'yyyy-MM-dd HH:mm:ss.fffffff'
+DEFAULT_KEYWORDS = ('temp', 'tmp')
+MAM_SIGNATURE = b'MAM'
+MAM_XPRESS_HUFFMAN = 4
+MAM_CHECKSUM_FLAG = 0x80
+SCCA_SIGNATURE = b'SCCA'
+HEADER_SIZE = 84
+EXECUTABLE_NAME_SIZE = 60
+PREVIOUS_RUN_COUNT = 7
+VERSIONS = {
+    17: 'Windows XP or Windows Server 2003',
+    23: 'Windows Vista or Windows 7',
+    26: 'Windows 8.0, Windows 8.1, or Windows Server 2012(R2)',
+    30: 'Windows 10 or Windows 11',
+}
+VOLUME_ENTRY_SIZES = {17: 40, 23: 104, 26: 104, 30: 96}
+PREFETCH_FIELDS = (
+    [
+        'SourceFilename',
+        'SourceCreated',
+        'SourceModified',
+        'SourceAccessed',
+        'ExecutableName',
+        'Hash',
+        'Size',
+        'Version',
+        'RunCount',
+        'LastRun',
+    ]
+    + [f'PreviousRun{index}' for index in range(PREVIOUS_RUN_COUNT)]
+    + [
+        f'Volume{index}{name}'
+        for index in range(2)
+        for name in ('Name', 'Serial', 'Created')
+    ]
+    + ['Directories', 'FilesLoaded', 'Keywords', 'Highlighted', 'ParsingError']
+)
+TIMELINE_FIELDS = ['RunTime', 'ExecutableName']
+
+_MAM_HEADER = Struct('<3sBI')
+_U32 = Struct('<I')
+_HEADER = Struct('<I4sII60sI')
+_FILE_INFO = Struct('<IIIIIIIII')
+_VOLUME = Struct('<IIQIIIII')
+_U16 = Struct('<H')
+_U64 = Struct('<Q')
+
+
+@dataclass
+class Volume:
+    """Volume information entry"""
+
+    device_path: str
+    created: int
+    serial: int
+    directories: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Prefetch:
+    """Decoded prefetch file"""
+
+    version: int
+    executable_name: str
+    hash: int
+    size: int
+    run_count: int
+    run_times: List[int]
+    filenames: List[str]
+    volumes: List[Volume]
+
+    @property
+    def executable_path(self) -> str:
+        """Referenced file matching executable name, name when missing"""
+        suffix = '\\' + self.executable_name.upper()
+        for filename in self.filenames:
+            if filename.upper().endswith(suffix):
+                return filename
+        return self.executable_name
+
+
+def is_compressed(data: bytes) -> bool:
+    """Check whether data is a Win10 MAM compressed prefetch"""
+    return data[:3] == MAM_SIGNATURE
+
+
+def uncompress(data: bytes) -> bytes:
+    """Decompress MAM container, data is returned as-is otherwise"""
+    if not is_compressed(data):
+        return data
+    if len(data) < _MAM_HEADER.size:
+        raise ParsingError("truncated MAM header")
+    _, flags, size = _MAM_HEADER.unpack_from(data)
+    if flags & ~MAM_CHECKSUM_FLAG != MAM_XPRESS_HUFFMAN:
+        raise ParsingError(f"unsupported MAM compression: {flags:#x}")
+    start = _MAM_HEADER.size
+    if flags & MAM_CHECKSUM_FLAG:
+        start += _U32.size
+    return decompress(memoryview(data)[start:], size)
+
+
+def read_prefetch(filepath: Path) -> bytes:
+    """Read prefetch file bytes, decompressed when needed"""
+    return uncompress(Path(filepath).read_bytes())
+
+
+def _utf16(data: bytes, start: int, end: int) -> str:
+    return data[start:end].decode('utf-16-le', errors='replace')
+
+
+def _volumes(data: bytes, version: int, offset: int, count: int) -> list:
+    entry_size = VOLUME_ENTRY_SIZES[version]
+    volumes = []
+    for index in range(count):
+        entry = offset + index * entry_size
+        (
+            path_offset,
+            path_length,
+            created,
+            serial,
+            _,
+            _,
+            directories_offset,
+            directory_count,
+        ) = _VOLUME.unpack_from(data, entry)
+        start = offset + path_offset
+        volume = Volume(
+            _utf16(data, start, start + path_length * 2), created, serial
+        )
+        position = offset + directories_offset
+        for _ in range(directory_count):
+            length = _U16.unpack_from(data, position)[0]
+            position += _U16.size
+            volume.directories.append(
+                _utf16(data, position, position + length * 2)
+            )
+            position += (length + 1) * 2
+        volumes.append(volume)
+    return volumes
+
+
+def parse(data: bytes) -> Prefetch:
+    """Decode uncompressed prefetch bytes"""
+    if len(data) < HEADER_SIZE + _FILE_INFO.size:
+        raise ParsingError("truncated prefetch header")
+    version, signature, _, size, name, hash_ = _HEADER.unpack_from(data)
+    if signature != SCCA_SIGNATURE:
+        raise ParsingError("invalid prefetch signature")
+    if version not in VERSIONS:
+        raise ParsingError(f"unsupported prefetch version: {version}")
+    (
+        metrics_offset,
+        _,
+        _,
+        _,
+        filenames_offset,
+        filenames_size,
+        volumes_offset,
+        volume_count,
+        _,
+    ) = _FILE_INFO.unpack_from(data, HEADER_SIZE)
+    info = HEADER_SIZE
+    if version == 17:
+        run_times_offset, run_time_count, run_count_offset = 36, 1, 60
+    elif version == 23:
+        run_times_offset, run_time_count, run_count_offset = 44, 1, 68
+    else:
+        run_times_offset = 44
+        run_time_count = PREVIOUS_RUN_COUNT + 1
+        run_count_offset = 116
+        if version == 26 or metrics_offset == 0x130:
+            run_count_offset = 124
+    if len(data) < info + run_count_offset + _U32.size:
+        raise ParsingError("truncated prefetch file information")
+    run_times = [
+        _U64.unpack_from(data, info + run_times_offset + index * 8)[0]
+        for index in range(run_time_count)
+    ]
+    run_count = _U32.unpack_from(data, info + run_count_offset)[0]
+    filenames = _utf16(
+        data, filenames_offset, filenames_offset + filenames_size
+    ).split('\x00')
+    try:
+        volumes = _volumes(data, version, volumes_offset, volume_count)
+    except StructError as exc:
+        raise ParsingError(f"invalid volume information: {exc}") from exc
+    return Prefetch(
+        version,
+        _utf16(name, 0, EXECUTABLE_NAME_SIZE).split('\x00', 1)[0],
+        hash_,
+        size,
+        run_count,
+        [value for value in run_times if value],
+        [filename for filename in filenames if filename],
+        volumes,
+    )
+
+
+def compile_keywords(keywords: Optional[str]) -> tuple:
+    """Default keywords completed with comma separated keywords"""
+    extra = [word.strip().lower() for word in (keywords or '').split(',')]
+    return tuple(
+        dict.fromkeys(DEFAULT_KEYWORDS + tuple(word for word in extra if word))
+    )
+
+
+def highlight(
+    prefetch: Prefetch, keywords: Iterable[str]
+) -> Tuple[List[str], List[str]]:
+    """Keywords found in referenced files and directories and the matching
+    references, all references are scanned at once
+    """
+    references = list(prefetch.filenames)
+    for volume in prefetch.volumes:
+        references.extend(volume.directories)
+    return get_automaton(tuple(keywords)).search(references)
+
+
+def prefetch_row(
+    prefetch: Prefetch,
+    source: Path,
+    keywords: Iterable[str] = DEFAULT_KEYWORDS,
+    dt_format: str = DEFAULT_DT_FORMAT,
+) -> dict:
+    """Build PECmd-like row for a prefetch"""
+    created, modified, accessed = source_times(source)
+    run_times = prefetch.run_times
+    row = {
+        'SourceFilename': str(source),
+        'SourceCreated': format_filetime(created, dt_format),
+        'SourceModified': format_filetime(modified, dt_format),
+        'SourceAccessed': format_filetime(accessed, dt_format),
+        'ExecutableName': prefetch.executable_name,
+        'Hash': f'{prefetch.hash:08X}',
+        'Size': prefetch.size,
+        'Version': VERSIONS[prefetch.version],
+        'RunCount': prefetch.run_count,
+        'LastRun': format_filetime(run_times[0], dt_format)
+        if run_times
+        else '',
+    }
+    for index in range(PREVIOUS_RUN_COUNT):
+        value = run_times[index + 1] if index + 1 < len(run_times) else 0
+        row[f'PreviousRun{index}'] = format_filetime(value, dt_format)
+    for index in range(2):
+        volume = (
+            prefetch.volumes[index] if index < len(prefetch.volumes) else None
+        )
+        row[f'Volume{index}Name'] = volume.device_path if volume else ''
+        row[f'Volume{index}Serial'] = f'{volume.serial:X}' if volume else ''
+        row[f'Volume{index}Created'] = (
+            format_filetime(volume.created, dt_format) if volume else ''
+        )
+    row['Directories'] = ', '.join(
+        path for volume in prefetch.volumes for path in volume.directories
+    )
+    row['FilesLoaded'] = ', '.join(prefetch.filenames)
+    hits, highlighted = highlight(prefetch, keywords)
+    row['Keywords'] = ', '.join(hits)
+    row['Highlighted'] = ', '.join(highlighted)
+    return row
+
+
+def iter_prefetch_files(directory: Path) -> Iterator[Path]:
+    """Recursively yield .pf files found under directory"""
+    return iter_files(directory, ('.pf',))
+
+
+def _process_file(
+    filepath: Path,
+    keywords: Iterable[str],
+    dt_format: str,
+    save_to: Optional[Path],
+) -> Tuple[bytes, dict, List[dict]]:
+    """Parse a single prefetch file into a row and its timeline rows
+
+    Parsing errors are reported in the row so a bad file does not abort a
+    directory export
+    """
+    filepath = Path(filepath)
+    try:
+        raw = filepath.read_bytes()
+        data = uncompress(raw)
+        prefetch = parse(data)
+    except (ParsingError, StructError, OSError) as exc:
+        return (
+            b'',
+            {'SourceFilename': str(filepath), 'ParsingError': str(exc)},
+            [],
+        )
+    if save_to:
+        target = Path(save_to)
+        if target.is_dir():
+            target = target / filepath.name
+        target.write_bytes(data)
+    row = prefetch_row(prefetch, filepath, keywords, dt_format)
+    events = [
+        {
+            'RunTime': format_filetime(run_time, dt_format),
+            'ExecutableName': prefetch.executable_path,
+        }
+        for run_time in prefetch.run_times
+    ]
+    return sha1(raw).digest(), row, events
+
+
+def export(
+    filepaths: Iterable[Path],
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    timeline_filepath: Optional[Path] = None,
+    keywords: Iterable[str] = DEFAULT_KEYWORDS,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    save_to: Optional[Path] = None,
+    dedupe: bool = False,
+    workers: int = 1,
+    ordered: bool = True,
+) -> int:
+    """Export prefetch files to CSV and/or JSON
+
+    Files are parsed by a pool of workers and rows are written as results
+    come in, in input order or in completion order. When save_to is given,
+    uncompressed bytes are written there, inside it when it is a directory.
+    Files with identical SHA-1 are written once when dedupe is set. Returns
+    the number of exported files.
+    """
+    seen = set()
+    keywords = tuple(keywords)
+    results = iter_pool(
+        _process_file,
+        ((filepath, keywords, dt_format, save_to) for filepath in filepaths),
+        workers,
+        ordered,
+    )
+    with RowWriter(
+        PREFETCH_FIELDS, csv_filepath, json_filepath
+    ) as writer, RowWriter(TIMELINE_FIELDS, timeline_filepath) as timeline:
+        for digest, row, events in results:
+            if dedupe and digest:
+                if digest in seen:
+                    continue
+                seen.add(digest)
+            writer.write(row)
+            for event in events:
+                timeline.write(event)
+        return writer.count
@@ -0,0 +1,530 @@
+"""Registry hive reader [regf]
+"""
+from mmap import mmap, ACCESS_READ
+from bisect import bisect_right
+from struct import Struct, error as StructError
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from .common import ParsingError
+from .regflog import base_block_checksum, replay
+
+REGF_SIGNATURE = b'regf'
+HBIN_SIGNATURE = b'hbin'
+BASE_BLOCK_SIZE = 4096
+HBIN_HEADER_SIZE = 32
+PAGE_SIZE = 4096
+BIG_DATA_SEGMENT_SIZE = 16344
+BIG_DATA_MIN_MINOR_VERSION = 4
+MAX_SUBKEY_LIST_DEPTH = 8
+KEY_COMP_NAME = 0x0020
+VALUE_COMP_NAME = 0x0001
+DATA_RESIDENT = 0x80000000
+REG_NONE = 0
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+REG_DWORD_BIG_ENDIAN = 5
+REG_LINK = 6
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+
+_BASE_BLOCK = Struct('<4sIIQIIIIII')
+_HBIN_HEADER = Struct('<4sII')
+_NK = Struct('<2sHQIIIIIIIIIIIIIIIHH')
+_VK = Struct('<2sHIIIH2x')
+_LIST_HEADER = Struct('<2sH')
+_DB = Struct('<2sHI')
+_I32 = Struct('<i')
+_U32 = Struct('<I')
+_U32_BE = Struct('>I')
+_U64 = Struct('<Q')
+
+
+def subkey_hash(name: str) -> int:
+    """Hash of a key name as stored in lh subkey lists"""
+    value = 0
+    for char in name.upper():
+        value = (value * 37 + ord(char)) & 0xFFFFFFFF
+    return value
+
+
+def _text(data) -> str:
+    data = bytes(data)
+    if len(data) % 2:
+        data = data[:-1]
+    return data.decode('utf-16-le', errors='replace').split('\x00', 1)[0]
+
+
+class RegistryValue:
+    """Registry value, data is read on first access"""
+
+    def __init__(self, hive: 'RegistryHive', offset: int):
+        self._hive = hive
+        cell = hive.cell(offset)
+        try:
+            (
+                signature,
+                name_size,
+                self._size,
+                self._data_offset,
+                self.type,
+                flags,
+            ) = _VK.unpack_from(cell)
+        except StructError as exc:
+            raise ParsingError(f"truncated value cell: {offset:#x}") from exc
+        if signature != b'vk':
+            raise ParsingError(f"invalid value cell: {offset:#x}")
+        name = cell[_VK.size : _VK.size + name_size]
+        if flags & VALUE_COMP_NAME:
+            self.name = bytes(name).decode('latin-1')
+        else:
+            self.name = bytes(name).decode('utf-16-le', errors='replace')
+
+    @property
+    def data(self) -> bytes:
+        """Raw value data"""
+        size = self._size
+        if size & DATA_RESIDENT:
+            size &= ~DATA_RESIDENT
+            return _U32.pack(self._data_offset)[: min(size, 4)]
+        if not size:
+            return b''
+        hive = self._hive
+        if (
+            size > BIG_DATA_SEGMENT_SIZE
+            and hive.minor_version >= BIG_DATA_MIN_MINOR_VERSION
+        ):
+            return hive.big_data(self._data_offset, size)
+        return bytes(hive.cell(self._data_offset)[:size])
+
+    @property
+    def value(self):
+        """Data decoded according to value type"""
+        data = self.data
+        if self.type in (REG_SZ, REG_EXPAND_SZ, REG_LINK):
+            return _text(data)
+        if self.type == REG_MULTI_SZ:
+            data = bytes(data[: len(data) & ~1])
+            text = data.decode('utf-16-le', errors='replace')
+            return [item for item in text.split('\x00') if item]
+        if self.type == REG_DWORD and len(data) >= 4:
+            return _U32.unpack_from(data)[0]
+        if self.type == REG_DWORD_BIG_ENDIAN and len(data) >= 4:
+            return _U32_BE.unpack_from(data)[0]
+        if self.type == REG_QWORD and len(data) >= 8:
+            return _U64.unpack_from(data)[0]
+        return data
+
+
+class RegistryKey:
+    """Registry key, subkeys and values are resolved on demand"""
+
+    def __init__(self, hive: 'RegistryHive', offset: int, parent_path: str):
+        self._hive = hive
+        self.offset = offset
+        cell = hive.cell(offset)
+        try:
+            (
+                signature,
+                flags,
+                self.last_written,
+                _,
+                _,
+                self.subkey_count,
+                _,
+                self._subkeys_offset,
+                _,
+                self.value_count,
+                self._values_offset,
+                _,
+                _,
+                _,
+                _,
+                _,
+                _,
+                _,
+                name_size,
+                _,
+            ) = _NK.unpack_from(cell)
+        except StructError as exc:
+            raise ParsingError(f"truncated key cell: {offset:#x}") from exc
+        if signature != b'nk':
+            raise ParsingError(f"invalid key cell: {offset:#x}")
+        name = cell[_NK.size : _NK.size + name_size]
+        if flags & KEY_COMP_NAME:
+            self.name = bytes(name).decode('latin-1')
+        else:
+            self.name = bytes(name).decode('utf-16-le', errors='replace')
+        self.path = f'{parent_path}\\{self.name}' if parent_path else self.name
+
+    def _iter_subkey_offsets(
+        self, name: Optional[str] = None
+    ) -> Iterator[int]:
+        if not self.subkey_count:
+            return
+        hint = None
+        if name is not None:
+            prefix = name[:4].upper() if name.isascii() else None
+            hint = (subkey_hash(name), prefix)
+        yield from self._hive.iter_subkey_list(self._subkeys_offset, hint)
+
+    def subkeys(self) -> Iterator['RegistryKey']:
+        """Yield subkeys in storage order"""
+        for offset in self._iter_subkey_offsets():
+            yield RegistryKey(self._hive, offset, self.path)
+
+    def subkey(self, name: str) -> Optional['RegistryKey']:
+        """Subkey by case insensitive name, None when missing
+
+        Hashes and hints of subkey lists are checked before any key cell is
+        decoded so only matching candidates are read
+        """
+        expected = name.upper()
+        for offset in self._iter_subkey_offsets(name):
+            key = RegistryKey(self._hive, offset, self.path)
+            if key.name.upper() == expected:
+                return key
+        return None
+
+    def find(self, path: str) -> Optional['RegistryKey']:
+        """Descendant key by backslash separated relative path"""
+        key = self
+        for name in path.split('\\'):
+            if not name:
+                continue
+            key = key.subkey(name)
+            if key is None:
+                return None
+        return key
+
+    def values(self) -> Iterator[RegistryValue]:
+        """Yield values in storage order"""
+        if not self.value_count:
+            return
+        cell = self._hive.cell(self._values_offset)
+        count = min(self.value_count, len(cell) // 4)
+        for index in range(count):
+            yield RegistryValue(
+                self._hive, _U32.unpack_from(cell, index * 4)[0]
+            )
+
+    def value(self, name: str) -> Optional[RegistryValue]:
+        """Value by case insensitive name, '' is the default value"""
+        expected = name.upper()
+        for value in self.values():
+            if value.name.upper() == expected:
+                return value
+        return None
+
+    def get(self, name: str, default=None):
+        """Decoded data of a value, default when missing"""
+        value = self.value(name)
+        return default if value is None else value.value
+
+
+@dataclass
+class HiveRecovery:
+    """Pages of a hive patched by its transaction logs
+
+    Small enough to be sent to worker processes which then open the hive
+    without replaying the logs again
+    """
+
+    pages: Dict[int, bytes]
+    sequence: int
+    hbins_size: int
+
+
+class RegistryHive:
+    """Memory-mapped registry hive
+
+    Hive bins are indexed on first touch, as far as the furthest cell read
+    so far, and cells are decoded only when a key or value needs them.
+
+    When the hive is dirty, the transaction logs given are replayed into a
+    copy-on-write overlay of the pages they touch, the mapping itself is
+    never written nor copied. A recovery obtained from a previous replay
+    can be given instead of logs.
+    """
+
+    def __init__(
+        self,
+        filepath: Path,
+        logs: Iterable[Path] = (),
+        recovery: Optional[HiveRecovery] = None,
+    ):
+        self._filepath = Path(filepath)
+        self._logs = list(logs)
+        self._recovery = recovery
+        self._fobj = None
+        self._mmap = None
+        self._view = None
+        self._pages = {}
+        self.recovered = False
+        self._hbin_starts = []
+        self._hbin_ends = []
+        self._indexed = BASE_BLOCK_SIZE
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        """Map file and decode base block"""
+        self._fobj = self._filepath.open('rb')
+        try:
+            self._mmap = mmap(self._fobj.fileno(), 0, access=ACCESS_READ)
+        except ValueError as exc:
+            self.close()
+            raise ParsingError("empty registry hive") from exc
+        self._view = memoryview(self._mmap)
+        if len(self._mmap) < BASE_BLOCK_SIZE:
+            self.close()
+            raise ParsingError("truncated registry hive base block")
+        self._base_block = bytes(self._view[:512])
+        (
+            signature,
+            self.primary_sequence,
+            self.secondary_sequence,
+            self.last_written,
+            self.major_version,
+            self.minor_version,
+            _,
+            _,
+            self.root_offset,
+            self.hbins_size,
+        ) = _BASE_BLOCK.unpack_from(self._base_block)
+        if signature != REGF_SIGNATURE:
+            self.close()
+            raise ParsingError("invalid registry hive signature")
+        if self._recovery is not None:
+            self._apply(self._recovery)
+        elif self._logs and self.is_dirty:
+            self._recover()
+        size = len(self._mmap)
+        if self._pages:
+            size = max(size, (max(self._pages) + 1) * PAGE_SIZE)
+        self._hbins_end = min(BASE_BLOCK_SIZE + self.hbins_size, size)
+
+    def _patch(self, offset: int, data: memoryview):
+        position = BASE_BLOCK_SIZE + offset
+        while data:
+            page, start = divmod(position, PAGE_SIZE)
+            buffer = self._pages.get(page)
+            if buffer is None:
+                buffer = bytearray(
+                    self._view[page * PAGE_SIZE : (page + 1) * PAGE_SIZE]
+                )
+                buffer.extend(bytes(PAGE_SIZE - len(buffer)))
+                self._pages[page] = buffer
+            length = min(PAGE_SIZE - start, len(data))
+            buffer[start : start + length] = data[:length]
+            data = data[length:]
+            position += length
+
+    def _recover(self):
+        recovered = replay(self._logs, self.secondary_sequence, self._patch)
+        if recovered is None:
+            return
+        sequence, self.hbins_size = recovered
+        self.primary_sequence = self.secondary_sequence = sequence
+        self.recovered = True
+
+    def _apply(self, recovery: HiveRecovery):
+        self._pages = dict(recovery.pages)
+        self.hbins_size = recovery.hbins_size
+        self.primary_sequence = self.secondary_sequence = recovery.sequence
+        self.recovered = True
+
+    @property
+    def recovery(self) -> Optional[HiveRecovery]:
+        """Pages patched by the logs replayed, None when none was"""
+        if not self.recovered:
+            return None
+        return HiveRecovery(
+            {page: bytes(buffer) for page, buffer in self._pages.items()},
+            self.primary_sequence,
+            self.hbins_size,
+        )
+
+    def close(self):
+        """Unmap file, views handed out must not be used afterwards"""
+        if self._view is not None:
+            try:
+                self._view.release()
+                self._mmap.close()
+            except BufferError:
+                pass
+        self._view = None
+        self._mmap = None
+        self._pages = {}
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+
+    @property
+    def is_dirty(self) -> bool:
+        """Whether the hive was not cleanly written back nor recovered"""
+        if self.recovered:
+            return False
+        return (
+            self.primary_sequence != self.secondary_sequence
+            or base_block_checksum(self._base_block)
+            != _U32.unpack_from(self._base_block, 508)[0]
+        )
+
+    def _read(self, position: int, size: int):
+        """Bytes at position, patched pages take precedence over the file"""
+        end = position + size
+        pages = self._pages
+        first, last = position // PAGE_SIZE, (end - 1) // PAGE_SIZE
+        if not pages or not any(
+            page in pages for page in range(first, last + 1)
+        ):
+            if end > len(self._view):
+                raise ParsingError(f"read beyond end of hive: {end:#x}")
+            return self._view[position:end]
+        parts = []
+        while position < end:
+            page, start = divmod(position, PAGE_SIZE)
+            length = min(PAGE_SIZE - start, end - position)
+            buffer = pages.get(page)
+            if buffer is not None:
+                parts.append(buffer[start : start + length])
+            elif position + length <= len(self._view):
+                parts.append(self._view[position : position + length])
+            else:
+                raise ParsingError(f"read beyond end of hive: {end:#x}")
+            position += length
+        return b''.join(parts)
+
+    def _hbin(self, position: int) -> Tuple[int, int]:
+        while position >= self._indexed and self._indexed < self._hbins_end:
+            try:
+                signature, _, size = _HBIN_HEADER.unpack_from(
+                    self._read(self._indexed, _HBIN_HEADER.size)
+                )
+            except StructError as exc:
+                raise ParsingError("truncated hive bin header") from exc
+            if signature != HBIN_SIGNATURE or size < HBIN_HEADER_SIZE:
+                raise ParsingError(f"invalid hive bin: {self._indexed:#x}")
+            self._hbin_starts.append(self._indexed)
+            self._indexed = min(self._indexed + size, self._hbins_end)
+            self._hbin_ends.append(self._indexed)
+        index = bisect_right(self._hbin_starts, position) - 1
+        if index < 0 or position >= self._hbin_ends[index]:
+            raise ParsingError(f"offset outside hive bins: {position:#x}")
+        return self._hbin_starts[index], self._hbin_ends[index]
+
+    def cell(self, offset: int):
+        """Cell data by offset relative to the first hive bin
+
+        A view on the mapping unless the cell spans a patched page
+        """
+        position = BASE_BLOCK_SIZE + offset
+        start, end = self._hbin(position)
+        if position < start + HBIN_HEADER_SIZE or position + 4 > end:
+            raise ParsingError(f"cell outside its hive bin: {offset:#x}")
+        size = abs(_I32.unpack_from(self._read(position, 4))[0])
+        if size < 4 or position + size > end:
+            raise ParsingError(f"invalid cell size: {offset:#x}")
+        return self._read(position + 4, size - 4)
+
+    def big_data(self, offset: int, size: int) -> bytes:
+        """Data of a value stored as db segments"""
+        try:
+            signature, count, segments = _DB.unpack_from(self.cell(offset))
+        except StructError as exc:
+            raise ParsingError(
+                f"truncated big data cell: {offset:#x}"
+            ) from exc
+        if signature != b'db':
+            raise ParsingError(f"invalid big data cell: {offset:#x}")
+        cell = self.cell(segments)
+        parts = []
+        remaining = size
+        for index in range(min(count, len(cell) // 4)):
+            if remaining <= 0:
+                break
+            segment = self.cell(_U32.unpack_from(cell, index * 4)[0])
+            part = segment[: min(remaining, BIG_DATA_SEGMENT_SIZE)]
+            parts.append(part)
+            remaining -= len(part)
+        return b''.join(parts)
+
+    def iter_subkey_list(
+        self,
+        offset: int,
+        hint: Optional[Tuple[int, str]] = None,
+        depth: int = 0,
+    ) -> Iterator[int]:
+        """Yield key cell offsets of a lf, lh, li or ri subkey list
+
+        When hint is a (name hash, uppercase ASCII name prefix) pair, lh and
+        lf elements which cannot match that name are skipped
+        """
+        if depth > MAX_SUBKEY_LIST_DEPTH:
+            raise ParsingError("subkey list nesting too deep")
+        cell = self.cell(offset)
+        try:
+            signature, count = _LIST_HEADER.unpack_from(cell)
+        except StructError as exc:
+            raise ParsingError(f"truncated subkey list: {offset:#x}") from exc
+        if signature in (b'lf', b'lh'):
+            count = min(count, (len(cell) - 4) // 8)
+            for index in range(count):
+                position = 4 + index * 8
+                element = _U32.unpack_from(cell, position)[0]
+                if hint is not None:
+                    if signature == b'lh':
+                        if _U32.unpack_from(cell, position + 4)[0] != hint[0]:
+                            continue
+                    elif hint[1] is not None:
+                        prefix = bytes(cell[position + 4 : position + 8])
+                        prefix = prefix.rstrip(b'\x00').decode('latin-1')
+                        if not hint[1].startswith(prefix.upper()):
+                            continue
+                yield element
+        elif signature in (b'li', b'ri'):
+            count = min(count, (len(cell) - 4) // 4)
+            for index in range(count):
+                element = _U32.unpack_from(cell, 4 + index * 4)[0]
+                if signature == b'li':
+                    yield element
+                else:
+                    yield from self.iter_subkey_list(element, hint, depth + 1)
+        else:
+            raise ParsingError(f"invalid subkey list: {offset:#x}")
+
+    @property
+    def root(self) -> RegistryKey:
+        """Root key"""
+        return RegistryKey(self, self.root_offset, '')
+
+    def key(self, path: str) -> Optional[RegistryKey]:
+        """Key by backslash separated path relative to the root key"""
+        return self.root.find(path)
+
+
+def recover(
+    filepath: Path, logs: Optional[Iterable[Path]]
+) -> Optional[HiveRecovery]:
+    """Replay transaction logs of a hive once for every reader
+
+    None means the hive is opened as is: it is clean, or logs is None and
+    a dirty hive is parsed as is. Raises ParsingError when the hive is
+    dirty and no log applies to it.
+    """
+    if logs is None:
+        return None
+    with RegistryHive(filepath, logs) as hive:
+        if hive.is_dirty:
+            raise ParsingError(
+                "dirty hive and no transaction log applies to it"
+            )
+        return hive.recovery
@@ -0,0 +1,256 @@
+"""Registry transaction log reader [regf]
+"""
+import os
+from mmap import mmap, ACCESS_READ
+from contextlib import ExitStack
+from struct import Struct, error as StructError
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from .common import ParsingError
+
+REGF_SIGNATURE = b'regf'
+LOG_ENTRY_SIGNATURE = b'HvLE'
+DIRTY_VECTOR_SIGNATURE = b'DIRT'
+LOG_BASE_BLOCK_SIZE = 512
+SECTOR_SIZE = 512
+FILE_TYPE_LOG_NEW = 6
+LOG_SUFFIXES = ('.log1', '.log2', '.log')
+MARVIN32_SEED = 0x82EF4D887A4E55C5
+
+_BASE_BLOCK = Struct('<4sIIQIIII4xI')
+_LOG_ENTRY = Struct('<4sIIIIIQQ')
+_DIRTY_PAGE = Struct('<II')
+_U32 = Struct('<I')
+
+
+def _rotl(value: int, count: int) -> int:
+    return ((value << count) | (value >> (32 - count))) & 0xFFFFFFFF
+
+
+def marvin32(data, seed: int = MARVIN32_SEED) -> int:
+    """Marvin32 hash protecting log entries"""
+    low, high = seed & 0xFFFFFFFF, seed >> 32
+    data = bytes(data)
+    tail = len(data) & 3
+    values = [value for (value,) in _U32.iter_unpack(data[: len(data) - tail])]
+    values.append(int.from_bytes(data[len(data) - tail :] + b'\x80', 'little'))
+    values.append(0)
+    for value in values:
+        low = (low + value) & 0xFFFFFFFF
+        high ^= low
+        low = (_rotl(low, 20) + high) & 0xFFFFFFFF
+        high = _rotl(high, 9) ^ low
+        low = (_rotl(low, 27) + high) & 0xFFFFFFFF
+        high = _rotl(high, 19)
+    return (high << 32) | low
+
+
+def base_block_checksum(data) -> int:
+    """XOR-32 checksum of a base block as computed by Windows"""
+    value = 0
+    for (dword,) in _U32.iter_unpack(bytes(data[:508])):
+        value ^= dword
+    if value == 0xFFFFFFFF:
+        return 0xFFFFFFFE
+    return value or 1
+
+
+@dataclass
+class LogBaseBlock:
+    """Base block of a transaction log file"""
+
+    primary_sequence: int
+    secondary_sequence: int
+    file_type: int
+    hbins_size: int
+
+
+@dataclass
+class LogEntry:
+    """New format log entry, pages are views on the log mapping"""
+
+    sequence: int
+    hbins_size: int
+    pages: List[Tuple[int, memoryview]]
+
+
+def decode_base_block(buffer) -> Optional[LogBaseBlock]:
+    """Decode log base block, None when its signature or checksum is bad"""
+    try:
+        (
+            signature,
+            primary_sequence,
+            secondary_sequence,
+            _,
+            _,
+            _,
+            file_type,
+            _,
+            hbins_size,
+        ) = _BASE_BLOCK.unpack_from(buffer)
+        checksum = _U32.unpack_from(buffer, 508)[0]
+    except StructError:
+        return None
+    if signature != REGF_SIGNATURE:
+        return None
+    if checksum != base_block_checksum(buffer[:LOG_BASE_BLOCK_SIZE]):
+        return None
+    return LogBaseBlock(
+        primary_sequence, secondary_sequence, file_type, hbins_size
+    )
+
+
+def iter_log_entries(view: memoryview) -> Iterator[LogEntry]:
+    """Yield valid log entries of a new format log, in file order
+
+    Iteration stops at the first entry whose signature, size or hashes are
+    invalid, or whose sequence number does not follow the previous one
+    """
+    offset = LOG_BASE_BLOCK_SIZE
+    expected = None
+    while offset + _LOG_ENTRY.size <= len(view):
+        (
+            signature,
+            size,
+            _,
+            sequence,
+            hbins_size,
+            count,
+            hash_1,
+            hash_2,
+        ) = _LOG_ENTRY.unpack_from(view, offset)
+        if (
+            signature != LOG_ENTRY_SIGNATURE
+            or size < _LOG_ENTRY.size
+            or size % SECTOR_SIZE
+            or offset + size > len(view)
+            or (expected is not None and sequence != expected)
+        ):
+            return
+        entry = view[offset : offset + size]
+        if marvin32(entry[:32]) != hash_2 or marvin32(entry[40:]) != hash_1:
+            return
+        pages = []
+        data = _LOG_ENTRY.size + count * _DIRTY_PAGE.size
+        for index in range(count):
+            page_offset, page_size = _DIRTY_PAGE.unpack_from(
+                entry, _LOG_ENTRY.size + index * _DIRTY_PAGE.size
+            )
+            if data + page_size > size:
+                return
+            pages.append((page_offset, entry[data : data + page_size]))
+            data += page_size
+        yield LogEntry(sequence, hbins_size, pages)
+        expected = sequence + 1
+        offset += size
+
+
+def iter_dirty_sectors(
+    view: memoryview, hbins_size: int
+) -> Iterator[Tuple[int, memoryview]]:
+    """Yield (hive bins offset, sector) pairs of an old format log"""
+    offset = LOG_BASE_BLOCK_SIZE
+    if bytes(view[offset : offset + 4]) != DIRTY_VECTOR_SIGNATURE:
+        raise ParsingError("invalid transaction log dirty vector")
+    sectors = hbins_size // SECTOR_SIZE
+    bitmap = view[offset + 4 : offset + 4 + (sectors + 7) // 8]
+    data = offset + 4 + len(bitmap)
+    data += -data % SECTOR_SIZE
+    for index in range(sectors):
+        if not bitmap[index >> 3] & (1 << (index & 7)):
+            continue
+        if data + SECTOR_SIZE > len(view):
+            raise ParsingError("truncated transaction log")
+        yield index * SECTOR_SIZE, view[data : data + SECTOR_SIZE]
+        data += SECTOR_SIZE
+
+
+def transaction_logs(filepath: Path) -> List[Path]:
+    """Transaction logs stored next to a hive, .LOG1 and .LOG2 first"""
+    filepath = Path(filepath)
+    names = {
+        f'{filepath.name.lower()}{suffix}': rank
+        for rank, suffix in enumerate(LOG_SUFFIXES)
+    }
+    logs = []
+    with os.scandir(filepath.parent) as entries:
+        for entry in entries:
+            rank = names.get(entry.name.lower())
+            if rank is not None and entry.is_file():
+                logs.append((rank, Path(entry.path)))
+    return [path for _, path in sorted(logs)]
+
+
+def _map(stack: ExitStack, filepath: Path) -> Optional[memoryview]:
+    fobj = stack.enter_context(Path(filepath).open('rb'))
+    try:
+        buffer = mmap(fobj.fileno(), 0, access=ACCESS_READ)
+    except ValueError:
+        return None
+    view = memoryview(buffer)
+
+    def unmap():
+        try:
+            view.release()
+            buffer.close()
+        except BufferError:
+            pass
+
+    stack.callback(unmap)
+    return view
+
+
+def replay(
+    filepaths: Iterable[Path],
+    secondary_sequence: int,
+    apply: Callable[[int, memoryview], None],
+) -> Optional[Tuple[int, int]]:
+    """Replay transaction logs through apply(hive bins offset, data)
+
+    New format entries of every log are applied in sequence order from the
+    hive secondary sequence number on, old format logs are applied whole,
+    the most recent one only. Views passed to apply are only valid during
+    the call. Returns the sequence number and hive bins size the hive is
+    recovered to, None when no log applies.
+    """
+    with ExitStack() as stack:
+        entries = {}
+        legacy = None
+        for filepath in filepaths:
+            view = _map(stack, filepath)
+            if view is None or len(view) < LOG_BASE_BLOCK_SIZE:
+                continue
+            base_block = decode_base_block(view)
+            if base_block is None:
+                continue
+            if base_block.file_type == FILE_TYPE_LOG_NEW:
+                for entry in iter_log_entries(view):
+                    if entry.sequence >= secondary_sequence:
+                        entries.setdefault(entry.sequence, entry)
+            elif (
+                base_block.primary_sequence == base_block.secondary_sequence
+                and (
+                    legacy is None
+                    or base_block.secondary_sequence
+                    > legacy[0].secondary_sequence
+                )
+            ):
+                legacy = (base_block, view)
+        if entries:
+            sequence = min(entries)
+            last = None
+            while sequence in entries:
+                last = entries[sequence]
+                for offset, data in last.pages:
+                    apply(offset, data)
+                sequence += 1
+            return last.sequence + 1, last.hbins_size
+        if legacy is not None:
+            base_block, view = legacy
+            for offset, data in iter_dirty_sectors(
+                view, base_block.hbins_size
+            ):
+                apply(offset, data)
+            return base_block.secondary_sequence, base_block.hbins_size
+    return None
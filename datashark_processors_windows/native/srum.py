@@ -0,0 +1,316 @@
+"""Native SRUM (SRUDB.dat) parser
+"""
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .common import (
+    DEFAULT_DT_FORMAT,
+    ParsingError,
+    RowWriter,
+    iter_files,
+    iter_pool,
+)
+from .ese import EseDatabase, Record, Table, format_value, long_key
+from .regf import RegistryHive, recover
+from .regflog import transaction_logs
+
+ID_MAP_TABLE = 'SruDbIdMapTable'
+ID_TYPE_SID = 3
+AUTO_INC_COLUMN = 'AutoIncId'
+MAX_AUTO_INC = 0x7FFFFFFF
+PROVIDERS = {
+    '{973F5D5C-1D90-4944-BE8E-24B94231A174}': 'NetworkUsages',
+    '{D10CA2FE-6FCF-4F6D-848E-B2E99266FA89}': 'AppResourceUseInfo',
+    '{D10CA2FE-6FCF-4F6D-848E-B2E99266FA86}': 'PushNotifications',
+    '{DD6636C4-8929-4683-974E-22C046A43763}': 'NetworkConnections',
+    '{FEE4E14F-02A9-4550-B5CE-5FA2DA202E37}': 'EnergyUsage',
+    '{FEE4E14F-02A9-4550-B5CE-5FA2DA202E37}LT': 'EnergyUsageLongTerm',
+    '{5C8CF1C7-7257-4F13-B223-970EF5939312}': 'AppTimelineProvider',
+    '{7ACBBAA3-D029-4BE4-9A7A-0885927F1D8F}': 'vfuprov',
+    '{DA73FB89-2BEA-4DDC-86B8-6E048C6DA477}': 'EnergyEstimator',
+    '{B6D82AF1-F780-4E17-8077-6CB9AD8A6FC4}': 'TaggedEnergy',
+}
+# provider columns holding a FILETIME rather than a count or a duration
+FILETIME_COLUMNS = ('ConnectStartTime', 'EndTime', 'EventTimestamp')
+# IANA ifType stored in the upper 16 bits of interface LUIDs
+INTERFACE_TYPES = {
+    1: 'IF_TYPE_OTHER',
+    6: 'IF_TYPE_ETHERNET_CSMACD',
+    23: 'IF_TYPE_PPP',
+    24: 'IF_TYPE_SOFTWARE_LOOPBACK',
+    71: 'IF_TYPE_IEEE80211',
+    131: 'IF_TYPE_TUNNEL',
+    144: 'IF_TYPE_IEEE1394',
+    243: 'IF_TYPE_WWANPP',
+    244: 'IF_TYPE_WWANPP2',
+}
+WLAN_INTERFACES_KEY = 'Microsoft\\WlanSvc\\Interfaces'
+PROFILE_LIST_KEY = 'Microsoft\\Windows NT\\CurrentVersion\\ProfileList'
+# resolved columns inserted after the column they are resolved from
+RESOLVED_FIELDS = {
+    'AppId': ['ExeInfo'],
+    'UserId': ['Sid', 'UserName'],
+    'InterfaceLuid': ['InterfaceType'],
+    'L2ProfileId': ['ProfileName'],
+}
+
+
+def format_sid(data: bytes) -> str:
+    """String representation of a binary SID"""
+    if len(data) < 8:
+        return data.hex()
+    count = data[1]
+    authority = int.from_bytes(data[2:8], 'big')
+    parts = [
+        str(int.from_bytes(data[offset : offset + 4], 'little'))
+        for offset in range(8, min(8 + 4 * count, len(data) - 3), 4)
+    ]
+    return '-'.join(['S', str(data[0]), str(authority)] + parts)
+
+
+def read_id_map(database: EseDatabase) -> Dict[int, str]:
+    """Application names and user SIDs of SruDbIdMapTable by index"""
+    table = database.table(ID_MAP_TABLE)
+    if table is None:
+        return {}
+    id_map = {}
+    for record in table:
+        index = record['IdIndex']
+        blob = record['IdBlob']
+        if index is None or blob is None:
+            continue
+        if record['IdType'] == ID_TYPE_SID:
+            id_map[index] = format_sid(blob)
+            continue
+        name = blob.decode('utf-16-le', errors='replace')
+        id_map[index] = name.rstrip('\0')
+    return id_map
+
+
+def _channel_hints_name(data) -> Optional[str]:
+    if not isinstance(data, bytes) or len(data) < 4:
+        return None
+    size = int.from_bytes(data[:4], 'little')
+    return data[4 : 4 + size].decode('latin-1')
+
+
+def read_software(
+    filepath: Path, replay_logs: bool = True
+) -> Tuple[Dict[int, str], Dict[str, str]]:
+    """WLAN profile names by index and user names by SID of SOFTWARE
+
+    Transaction logs found next to the hive are replayed when it is dirty,
+    it is only parsed as is when replay_logs is false
+    """
+    profiles = {}
+    users = {}
+    logs = transaction_logs(filepath) if replay_logs else None
+    with RegistryHive(filepath, recovery=recover(filepath, logs)) as hive:
+        interfaces = hive.key(WLAN_INTERFACES_KEY)
+        for interface in interfaces.subkeys() if interfaces else ():
+            container = interface.subkey('Profiles')
+            for profile in container.subkeys() if container else ():
+                index = profile.get('ProfileIndex')
+                metadata = profile.subkey('MetaData')
+                if index is None or metadata is None:
+                    continue
+                name = _channel_hints_name(metadata.get('Channel Hints'))
+                if name:
+                    profiles[index] = name
+        profile_list = hive.key(PROFILE_LIST_KEY)
+        for key in profile_list.subkeys() if profile_list else ():
+            path = key.get('ProfileImagePath')
+            if isinstance(path, str) and path:
+                users[key.name] = path.rstrip('\\').rsplit('\\', 1)[-1]
+    return profiles, users
+
+
+def find_files(directory: Path) -> Tuple[Optional[Path], Optional[Path]]:
+    """First SRUDB.dat and SOFTWARE hive found under directory"""
+    database, software = None, None
+    for filepath in iter_files(directory):
+        name = filepath.name.lower()
+        if name == 'srudb.dat' and database is None:
+            database = filepath
+        elif name == 'software' and software is None:
+            software = filepath
+        if database and software:
+            break
+    return database, software
+
+
+def provider_tables(database: EseDatabase) -> List[str]:
+    """Names of the provider tables of a SRUM database"""
+    return [name for name in database.tables if name.startswith('{')]
+
+
+def output_name(table_name: str) -> str:
+    """CSV file name of a provider table"""
+    label = PROVIDERS.get(table_name.upper(), table_name.strip('{}'))
+    return f'SrumECmd_{label}_Output.csv'
+
+
+def table_fields(table: Table) -> List[str]:
+    """Columns of a provider table followed by their resolved columns"""
+    fields = []
+    for name in table.columns:
+        fields.append(name)
+        fields.extend(RESOLVED_FIELDS.get(name, ()))
+    return fields
+
+
+def record_row(
+    record: Record,
+    id_map: Dict[int, str],
+    profiles: Dict[int, str],
+    users: Dict[str, str],
+    dt_format: str,
+) -> Dict[str, object]:
+    """Provider record as a row, ids are resolved and timestamps formatted"""
+    row = {}
+    for name, column in record.table.columns.items():
+        row[name] = format_value(
+            column, record.value(column), dt_format, FILETIME_COLUMNS
+        )
+    if 'AppId' in row:
+        row['ExeInfo'] = id_map.get(row['AppId'], '')
+    if 'UserId' in row:
+        row['Sid'] = id_map.get(row['UserId'], '')
+        row['UserName'] = users.get(row['Sid'], '')
+    if isinstance(row.get('InterfaceLuid'), int):
+        row['InterfaceType'] = INTERFACE_TYPES.get(
+            row['InterfaceLuid'] >> 48, ''
+        )
+    if 'L2ProfileId' in row:
+        row['ProfileName'] = profiles.get(row['L2ProfileId'], '')
+    return row
+
+
+def iter_records(
+    table: Table, watermark: Optional[int] = None
+) -> Iterator[Record]:
+    """Yield records of a provider table with an AutoIncId above watermark
+
+    When records are keyed on AutoIncId, the cursor seeks the B-tree
+    directly to the first newer record, otherwise the table is scanned
+    """
+    column = table.columns.get(AUTO_INC_COLUMN)
+    if watermark is None or column is None:
+        yield from table
+        return
+    if watermark >= MAX_AUTO_INC:
+        return
+    key = b''
+    first = next(iter(table), None)
+    if first is not None and first.key == long_key(first.value(column)):
+        key = long_key(watermark + 1)
+    for record in table.records(key):
+        value = record.value(column)
+        if value is not None and value > watermark:
+            yield record
+
+
+def load_checkpoint(filepath: Optional[Path]) -> dict:
+    """Load AutoIncId watermarks by database and table, empty if missing"""
+    if not filepath or not Path(filepath).is_file():
+        return {}
+    try:
+        return json.loads(Path(filepath).read_text(encoding='utf-8'))
+    except ValueError as exc:
+        raise ParsingError(f"invalid checkpoint {filepath}: {exc}") from exc
+
+
+def save_checkpoint(filepath: Path, checkpoint: dict):
+    """Persist AutoIncId watermarks by database and table"""
+    Path(filepath).write_text(json.dumps(checkpoint), encoding='utf-8')
+
+
+def _process_table(
+    filepath: Path,
+    table_name: str,
+    directory: Path,
+    id_map: Dict[int, str],
+    profiles: Dict[int, str],
+    users: Dict[str, str],
+    dt_format: str,
+    watermark: Optional[int] = None,
+) -> Tuple[str, int, Optional[int]]:
+    """Stream the records of a provider table to its own CSV
+
+    Returns the table name, the number of rows written and the highest
+    AutoIncId exported so far
+    """
+    with EseDatabase(filepath) as database:
+        table = database.table(table_name)
+        csv_filepath = directory / output_name(table_name)
+        with RowWriter(table_fields(table), csv_filepath) as writer:
+            for record in iter_records(table, watermark):
+                row = record_row(record, id_map, profiles, users, dt_format)
+                writer.write(row)
+                value = row.get(AUTO_INC_COLUMN)
+                if isinstance(value, int) and (
+                    watermark is None or value > watermark
+                ):
+                    watermark = value
+            return table_name, writer.count, watermark
+
+
+def export(
+    filepath: Path,
+    directory: Path,
+    software: Optional[Path] = None,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    replay_logs: bool = True,
+    checkpoint_filepath: Optional[Path] = None,
+    workers: int = 0,
+) -> Dict[str, int]:
+    """Export SRUM provider tables to one CSV each under directory
+
+    SruDbIdMapTable and the optional SOFTWARE hive, replaying its logs
+    when dirty, are decoded once up front and handed to workers which
+    extract provider tables concurrently.
+
+    When a checkpoint file is given, only records with an AutoIncId above
+    the highest one exported by previous runs on the same database are
+    exported, and the checkpoint is updated once export completes.
+    Returns the number of rows written per table.
+    """
+    profiles, users = {}, {}
+    if software:
+        profiles, users = read_software(software, replay_logs)
+    with EseDatabase(filepath) as database:
+        id_map = read_id_map(database)
+        tables = provider_tables(database)
+        # a SRUM database is created once per host and keeps its signature
+        host = database.signature.hex()
+    if not tables:
+        return {}
+    checkpoint = load_checkpoint(checkpoint_filepath)
+    watermarks = checkpoint.get(host, {})
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for table_name, count, watermark in iter_pool(
+        _process_table,
+        (
+            (
+                filepath,
+                table_name,
+                Path(directory),
+                id_map,
+                profiles,
+                users,
+                dt_format,
+                watermarks.get(table_name),
+            )
+            for table_name in tables
+        ),
+        min(workers or len(tables), len(tables)),
+        ordered=False,
+    ):
+        counts[table_name] = count
+        if watermark is not None:
+            watermarks[table_name] = watermark
+    if checkpoint_filepath:
+        checkpoint[host] = watermarks
+        save_checkpoint(checkpoint_filepath, checkpoint)
+    return counts
@@ -0,0 +1,174 @@
+"""Bodyfile timeline with external merge sort
+"""
+import csv
+import heapq
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterator, Optional, Tuple
+from .common import (
+    DEFAULT_DT_FORMAT,
+    FILETIME_TICKS_PER_SECOND,
+    FILETIME_UNIX_EPOCH,
+    format_filetime,
+)
+
+SORT_BUFFER_SIZE = 1000000
+MAX_OPEN_RUNS = 64
+TIMELINE_FIELDS = [
+    'Date',
+    'Size',
+    'Type',
+    'Mode',
+    'UID',
+    'GID',
+    'Meta',
+    'File Name',
+]
+# bodyfile time fields index and their mactime letter
+MACB = ((8, 'm'), (7, 'a'), (9, 'c'), (10, 'b'))
+
+
+def _read_run(filepath: Path) -> Iterator[Tuple[int, str]]:
+    with filepath.open('r', encoding='utf-8', newline='\n') as fobj:
+        for line in fobj:
+            key, _, value = line.rstrip('\n').partition('\t')
+            yield int(key), value
+
+
+class ExternalSorter:
+    """Sort (key, value) items with bounded memory
+
+    Items are buffered up to buffer_size then spilled to a sorted run file.
+    Iterating k-way merges runs, merging at most MAX_OPEN_RUNS files at once.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = SORT_BUFFER_SIZE,
+        directory: Optional[Path] = None,
+    ):
+        self._buffer_size = max(buffer_size, 1)
+        self._buffer = []
+        self._runs = []
+        self._run_count = 0
+        self._tmpdir = TemporaryDirectory(
+            prefix='datashark-sort-', dir=directory
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Remove spilled runs"""
+        self._buffer = []
+        self._runs = []
+        self._tmpdir.cleanup()
+
+    def _write_run(self, items) -> Path:
+        filepath = Path(self._tmpdir.name) / f'run-{self._run_count:06d}'
+        self._run_count += 1
+        with filepath.open('w', encoding='utf-8', newline='\n') as fobj:
+            for key, value in items:
+                fobj.write(f'{key}\t{value}\n')
+        return filepath
+
+    def add(self, key: int, value: str):
+        """Add an item, value must not contain newlines"""
+        self._buffer.append((key, value))
+        if len(self._buffer) >= self._buffer_size:
+            self._buffer.sort()
+            self._runs.append(self._write_run(self._buffer))
+            self._buffer = []
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        while len(self._runs) > MAX_OPEN_RUNS:
+            group = self._runs[:MAX_OPEN_RUNS]
+            merged = self._write_run(
+                heapq.merge(*(_read_run(run) for run in group))
+            )
+            for run in group:
+                run.unlink()
+            self._runs = self._runs[MAX_OPEN_RUNS:] + [merged]
+        self._buffer.sort()
+        return heapq.merge(
+            *(_read_run(run) for run in self._runs), iter(self._buffer)
+        )
+
+
+def body_events(line: str) -> Iterator[Tuple[int, str]]:
+    """Split a bodyfile line into (time, 'macb|line') events"""
+    fields = line.split('|')
+    if len(fields) != 11:
+        return
+    times = {}
+    for index, letter in MACB:
+        try:
+            value = int(fields[index])
+        except ValueError:
+            continue
+        if value:
+            times.setdefault(value, []).append(letter)
+    for value, letters in times.items():
+        macb = ''.join(
+            letter if letter in letters else '.' for _, letter in MACB
+        )
+        yield value, f'{macb}|{line}'
+
+
+class TimelineWriter:
+    """Collect bodyfile lines and write a time-ordered mactime-like CSV"""
+
+    def __init__(
+        self,
+        filepath: Path,
+        buffer_size: int = SORT_BUFFER_SIZE,
+        dt_format: str = DEFAULT_DT_FORMAT,
+        lf: bool = False,
+    ):
+        self._filepath = Path(filepath)
+        self._dt_format = dt_format
+        self._lineterminator = '\n' if lf else '\r\n'
+        self._sorter = ExternalSorter(buffer_size, self._filepath.parent)
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        try:
+            if exc_type is None:
+                self._write()
+        finally:
+            self._sorter.close()
+
+    def add(self, line: str):
+        """Add a bodyfile line"""
+        for value, event in body_events(line):
+            self._sorter.add(value, event)
+
+    def _write(self):
+        with self._filepath.open('w', newline='', encoding='utf-8') as fobj:
+            writer = csv.writer(fobj, lineterminator=self._lineterminator)
+            writer.writerow(TIMELINE_FIELDS)
+            for value, event in self._sorter:
+                macb, _, line = event.partition('|')
+                fields = line.split('|')
+                filetime = (
+                    value * FILETIME_TICKS_PER_SECOND + FILETIME_UNIX_EPOCH
+                )
+                writer.writerow(
+                    [
+                        format_filetime(filetime, self._dt_format),
+                        fields[6],
+                        macb,
+                        fields[3],
+                        fields[4],
+                        fields[5],
+                        fields[2],
+                        fields[1],
+                    ]
+                )
+                self.count += 1
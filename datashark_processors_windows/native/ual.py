@@ -0,0 +1,358 @@
+"""Native User Access Logging (UAL) databases parser
+"""
+import shutil
+import tempfile
+from pathlib import Path, PureWindowsPath
+from ipaddress import ip_address
+from datetime import datetime, timedelta
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from .common import (
+    DEFAULT_DT_FORMAT,
+    FILETIME_ORIGIN,
+    RowWriter,
+    format_filetime,
+    filetime_to_datetime,
+    iter_files,
+    iter_pool,
+)
+from .ese import Column, EseDatabase, Record, Table, format_value
+
+SYSTEM_IDENTITY = 'systemidentity.mdb'
+DAY_COLUMN_PREFIX = 'Day'
+DAYS_PER_YEAR = 366
+FILETIME_TICKS_PER_DAY = 864000000000
+# UAL columns holding a FILETIME when not stored as DateTime
+FILETIME_COLUMNS = (
+    'CreationTime',
+    'FirstSeen',
+    'InsertDate',
+    'LastAccess',
+    'LastSeen',
+    'LastSeenActive',
+    'OSLastBootUpTime',
+)
+CLIENT_FIELDS = [
+    'RoleGuid',
+    'RoleDescription',
+    'AuthenticatedUserName',
+    'TotalAccesses',
+    'InsertDate',
+    'LastAccess',
+    'IpAddress',
+    'ClientName',
+    'TenantId',
+    'SourceFile',
+]
+CLIENT_DETAIL_FIELDS = [
+    'RoleGuid',
+    'RoleDescription',
+    'AuthenticatedUserName',
+    'IpAddress',
+    'ClientName',
+    'Year',
+    'DayNumber',
+    'Date',
+    'Count',
+    'SourceFile',
+]
+ROLE_ACCESS_FIELDS = [
+    'RoleGuid',
+    'RoleDescription',
+    'FirstSeen',
+    'LastSeen',
+    'SourceFile',
+]
+DNS_FIELDS = ['LastSeen', 'Address', 'HostName', 'SourceFile']
+CHAINED_DATABASE_FIELDS = ['Year', 'FileName', 'SourceFile']
+ROLE_FIELDS = ['RoleGuid', 'ProductName', 'RoleName', 'SourceFile']
+# fields by output, None when they are the columns of the table
+OUTPUTS = {
+    'SystemIdentInfo': None,
+    'ChainedDbInfo': CHAINED_DATABASE_FIELDS,
+    'RoleInfos': ROLE_FIELDS,
+    'DnsInfo': DNS_FIELDS,
+    'RoleAccesses': ROLE_ACCESS_FIELDS,
+    'Clients': CLIENT_FIELDS,
+    'ClientsDetailed': CLIENT_DETAIL_FIELDS,
+}
+TABLE_OUTPUTS = {
+    'SystemIdentInfo': 'SYSTEM_IDENTITY',
+    'ChainedDbInfo': 'CHAINED_DATABASES',
+    'RoleInfos': 'ROLE_IDS',
+    'DnsInfo': 'DNS',
+}
+
+
+def output_name(output: str) -> str:
+    """CSV file name of an output"""
+    return f'SumECmd_DETAIL_{output}_Output.csv'
+
+
+def find_databases(directory: Path) -> List[Path]:
+    """UAL databases found under directory, SystemIdentity.mdb first"""
+    return sorted(
+        iter_files(directory, ('.mdb',)),
+        key=lambda filepath: (
+            filepath.name.lower() != SYSTEM_IDENTITY,
+            str(filepath),
+        ),
+    )
+
+
+def _address(value) -> str:
+    if isinstance(value, bytes):
+        if len(value) in (4, 16):
+            return str(ip_address(value))
+        return value.hex()
+    return '' if value is None else str(value)
+
+
+def _guid(value) -> str:
+    return '' if value is None else str(value).lower()
+
+
+def _table_rows(
+    table: Optional[Table],
+    source: str,
+    dt_format: str,
+    fields: Optional[List[str]] = None,
+) -> Iterator[Tuple[Record, Dict[str, object]]]:
+    if table is None:
+        return
+    columns = [
+        column
+        for name, column in table.columns.items()
+        if fields is None or name in fields
+    ]
+    for record in table:
+        row = {
+            column.name: format_value(
+                column, record.value(column), dt_format, FILETIME_COLUMNS
+            )
+            for column in columns
+        }
+        row['SourceFile'] = source
+        yield record, row
+
+
+def read_system_identity(
+    filepath: Path,
+) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """Role names by role GUID and years by chained database file name"""
+    roles = {}
+    years = {}
+    with EseDatabase(filepath) as database:
+        table = database.table('ROLE_IDS')
+        for record in table if table else ():
+            roles[_guid(record['RoleGuid'])] = record.get('RoleName', '')
+        table = database.table('CHAINED_DATABASES')
+        for record in table if table else ():
+            filename = record['FileName']
+            if filename and record['Year'] is not None:
+                years[PureWindowsPath(filename).name.lower()] = record['Year']
+    return roles, years
+
+
+def _day_filetime(year: int, day: int) -> int:
+    date = datetime(year, 1, 1) + timedelta(days=day - 1)
+    return (date - FILETIME_ORIGIN).days * FILETIME_TICKS_PER_DAY
+
+
+def day_columns(table: Table) -> List[Tuple[int, Column]]:
+    """(day number, column) of the Day1 to Day366 columns of table
+
+    Names are matched on their number so zero padded ones are found too
+    """
+    days = []
+    for name, column in table.columns.items():
+        number = name[len(DAY_COLUMN_PREFIX) :]
+        if name.startswith(DAY_COLUMN_PREFIX) and number.isdigit():
+            if 1 <= int(number) <= DAYS_PER_YEAR:
+                days.append((int(number), column))
+    return sorted(days, key=lambda item: item[0])
+
+
+def iter_client_days(
+    record: Record,
+    row: Dict[str, object],
+    year: int,
+    dt_format: str,
+    days: Optional[List[Tuple[int, Column]]] = None,
+) -> Iterator[Dict[str, object]]:
+    """Yield a row per day a client accessed a role
+
+    Day columns are decoded one at a time as rows are consumed, days are
+    the day_columns of the record table, computed when not given
+    """
+    if days is None:
+        days = day_columns(record.table)
+    for day, column in days:
+        count = record.value(column)
+        if not count:
+            continue
+        detail = {field: row.get(field, '') for field in CLIENT_DETAIL_FIELDS}
+        detail['Year'] = year
+        detail['DayNumber'] = day
+        detail['Date'] = format_filetime(_day_filetime(year, day), dt_format)
+        detail['Count'] = count
+        yield detail
+
+
+def _client_year(record: Record, year: Optional[int]) -> Optional[int]:
+    if year is not None:
+        return year
+    inserted = filetime_to_datetime(record['InsertDate'] or 0)
+    return inserted.year if inserted else None
+
+
+def iter_database_rows(
+    database: EseDatabase,
+    source: str,
+    roles: Dict[str, str],
+    year: Optional[int],
+    dt_format: str,
+    details: bool = True,
+) -> Iterator[Tuple[str, List[str], Dict[str, object]]]:
+    """Yield (output, fields, row) for the tables of a UAL database
+
+    Role accesses and clients are merged with role names through roles,
+    clients with host names of the DNS table. When details is set, the
+    day level rows of each client follow it.
+    """
+    host_names = {}
+    for output, table_name in TABLE_OUTPUTS.items():
+        table = database.table(table_name)
+        if table is None:
+            continue
+        fields = OUTPUTS[output] or list(table.columns) + ['SourceFile']
+        for record, row in _table_rows(table, source, dt_format, fields):
+            if output == 'DnsInfo':
+                row['Address'] = _address(record['Address'])
+                host_names[row['Address']] = row.get('HostName', '')
+            yield output, fields, row
+    for _, row in _table_rows(
+        database.table('ROLE_ACCESS'), source, dt_format, ROLE_ACCESS_FIELDS
+    ):
+        row['RoleDescription'] = roles.get(_guid(row.get('RoleGuid')), '')
+        yield 'RoleAccesses', ROLE_ACCESS_FIELDS, row
+    clients = database.table('CLIENTS')
+    days = day_columns(clients) if clients is not None else []
+    for record, row in _table_rows(clients, source, dt_format, CLIENT_FIELDS):
+        row['RoleDescription'] = roles.get(_guid(row.get('RoleGuid')), '')
+        row['IpAddress'] = _address(record['Address'])
+        row['ClientName'] = host_names.get(row['IpAddress'], '')
+        yield 'Clients', CLIENT_FIELDS, row
+        client_year = _client_year(record, year) if details else None
+        if client_year is None:
+            continue
+        for detail in iter_client_days(
+            record, row, client_year, dt_format, days
+        ):
+            yield 'ClientsDetailed', CLIENT_DETAIL_FIELDS, detail
+
+
+def _process_database(
+    filepath: Path,
+    directory: Path,
+    index: int,
+    roles: Dict[str, str],
+    years: Dict[str, int],
+    dt_format: str,
+    details: bool,
+) -> Dict[str, Tuple[Path, int]]:
+    """Stream the rows of a UAL database to part files under directory
+
+    Returns the part file and the number of rows written per output
+    """
+    writers = {}
+    with EseDatabase(filepath) as database, ExitStack() as stack:
+        for output, fields, row in iter_database_rows(
+            database,
+            str(filepath),
+            roles,
+            years.get(filepath.name.lower()),
+            dt_format,
+            details,
+        ):
+            if output not in writers:
+                part = directory / f'{index:06d}_{output_name(output)}'
+                writers[output] = (
+                    part,
+                    stack.enter_context(RowWriter(fields, part)),
+                )
+            writers[output][1].write(row)
+    return {
+        output: (part, writer.count)
+        for output, (part, writer) in writers.items()
+    }
+
+
+def _append_part(part: Path, fobj: TextIO, header: bool):
+    with part.open('r', encoding='utf-8', newline='') as part_fobj:
+        first = part_fobj.readline()
+        if header:
+            fobj.write(first)
+        shutil.copyfileobj(part_fobj, fobj)
+    part.unlink()
+
+
+def export(
+    databases: List[Path],
+    csv_directory: Path,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    details: bool = True,
+    workers: int = 0,
+) -> Dict[str, int]:
+    """Export UAL databases to CSV files
+
+    Role names and chained database years are read once from the first
+    SystemIdentity.mdb then each database is processed by its own worker
+    into part files. Parts are appended to the outputs in database order
+    as workers complete. Returns the number of rows written per output.
+    """
+    if not databases:
+        return {}
+    roles, years = {}, {}
+    for filepath in databases:
+        if filepath.name.lower() == SYSTEM_IDENTITY:
+            roles, years = read_system_identity(filepath)
+            break
+    csv_directory = Path(csv_directory)
+    csv_directory.mkdir(parents=True, exist_ok=True)
+    parts_directory = Path(
+        tempfile.mkdtemp(prefix='.sumecmd-', dir=csv_directory)
+    )
+    counts = {}
+    try:
+        with ExitStack() as stack:
+            outputs = {}
+            for result in iter_pool(
+                _process_database,
+                (
+                    (
+                        filepath,
+                        parts_directory,
+                        index,
+                        roles,
+                        years,
+                        dt_format,
+                        details,
+                    )
+                    for index, filepath in enumerate(databases)
+                ),
+                min(workers or len(databases), len(databases)),
+            ):
+                for output, (part, count) in result.items():
+                    header = output not in outputs
+                    if header:
+                        outputs[output] = stack.enter_context(
+                            (csv_directory / output_name(output)).open(
+                                'w', encoding='utf-8', newline=''
+                            )
+                        )
+                    _append_part(part, outputs[output], header)
+                    counts[output] = counts.get(output, 0) + count
+    finally:
+        shutil.rmtree(parts_directory, ignore_errors=True)
+    return counts
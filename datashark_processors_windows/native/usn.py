@@ -0,0 +1,366 @@
+"""Native $UsnJrnl:$J parser
+"""
+import os
+import errno
+import json
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from .common import (
+    DEFAULT_DT_FORMAT,
+    ParsingError,
+    RowWriter,
+    format_filetime,
+)
+from .mft import split_reference
+
+PAGE_SIZE = 4096
+ZERO_CHUNK_SIZE = 1 << 20
+RECORD_ALIGNMENT = 8
+MIN_RECORD_SIZE = 0x3C
+MAX_RECORD_SIZE = 0x10000
+ZERO_PAGE = bytes(PAGE_SIZE)
+ZERO_CHUNK = bytes(ZERO_CHUNK_SIZE)
+REASONS = [
+    (0x00000001, 'DataOverwrite'),
+    (0x00000002, 'DataExtend'),
+    (0x00000004, 'DataTruncation'),
+    (0x00000010, 'NamedDataOverwrite'),
+    (0x00000020, 'NamedDataExtend'),
+    (0x00000040, 'NamedDataTruncation'),
+    (0x00000100, 'FileCreate'),
+    (0x00000200, 'FileDelete'),
+    (0x00000400, 'EaChange'),
+    (0x00000800, 'SecurityChange'),
+    (0x00001000, 'RenameOldName'),
+    (0x00002000, 'RenameNewName'),
+    (0x00004000, 'IndexableChange'),
+    (0x00008000, 'BasicInfoChange'),
+    (0x00010000, 'HardLinkChange'),
+    (0x00020000, 'CompressionChange'),
+    (0x00040000, 'EncryptionChange'),
+    (0x00080000, 'ObjectIdChange'),
+    (0x00100000, 'ReparsePointChange'),
+    (0x00200000, 'StreamChange'),
+    (0x00400000, 'TransactedChange'),
+    (0x00800000, 'IntegrityChange'),
+    (0x80000000, 'Close'),
+]
+FILE_ATTRIBUTES = [
+    (0x00000001, 'ReadOnly'),
+    (0x00000002, 'Hidden'),
+    (0x00000004, 'System'),
+    (0x00000010, 'Directory'),
+    (0x00000020, 'Archive'),
+    (0x00000040, 'Device'),
+    (0x00000080, 'Normal'),
+    (0x00000100, 'Temporary'),
+    (0x00000200, 'SparseFile'),
+    (0x00000400, 'ReparsePoint'),
+    (0x00000800, 'Compressed'),
+    (0x00001000, 'Offline'),
+    (0x00002000, 'NotContentIndexed'),
+    (0x00004000, 'Encrypted'),
+]
+
+_HEADER = Struct('<IHH')
+_RECORD_V2 = Struct('<QQqqIIIIHH')
+_RECORD_V3 = Struct('<QQQQqqIIIIHH')
+_RECORDS = {2: _RECORD_V2, 3: _RECORD_V3}
+
+USN_FIELDS = [
+    'Name',
+    'Extension',
+    'EntryNumber',
+    'SequenceNumber',
+    'ParentEntryNumber',
+    'ParentSequenceNumber',
+    'UpdateSequenceNumber',
+    'UpdateTimestamp',
+    'UpdateReasons',
+    'FileAttributes',
+    'OffsetToData',
+    'SourceFile',
+]
+
+
+@dataclass
+class USNRecord:
+    """USN_RECORD_V2 or USN_RECORD_V3"""
+
+    offset: int
+    version: int
+    entry: int
+    sequence: int
+    parent_entry: int
+    parent_sequence: int
+    usn: int
+    timestamp: int
+    reason: int
+    source_info: int
+    security_id: int
+    file_attributes: int
+    name: str
+
+
+def _flags(value: int, names) -> str:
+    return '|'.join(name for flag, name in names if value & flag)
+
+
+def decode_record(buffer, offset: int) -> Optional[USNRecord]:
+    """Decode a USN record at offset, None when header is not sane"""
+    if offset + MIN_RECORD_SIZE > len(buffer):
+        return None
+    length, major, minor = _HEADER.unpack_from(buffer, offset)
+    if (
+        length < MIN_RECORD_SIZE
+        or length > MAX_RECORD_SIZE
+        or length % RECORD_ALIGNMENT
+        or minor != 0
+        or offset + length > len(buffer)
+    ):
+        return None
+    fixed = _RECORDS.get(major)
+    if fixed is None or length < _HEADER.size + fixed.size:
+        return None
+    if major == 2:
+        (
+            reference,
+            parent_reference,
+            usn,
+            timestamp,
+            reason,
+            source_info,
+            security_id,
+            file_attributes,
+            name_length,
+            name_offset,
+        ) = _RECORD_V2.unpack_from(buffer, offset + _HEADER.size)
+    elif major == 3:
+        (
+            reference,
+            _,
+            parent_reference,
+            _,
+            usn,
+            timestamp,
+            reason,
+            source_info,
+            security_id,
+            file_attributes,
+            name_length,
+            name_offset,
+        ) = _RECORD_V3.unpack_from(buffer, offset + _HEADER.size)
+    if name_offset + name_length > length:
+        return None
+    start = offset + name_offset
+    name = bytes(buffer[start : start + name_length]).decode(
+        'utf-16-le', errors='replace'
+    )
+    entry, sequence = split_reference(reference)
+    parent_entry, parent_sequence = split_reference(parent_reference)
+    return USNRecord(
+        offset,
+        major,
+        entry,
+        sequence,
+        parent_entry,
+        parent_sequence,
+        usn,
+        timestamp,
+        reason,
+        source_info,
+        security_id,
+        file_attributes,
+        name,
+    )
+
+
+def is_journal(filepath: Path) -> bool:
+    """Check whether file starts like a $J stream"""
+    with Path(filepath).open('rb') as fobj:
+        buffer = fobj.read(PAGE_SIZE)
+    if len(buffer) < 8:
+        return False
+    if buffer[:8] == bytes(8):
+        return True
+    return decode_record(buffer, 0) is not None
+
+
+class USNJournal:
+    """Memory-mapped $J stream"""
+
+    def __init__(self, filepath: Path):
+        self._filepath = Path(filepath)
+        self._fobj = None
+        self._mmap = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        """Map file"""
+        self._fobj = self._filepath.open('rb')
+        try:
+            self._mmap = mmap(self._fobj.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            self._mmap = b''
+
+    def close(self):
+        """Unmap file"""
+        if isinstance(self._mmap, mmap):
+            self._mmap.close()
+        self._mmap = None
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+
+    @property
+    def size(self) -> int:
+        """Size of the stream"""
+        return len(self._mmap)
+
+    def _next_data(self, offset: int) -> int:
+        """Offset of the next non-zero page at or after offset"""
+        size = self.size
+        seek_data = getattr(os, 'SEEK_DATA', None)
+        if seek_data is not None:
+            try:
+                data_offset = os.lseek(self._fobj.fileno(), offset, seek_data)
+            except OSError as exc:
+                # ENXIO means no data past offset, anything else means the
+                # filesystem does not support SEEK_DATA: scan for zeros
+                if exc.errno == errno.ENXIO:
+                    return size
+            else:
+                offset = max(offset, data_offset - data_offset % PAGE_SIZE)
+        buffer = self._mmap
+        while offset < size:
+            if offset % ZERO_CHUNK_SIZE == 0:
+                end = offset + ZERO_CHUNK_SIZE
+                if end <= size and buffer[offset:end] == ZERO_CHUNK:
+                    offset = end
+                    continue
+            end = min(offset + PAGE_SIZE, size)
+            if buffer[offset:end] != ZERO_PAGE[: end - offset]:
+                return offset
+            offset = end
+        return size
+
+    def iter_records(self, offset: int = 0) -> Iterator[USNRecord]:
+        """Lazily decode records starting at offset
+
+        Records never cross a page boundary so a zero record length means the
+        rest of the page is padding, following zero pages are skipped
+        """
+        buffer = self._mmap
+        size = self.size
+        offset -= offset % RECORD_ALIGNMENT
+        while offset < size:
+            record = decode_record(buffer, offset)
+            if record is not None:
+                yield record
+                offset += _HEADER.unpack_from(buffer, offset)[0]
+                continue
+            if buffer[offset : offset + 4] == b'\x00\x00\x00\x00':
+                offset = self._next_data(
+                    offset - offset % PAGE_SIZE + PAGE_SIZE
+                )
+                continue
+            offset += RECORD_ALIGNMENT
+
+    def resume_offset(self, checkpoint: dict) -> Optional[int]:
+        """Offset following the checkpointed record, None when not found
+
+        Offsets in a $J stream are USN values minus a constant delta, the
+        delta is computed from the first record
+        """
+        usn = checkpoint.get('usn')
+        if usn is None:
+            return None
+        first = next(self.iter_records(), None)
+        if first is None:
+            return None
+        offset = usn - (first.usn - first.offset)
+        record = decode_record(self._mmap, offset) if offset >= 0 else None
+        if record is None or record.usn != usn:
+            return None
+        return offset + _HEADER.unpack_from(self._mmap, offset)[0]
+
+
+def record_row(
+    record: USNRecord, source: str, dt_format: str = DEFAULT_DT_FORMAT
+) -> dict:
+    """Build MFTECmd-like row for a record"""
+    return {
+        'Name': record.name,
+        'Extension': Path(record.name).suffix,
+        'EntryNumber': record.entry,
+        'SequenceNumber': record.sequence,
+        'ParentEntryNumber': record.parent_entry,
+        'ParentSequenceNumber': record.parent_sequence,
+        'UpdateSequenceNumber': record.usn,
+        'UpdateTimestamp': format_filetime(record.timestamp, dt_format),
+        'UpdateReasons': _flags(record.reason, REASONS),
+        'FileAttributes': _flags(record.file_attributes, FILE_ATTRIBUTES),
+        'OffsetToData': record.offset,
+        'SourceFile': source,
+    }
+
+
+def load_checkpoint(filepath: Optional[Path]) -> dict:
+    """Load resume checkpoint, empty when missing"""
+    if not filepath or not Path(filepath).is_file():
+        return {}
+    try:
+        return json.loads(Path(filepath).read_text(encoding='utf-8'))
+    except ValueError as exc:
+        raise ParsingError(f"invalid checkpoint {filepath}: {exc}") from exc
+
+
+def save_checkpoint(filepath: Path, record: USNRecord):
+    """Persist last processed record offset and USN"""
+    Path(filepath).write_text(
+        json.dumps({'offset': record.offset, 'usn': record.usn}),
+        encoding='utf-8',
+    )
+
+
+def export(
+    filepath: Path,
+    csv_filepath: Optional[Path] = None,
+    json_filepath: Optional[Path] = None,
+    checkpoint_filepath: Optional[Path] = None,
+    dt_format: str = DEFAULT_DT_FORMAT,
+    lf: bool = False,
+) -> int:
+    """Export $J records to CSV and/or JSON
+
+    When a checkpoint file is given, decoding resumes after the last record
+    it designates and the checkpoint is updated once export completes.
+    Returns the number of exported records.
+    """
+    checkpoint = load_checkpoint(checkpoint_filepath)
+    source = str(filepath)
+    last = None
+    with USNJournal(filepath) as journal, RowWriter(
+        USN_FIELDS, csv_filepath, json_filepath, lf
+    ) as writer:
+        start = journal.resume_offset(checkpoint)
+        records = journal.iter_records(start or 0)
+        min_usn = checkpoint.get('usn', -1) if start is None else -1
+        for record in records:
+            if record.usn <= min_usn:
+                continue
+            writer.write(record_row(record, source, dt_format))
+            last = record
+        count = writer.count
+    if checkpoint_filepath and last is not None:
+        save_checkpoint(checkpoint_filepath, last)
+    return count
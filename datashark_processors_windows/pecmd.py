@@ -1,11 +1,15 @@
 """Datashark Template Plugin
 """
 from typing import Dict
+from pathlib import Path
 from asyncio.subprocess import PIPE, DEVNULL
 from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import prefetch
+from .native.common import output_filepath
 
 NAME = 'windows_pecmd'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
@@ -17,6 +21,33 @@ class PECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse prefetch files in-process instead of invoking PECmd
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '0',
+            'required': False,
+            'description': """
+                Maximum number of prefetch files found in 'd' parsed concurrently in native mode, 0 means one per CPU
+            """,
+        },
+        {
+            'name': 'ordered',
+            'kind': Kind.BOOL,
+            'value': 'true',
+            'required': False,
+            'description': """
+                When false, write native mode results as soon as they complete instead of in enumeration order
+            """,
+        },
         {
             'name': 'mp',
             'kind': Kind.BOOL,
@@ -124,8 +155,66 @@ class PECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Processor for Eric Zimmermann's PECmd
     """
 
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        for name in ('vss', 'html'):
+            if get_value(arguments, name):
+                raise ProcessorError(
+                    f"'{name}' is not supported in native mode"
+                )
+        directory = get_value(arguments, 'd')
+        filepath = get_value(arguments, 'f')
+        save_to = get_value(arguments, 'o')
+        if directory:
+            filepaths = prefetch.iter_prefetch_files(directory)
+            if save_to:
+                Path(save_to).mkdir(parents=True, exist_ok=True)
+        elif filepath:
+            filepaths = [filepath]
+        else:
+            raise ProcessorError("either 'f' or 'd' argument is required")
+        csv_filepath = output_filepath(
+            get_value(arguments, 'csv'),
+            get_value(arguments, 'csvf'),
+            'PECmd_Output.csv',
+        )
+        json_filepath = output_filepath(
+            get_value(arguments, 'json'),
+            get_value(arguments, 'jsonf'),
+            'PECmd_Output.json',
+        )
+        if not (csv_filepath or json_filepath):
+            raise ProcessorError(
+                "native mode requires 'csv' or 'json' argument"
+            )
+        timeline_filepath = None
+        if csv_filepath:
+            timeline_filepath = csv_filepath.with_name(
+                f'{csv_filepath.stem}_Timeline.csv'
+            )
+        dt_format = get_value(arguments, 'dt', prefetch.DEFAULT_DT_FORMAT)
+        if get_value(arguments, 'mp', False):
+            dt_format = prefetch.PRECISE_DT_FORMAT
+        count = await run_native(
+            prefetch.export,
+            filepaths,
+            csv_filepath=csv_filepath,
+            json_filepath=json_filepath,
+            timeline_filepath=timeline_filepath,
+            keywords=prefetch.compile_keywords(get_value(arguments, 'k')),
+            dt_format=dt_format,
+            save_to=save_to,
+            dedupe=get_value(arguments, 'dedupe', False),
+            workers=get_value(arguments, 'workers', 0) if directory else 1,
+            ordered=get_value(arguments, 'ordered', True),
+        )
+        LOGGER.info("native parser exported %d prefetch files", count)
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using pecmd"""
+        if get_value(arguments, 'native', False):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.pecmd.bin',
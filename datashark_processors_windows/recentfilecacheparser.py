@@ -6,6 +6,9 @@ from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import recentfilecache
+from .native.common import output_filepath
 
 NAME = 'windows_recentfilecacheparser'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
@@ -19,6 +22,24 @@ class RecentFileCacheParserProcessor(
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse .bcf files in-process instead of invoking RecentFileCacheParser
+            """,
+        },
+        {
+            'name': 'dt',
+            'kind': Kind.STR,
+            'value': 'yyyy-MM-dd HH:mm:ss',
+            'required': False,
+            'description': """
+                The custom date/time format to use when displaying timestamps. See https://goo.gl/CNVq0k for options
+            """,
+        },
         {
             'name': 'csvf',
             'kind': Kind.STR,
@@ -47,21 +68,59 @@ class RecentFileCacheParserProcessor(
             'name': 'f',
             'kind': Kind.PATH,
             'required': True,
-            'description': """File to process""",
+            'description': """
+                File to process. In native mode, several files separated by the OS path separator and glob patterns are accepted
+            """,
         },
     ]
     DESCRIPTION = """
     Processor for Eric Zimmermann's RecentFileCacheParser
     """
 
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        filepaths = recentfilecache.expand_filepaths(get_value(arguments, 'f'))
+        if not filepaths:
+            raise ProcessorError("'f' argument matches no file")
+        csv_filepath = output_filepath(
+            get_value(arguments, 'csv'),
+            get_value(arguments, 'csvf'),
+            'RecentFileCacheParser_Output.csv',
+        )
+        json_filepath = output_filepath(
+            get_value(arguments, 'json'),
+            None,
+            'RecentFileCacheParser_Output.json',
+        )
+        if not (csv_filepath or json_filepath):
+            raise ProcessorError("either 'csv' or 'json' argument is required")
+        count = await run_native(
+            recentfilecache.export,
+            filepaths,
+            csv_filepath,
+            json_filepath,
+            dt_format=get_value(
+                arguments, 'dt', recentfilecache.DEFAULT_DT_FORMAT
+            ),
+        )
+        LOGGER.info(
+            "native parser exported %d entries from %d files",
+            count,
+            len(filepaths),
+        )
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using recentfilecacheparser"""
+        if get_value(arguments, 'native', False):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.recentfilecacheparser.bin',
             ['-q'],
             [
                 # optional
+                ('dt', '--dt'),
                 ('csvf', '--csvf'),
                 ('csv', '--csv'),
                 ('json', '--json'),
@@ -6,17 +6,45 @@ from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import srum
 
 NAME = 'windows_srumecmd'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
 
 
 class SrumECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
-    """Template of a processor"""
+    """SrumECmd processor"""
 
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse SRUDB.dat in-process instead of invoking SrumECmd
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '0',
+            'required': False,
+            'description': """
+                Number of worker processes extracting SRUM tables in native mode, 0 means one per table
+            """,
+        },
+        {
+            'name': 'checkpoint',
+            'kind': Kind.PATH,
+            'required': False,
+            'description': """
+                File keeping the highest AutoIncId exported per table and database in native mode. Only newer records are exported on re-runs
+            """,
+        },
         {
             'name': 'dt',
             'kind': Kind.STR,
@@ -63,8 +91,35 @@ class SrumECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Processor for Eric Zimmermann's SrumECmd
     """
 
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        filepath = get_value(arguments, 'f')
+        software = get_value(arguments, 'r')
+        if not filepath:
+            directory = get_value(arguments, 'd')
+            if not directory:
+                raise ProcessorError("either 'f' or 'd' argument is required")
+            filepath, found = await run_native(srum.find_files, directory)
+            if not filepath:
+                raise ProcessorError("no SRUDB.dat found under 'd'")
+            software = software or found
+        counts = await run_native(
+            srum.export,
+            filepath,
+            get_value(arguments, 'csv'),
+            software=software,
+            dt_format=get_value(arguments, 'dt', srum.DEFAULT_DT_FORMAT),
+            checkpoint_filepath=get_value(arguments, 'checkpoint'),
+            workers=get_value(arguments, 'workers', 0),
+        )
+        for table_name, count in sorted(counts.items()):
+            LOGGER.info("native parser exported %d %s", count, table_name)
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using srumecmd"""
+        if get_value(arguments, 'native', False):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.srumecmd.bin',
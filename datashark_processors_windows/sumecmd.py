@@ -6,6 +6,8 @@ from datashark_core.meta import ProcessorMeta
 from datashark_core.logging import LOGGING_MANAGER
 from datashark_core.processor import ProcessorInterface, ProcessorError
 from datashark_core.model.api import Kind, System, ProcessorArgument
+from .helper import get_value, run_native
+from .native import ual
 
 NAME = 'windows_sumecmd'
 LOGGER = LOGGING_MANAGER.get_logger(NAME)
@@ -17,6 +19,24 @@ class SumECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     NAME = NAME
     SYSTEM = System.WINDOWS
     ARGUMENTS = [
+        {
+            'name': 'native',
+            'kind': Kind.BOOL,
+            'value': 'false',
+            'required': False,
+            'description': """
+                When true, parse UAL databases in-process instead of invoking SumECmd
+            """,
+        },
+        {
+            'name': 'workers',
+            'kind': Kind.INT,
+            'value': '0',
+            'required': False,
+            'description': """
+                Number of worker processes parsing UAL databases in native mode, 0 means one per database
+            """,
+        },
         {
             'name': 'wd',
             'kind': Kind.BOOL,
@@ -56,8 +76,29 @@ class SumECmdProcessor(ProcessorInterface, metaclass=ProcessorMeta):
     Processor for Eric Zimmermann's SumECmd
     """
 
+    async def _run_native(self, arguments: Dict[str, ProcessorArgument]):
+        """Process resources using native parser"""
+        databases = await run_native(
+            ual.find_databases, get_value(arguments, 'd')
+        )
+        if not databases:
+            raise ProcessorError("no UAL database found under 'd'")
+        counts = await run_native(
+            ual.export,
+            databases,
+            get_value(arguments, 'csv'),
+            dt_format=get_value(arguments, 'dt', ual.DEFAULT_DT_FORMAT),
+            details=not get_value(arguments, 'wd', False),
+            workers=get_value(arguments, 'workers', 0),
+        )
+        for output, count in sorted(counts.items()):
+            LOGGER.info("native parser exported %d %s", count, output)
+
     async def _run(self, arguments: Dict[str, ProcessorArgument]):
         """Process resources using sumecmd"""
+        if get_value(arguments, 'native', False):
+            await self._run_native(arguments)
+            return
         # invoke subprocess
         proc = await self._start_subprocess(
             'datashark.processors.sumecmd.bin',